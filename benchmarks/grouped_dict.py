@@ -0,0 +1,79 @@
+"""
+Benchmark grouping visits by state.
+
+Compares ``utils.grouped_dict`` with the ``itertools.groupby`` version it
+replaced, on lists of in-memory visits with random states. The old version
+also loses visits when states are interleaved, so the number of visits each
+one kept is reported next to the timings. No database is needed.
+
+Usage:
+    python -m benchmarks.grouped_dict --visits 1000 10000 100000
+"""
+import argparse
+import itertools
+import json
+import random
+from types import SimpleNamespace
+
+from src.models import VisitState
+from src.utils import grouped_dict
+
+from .stats import measure
+
+
+def groupby_grouped_dict(it) -> dict:
+    """
+    The ``itertools.groupby`` grouping ``grouped_dict`` used to run.
+    """
+    return {k: list(g) for k, g in itertools.groupby(it, lambda t: t.state)}
+
+
+def make_visits(count: int) -> list:
+    """
+    Build ``count`` visit stand-ins with random states, in date order.
+    """
+    states = list(VisitState)
+    return [SimpleNamespace(state=random.choice(states)) for _ in range(count)]
+
+
+def run(args):
+    results = {}
+    for count in args.visits:
+        visits = make_visits(count)
+        results[count] = {}
+        for name, function in (
+            ("groupby", groupby_grouped_dict),
+            ("bucketing", grouped_dict),
+        ):
+            kept = sum(len(group) for group in function(visits).values())
+            results[count][name] = {
+                "kept": kept,
+                **measure(function, [visits] * args.repeat),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--visits", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    random.seed(42)
+    results = run(args)
+    for count, summaries in results.items():
+        for name, summary in summaries.items():
+            print(
+                f"{count:>8} visits  {name:10} kept {summary['kept']:>8}  "
+                f"p50 {summary['p50_ms']:8.3f} ms  p99 {summary['p99_ms']:8.3f} ms"
+            )
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Load test the API in-process with mixed traffic.
+
+Seeds residents, guards and visits, then drives the app through httpx's ASGI
+transport with concurrent clients issuing a weighted mix of requests:
+
+- ``qr``: ``GET /api/qr/{qr_id}`` by a guard.
+- ``user_visit``: ``GET /api/user/visit`` by a resident or a guard.
+- ``register``: ``POST /api/visit/register`` by a guard, each pending visit
+  registered once.
+- ``login``: ``POST /api/login/`` by a resident or a guard.
+
+Throughput and latency percentiles are reported per endpoint. The app reads
+the seeded rows through its own connections, so the seed is committed and
+deleted once the run ends: point ``DATABASE_URL`` at a scratch database.
+Pass the JSON written by ``--output`` of an earlier run, e.g. on another
+commit, as ``--baseline`` to print the p95 change of each endpoint.
+
+Usage:
+    python -m benchmarks.load --visits 100000 --requests 5000 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+import uuid
+from collections import Counter
+
+import httpx
+from sqlalchemy import text
+
+from main import app
+from src.config.database import engine
+from src.models import auth_handler
+
+from .seed import seed_visits
+from .stats import summarize
+
+PASSWORD = "benchmark"
+MIX = {"qr": 50, "user_visit": 30, "register": 15, "login": 5}
+
+USER_STATEMENTS = [
+    """
+    INSERT INTO "user" (
+        id, name, role, username, password, is_active, resident_id,
+        created_date, updated_date
+    )
+    SELECT
+        gen_random_uuid(), 'Resident ' || n, 'RESIDENT', :prefix || 'resident-' || n,
+        :password, true, id, now(), now()
+    FROM bench_resident
+    WHERE n < :resident_users
+    """,
+    """
+    CREATE TEMP TABLE bench_guard AS
+    SELECT n, gen_random_uuid() AS id FROM generate_series(0, :guards - 1) AS n
+    """,
+    "INSERT INTO guard (id) SELECT id FROM bench_guard",
+    """
+    INSERT INTO "user" (
+        id, name, role, username, password, is_active, guard_id,
+        created_date, updated_date
+    )
+    SELECT
+        gen_random_uuid(), 'Guard ' || n, 'GUARD', :prefix || 'guard-' || n,
+        :password, true, id, now(), now()
+    FROM bench_guard
+    """,
+]
+CLEANUP_STATEMENTS = [
+    "DELETE FROM \"user\" WHERE username LIKE :prefix || '%'",
+    # Visits go with their QR code.
+    "DELETE FROM qr WHERE id IN (SELECT qr_id FROM bench_visit)",
+    "DELETE FROM visitor WHERE id IN (SELECT visitor_id FROM bench_visit)",
+    """
+    DELETE FROM residents_residences
+    WHERE resident_id IN (SELECT id FROM bench_resident)
+    """,
+    "DELETE FROM residence WHERE id IN (SELECT residence_id FROM bench_resident)",
+    "DELETE FROM resident WHERE id IN (SELECT id FROM bench_resident)",
+    "DELETE FROM guard WHERE id IN (SELECT id FROM bench_guard)",
+    "DROP TABLE bench_visit, bench_resident, bench_guard",
+]
+
+
+def seed(connection, args, prefix: str) -> dict:
+    """
+    Seed the visits and the users logging in, and commit.
+
+    Returns:
+        dict: Samples from ``seed_visits``, with the usernames and IDs of the
+            resident and guard users.
+    """
+    with connection.begin():
+        samples = seed_visits(connection, args.visits, args.residents, keep_tables=True)
+        params = {
+            "prefix": prefix,
+            "password": auth_handler.get_password_hash(PASSWORD),
+            "resident_users": args.resident_users,
+            "guards": args.guards,
+        }
+        for statement in USER_STATEMENTS:
+            connection.execute(text(statement), params)
+        users = connection.execute(
+            text('SELECT id, username, role FROM "user" WHERE username LIKE :pattern'),
+            {"pattern": f"{prefix}%"},
+        ).all()
+    samples["residents"] = [user for user in users if user.role == "RESIDENT"]
+    samples["guards"] = [user for user in users if user.role == "GUARD"]
+    return samples
+
+
+def cleanup(connection, prefix: str):
+    """
+    Delete the seeded rows, including the visits registered during the run.
+    """
+    with connection.begin():
+        for statement in CLEANUP_STATEMENTS:
+            connection.execute(text(statement), {"prefix": prefix})
+
+
+class Traffic:
+    """
+    Build the requests of the mix from the seeded samples.
+    """
+
+    def __init__(self, samples: dict):
+        self.qr_ids = samples["qr_ids"]
+        self.pending_qr_ids = list(samples["pending_qr_ids"])
+        self.users = samples["residents"] + samples["guards"]
+        self.guards = samples["guards"]
+        self.tokens = {
+            user.id: auth_handler.encode_token(user.id) for user in self.users
+        }
+
+    def headers(self, user) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[user.id]}"}
+
+    def request(self, endpoint: str) -> tuple:
+        """
+        Get the endpoint actually hit, the method, the URL and the keyword
+        arguments of a request of the mix.
+        """
+        if endpoint == "register" and not self.pending_qr_ids:
+            endpoint = "qr"
+        if endpoint == "qr":
+            guard = random.choice(self.guards)
+            url = f"/api/qr/{random.choice(self.qr_ids)}"
+            return endpoint, "GET", url, {"headers": self.headers(guard)}
+        if endpoint == "user_visit":
+            user = random.choice(self.users)
+            return endpoint, "GET", "/api/user/visit", {"headers": self.headers(user)}
+        if endpoint == "register":
+            guard = random.choice(self.guards)
+            qr_id = self.pending_qr_ids.pop()
+            kwargs = {"params": {"qr_id": str(qr_id)}, "headers": self.headers(guard)}
+            return endpoint, "POST", "/api/visit/register", kwargs
+        user = random.choice(self.users)
+        body = {"username": user.username, "password": PASSWORD}
+        return endpoint, "POST", "/api/login/", {"json": body}
+
+
+async def drive(traffic: Traffic, plan: list, concurrency: int) -> dict:
+    """
+    Send the planned requests from ``concurrency`` clients.
+
+    Returns:
+        dict: Durations and status codes by endpoint, and the wall time.
+    """
+    durations = {endpoint: [] for endpoint in MIX}
+    statuses = {endpoint: Counter() for endpoint in MIX}
+    pending = iter(plan)
+
+    async def client(http: httpx.AsyncClient):
+        for planned in pending:
+            endpoint, method, url, kwargs = traffic.request(planned)
+            start = time.perf_counter()
+            response = await http.request(method, url, **kwargs)
+            durations[endpoint].append(time.perf_counter() - start)
+            statuses[endpoint][response.status_code] += 1
+
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark") as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {"durations": durations, "statuses": statuses, "elapsed": elapsed}
+
+
+def report(results: dict) -> dict:
+    """
+    Summarize the throughput and latencies of a run.
+    """
+    elapsed = results["elapsed"]
+    endpoints = {}
+    for endpoint, durations in results["durations"].items():
+        if not durations:
+            continue
+        endpoints[endpoint] = {
+            **summarize(durations),
+            "throughput_rps": len(durations) / elapsed,
+            "statuses": {
+                str(code): count
+                for code, count in sorted(results["statuses"][endpoint].items())
+            },
+        }
+    total = sum(len(durations) for durations in results["durations"].values())
+    return {
+        "requests": total,
+        "duration_s": elapsed,
+        "throughput_rps": total / elapsed,
+        "endpoints": endpoints,
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--visits", type=int, default=100_000)
+    parser.add_argument("--residents", type=int, default=1_000)
+    parser.add_argument("--resident-users", type=int, default=200)
+    parser.add_argument("--guards", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with the JSON of an earlier run")
+    args = parser.parse_args()
+
+    random.seed(42)
+    prefix = f"bench-{uuid.uuid4().hex[:8]}-"
+    plan = random.choices(list(MIX), weights=list(MIX.values()), k=args.requests)
+    with engine.connect() as connection:
+        traffic = Traffic(seed(connection, args, prefix))
+        try:
+            results = report(asyncio.run(drive(traffic, plan, args.concurrency)))
+        finally:
+            cleanup(connection, prefix)
+    engine.dispose()
+
+    results = {"commit": current_commit(), "arguments": vars(args), **results}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["endpoints"]
+    print(f"{results['throughput_rps']:.1f} requests/s overall")
+    for endpoint, summary in results["endpoints"].items():
+        line = (
+            f"{endpoint:12} {summary['throughput_rps']:8.1f} req/s  "
+            f"p50 {summary['p50_ms']:7.2f} ms  p95 {summary['p95_ms']:7.2f} ms  "
+            f"p99 {summary['p99_ms']:7.2f} ms"
+        )
+        if baseline and endpoint in baseline:
+            change = summary["p95_ms"] / baseline[endpoint]["p95_ms"] - 1
+            line += f"  p95 {change:+.1%} vs baseline"
+        print(line)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark login throughput for each bcrypt cost factor.
+
+For every cost, ``--logins`` password verifications are pushed through a
+``PasswordExecutor`` with ``--concurrency`` of them in flight at a time, the
+way a burst of logins reaches the API. The latency includes the time spent
+waiting for a worker. No database is needed.
+
+Usage:
+    python -m benchmarks.password_hashing --rounds 10 11 12 13
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from passlib.context import CryptContext
+
+from src.passwords import PASSWORD_HASH_WORKERS, PasswordExecutor
+
+from .stats import summarize
+
+
+async def login_burst(context, hashed_password, executor, logins, concurrency):
+    """
+    Verify ``logins`` passwords, ``concurrency`` at a time.
+
+    Returns:
+        tuple: Wall time of the burst and the latency of each verification.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+
+    async def login():
+        async with semaphore:
+            start = time.perf_counter()
+            await executor.run(context.verify, "password123", hashed_password)
+            durations.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    return time.perf_counter() - start, durations
+
+
+async def run(args):
+    results = {}
+    executor = PasswordExecutor(max_workers=args.workers)
+    try:
+        for rounds in args.rounds:
+            context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+            hashed_password = context.hash("password123")
+            elapsed, durations = await login_burst(
+                context, hashed_password, executor, args.logins, args.concurrency
+            )
+            results[rounds] = {
+                "logins_per_second": args.logins / elapsed,
+                **summarize(durations),
+            }
+    finally:
+        executor.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=PASSWORD_HASH_WORKERS)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for rounds, summary in results.items():
+        print(
+            f"cost {rounds:2}  {summary['logins_per_second']:7.1f} logins/s  "
+            f"p50 {summary['p50_ms']:8.1f} ms  p99 {summary['p99_ms']:8.1f} ms"
+        )
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
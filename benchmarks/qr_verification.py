@@ -0,0 +1,114 @@
+"""
+Benchmark QR verification against a seeded database.
+
+Compares ``utils.verify_qr_code`` with the statement sequence it replaced
+(user, QR, visit, resident, visitor and residence looked up one after the
+other). Seeding and measurements run in one transaction that is rolled
+back at the end.
+
+Usage:
+    python -m benchmarks.qr_verification --visits 1000000
+"""
+import argparse
+import asyncio
+import json
+import random
+from uuid import uuid4
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src import models
+from src.cache import qr_cache
+from src.config.database import ASYNC_DATABASE_URL
+from src.schema import Principal
+from src.utils import verify_qr_code
+
+from .seed import seed_visits
+from .stats import measure_async
+
+
+async def sequential_verify_qr_code(db: AsyncSession, qr_id, user_id):
+    """
+    The one-statement-per-entity lookup ``verify_qr_code`` used to run.
+    """
+    await db.execute(select(models.User).filter_by(id=user_id))
+    await db.execute(select(models.Qr).filter_by(id=qr_id))
+    visit = (
+        (await db.execute(select(models.Visit).filter_by(qr_id=qr_id)))
+        .scalars()
+        .first()
+    )
+    await db.execute(select(models.Resident).filter_by(id=visit.resident_id))
+    await db.execute(select(models.Visitor).filter_by(id=visit.visitor_id))
+    await db.execute(
+        select(models.Residence).filter(
+            models.Residence.residents.any(id=visit.resident_id)
+        )
+    )
+
+
+async def run(args):
+    engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        try:
+            samples = await connection.run_sync(
+                seed_visits, args.visits, args.residents
+            )
+            session = AsyncSession(bind=connection)
+            guard = models.User(
+                id=uuid4(),
+                name="Benchmark guard",
+                role=models.Role.GUARD,
+                username=f"benchmark-{uuid4()}",
+                guard=models.Guard(id=uuid4()),
+            )
+            session.add(guard)
+            await session.flush()
+            principal = Principal(id=guard.id, role=guard.role.value, is_active=True)
+            qr_ids = random.choices(samples["qr_ids"], k=args.repeat)
+
+            async def sequential(qr_id):
+                await sequential_verify_qr_code(session, qr_id, guard.id)
+                session.expunge_all()
+
+            async def single(qr_id):
+                # Repeated QR codes would be served from the cache otherwise.
+                qr_cache.clear()
+                await verify_qr_code(session, qr_id, principal)
+                session.expunge_all()
+
+            results = {
+                "sequential": await measure_async(sequential, qr_ids),
+                "single": await measure_async(single, qr_ids),
+            }
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--visits", type=int, default=1_000_000)
+    parser.add_argument("--residents", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=1_000)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    random.seed(42)
+    results = asyncio.run(run(args))
+    for name, summary in results.items():
+        print(
+            f"{name:12} p50 {summary['p50_ms']:7.2f} ms  "
+            f"p95 {summary['p95_ms']:7.2f} ms  p99 {summary['p99_ms']:7.2f} ms"
+        )
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
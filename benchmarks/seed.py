@@ -0,0 +1,136 @@
+"""
+Seed a database with synthetic residents, visitors, QR codes and visits.
+
+Rows are generated server side with ``generate_series``, so seeding a
+million visits takes seconds instead of a million round trips. The random
+generator is seeded, so the same arguments produce the same distribution.
+"""
+from sqlalchemy import text
+
+SEED_STATEMENTS = [
+    "SELECT setseed(:seed)",
+    """
+    CREATE TEMP TABLE bench_resident AS
+    SELECT n, gen_random_uuid() AS id, gen_random_uuid() AS residence_id
+    FROM generate_series(0, :residents - 1) AS n
+    """,
+    """
+    INSERT INTO resident (id, phone)
+    SELECT id, '09' || lpad(n::text, 8, '0') FROM bench_resident
+    """,
+    """
+    INSERT INTO residence (id, address, created_date)
+    SELECT residence_id, 'Manzana ' || n, now() FROM bench_resident
+    """,
+    """
+    INSERT INTO residents_residences (resident_id, residence_id)
+    SELECT id, residence_id FROM bench_resident
+    """,
+    """
+    CREATE TEMP TABLE bench_visit AS
+    SELECT
+        n,
+        gen_random_uuid() AS id,
+        gen_random_uuid() AS qr_id,
+        gen_random_uuid() AS visitor_id,
+        now() - random() * (:history_days * interval '1 day')
+            + :upcoming_days * interval '1 day' AS date,
+        random() AS roll
+    FROM generate_series(0, :visits - 1) AS n
+    """,
+    """
+    INSERT INTO visitor (id, name, normalized_name, created_at, updated_at)
+    SELECT visitor_id, 'Visitor ' || n, 'visitor ' || n, now(), now()
+    FROM bench_visit
+    """,
+    """
+    INSERT INTO qr (id, created_date, code)
+    SELECT qr_id, now(), qr_id::text FROM bench_visit
+    """,
+    """
+    INSERT INTO visit (
+        id, created_date, date, register_date, state, qr_id, visitor_id, resident_id
+    )
+    SELECT
+        v.id,
+        v.date - interval '1 day',
+        v.date,
+        CASE WHEN v.date <= now() AND v.roll < 0.7 THEN v.date END,
+        CASE
+            WHEN v.date > now() - interval '24 hours' THEN 'PENDING'
+            WHEN v.roll < 0.7 THEN 'REGISTERED'
+            WHEN v.roll < 0.85 THEN 'EXPIRED'
+            ELSE 'CANCELLED'
+        END::visitstate,
+        v.qr_id,
+        v.visitor_id,
+        r.id
+    FROM bench_visit AS v
+    JOIN bench_resident AS r ON r.n = v.n % :residents
+    """,
+    "ANALYZE resident",
+    "ANALYZE residence",
+    "ANALYZE residents_residences",
+    "ANALYZE visitor",
+    "ANALYZE qr",
+    "ANALYZE visit",
+]
+
+
+def seed_visits(
+    connection,
+    visits: int,
+    residents: int,
+    history_days: int = 365,
+    upcoming_days: int = 30,
+    seed: float = 0.42,
+    keep_tables: bool = False,
+):
+    """
+    Insert synthetic visits spread over the past ``history_days`` and the
+    next ``upcoming_days``.
+
+    Args:
+        connection (Connection): SQLAlchemy connection.
+        visits (int): Number of visits (and QR codes and visitors) to create.
+        residents (int): Number of residents the visits are spread across.
+        history_days (int): How far back visit dates go.
+        upcoming_days (int): How far ahead visit dates go.
+        seed (float): Seed for the random generator, between -1 and 1.
+        keep_tables (bool): Keep the ``bench_visit`` and ``bench_resident``
+            temporary tables, e.g. to delete the seeded rows afterwards.
+
+    Returns:
+        dict: Sample QR and resident IDs to drive lookups with, and QR IDs
+            of pending visits to register.
+    """
+    params = {
+        "seed": seed,
+        "visits": visits,
+        "residents": residents,
+        "history_days": history_days,
+        "upcoming_days": upcoming_days,
+    }
+    for statement in SEED_STATEMENTS:
+        connection.execute(text(statement), params)
+    step = max(visits // 1000, 1)
+    qr_ids = connection.execute(
+        text("SELECT qr_id FROM bench_visit WHERE n % :step = 0"), {"step": step}
+    ).scalars()
+    resident_ids = connection.execute(
+        text("SELECT id FROM bench_resident ORDER BY n LIMIT 1000")
+    ).scalars()
+    pending_qr_ids = connection.execute(
+        text(
+            "SELECT qr_id FROM bench_visit "
+            "WHERE date > now() - interval '24 hours' ORDER BY n LIMIT 10000"
+        )
+    ).scalars()
+    samples = {
+        "qr_ids": list(qr_ids),
+        "resident_ids": list(resident_ids),
+        "pending_qr_ids": list(pending_qr_ids),
+    }
+    if not keep_tables:
+        connection.execute(text("DROP TABLE bench_visit, bench_resident"))
+    return samples
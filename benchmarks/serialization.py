@@ -0,0 +1,144 @@
+"""
+Benchmark serializing the guard board.
+
+Builds a page of in-memory visits with their visitor and resident loaded, the
+way ``crud.get_user_visits`` returns them to a guard, and times turning it
+into a response body:
+
+- ``jsonable_encoder``: no response model, ORM instances walked by
+  ``jsonable_encoder`` and rendered by ``JSONResponse`` (the old routes).
+- ``response_model``: validated into ``schema.VisitPage``, rendered by
+  ``JSONResponse``.
+- ``response_model_orjson``: validated into ``schema.VisitPage``, rendered by
+  ``ORJSONResponse``.
+- ``model_response``: dumped by orjson, ORM instances rendered as the fields
+  of their response model (the current visit routes).
+
+No database is needed.
+
+Usage:
+    python -m benchmarks.serialization --visits 1000
+"""
+import argparse
+import asyncio
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src import models, utils
+from src.responses import model_response
+from src.schema import VisitPage
+
+from .stats import measure_async
+
+
+def make_board(count: int) -> dict:
+    """
+    Build a guard board of ``count`` visits with random states.
+    """
+    states = list(models.VisitState)
+    residents = [
+        models.Resident(id=uuid.uuid4(), phone=f"555-{i:04}") for i in range(50)
+    ]
+    start = datetime.now().replace(hour=6, minute=0, second=0, microsecond=0)
+    visits = []
+    for i in range(count):
+        visitor = models.Visitor(
+            id=uuid.uuid4(),
+            name=f"Visitor {i}",
+            created_at=start,
+            updated_at=start,
+        )
+        resident = random.choice(residents)
+        visit = models.Visit(
+            id=uuid.uuid4(),
+            created_date=start,
+            date=start + timedelta(seconds=i * 30),
+            register_date=None,
+            state=random.choice(states),
+            additional_info=None,
+            qr_id=uuid.uuid4(),
+            visitor_id=visitor.id,
+            guard_id=None,
+            resident_id=resident.id,
+            recurring_visit_id=None,
+        )
+        # Loaded without backrefs, like a joinedload.
+        set_committed_value(visit, "visitor", visitor)
+        set_committed_value(visit, "resident", resident)
+        visits.append(visit)
+    visits.reverse()
+    return {"visits": utils.grouped_dict(visits), "next_cursor": None}
+
+
+def serializer(field, response_class):
+    """
+    Serialize a payload the way a route with ``field`` as response model does.
+    """
+
+    async def serialize(payload):
+        content = await serialize_response(
+            field=field, response_content=payload, is_coroutine=True
+        )
+        return response_class(content).body
+
+    return serialize
+
+
+async def render_model(payload):
+    """
+    Serialize a payload the way the visit routes do.
+    """
+    return model_response(payload).body
+
+
+async def run(args):
+    field = create_response_field(name="Response", type_=Optional[VisitPage])
+    serializers = {
+        "jsonable_encoder": serializer(None, JSONResponse),
+        "response_model": serializer(field, JSONResponse),
+        "response_model_orjson": serializer(field, ORJSONResponse),
+        "model_response": render_model,
+    }
+    results = {}
+    for count in args.visits:
+        board = make_board(count)
+        results[count] = {}
+        for name, serialize in serializers.items():
+            body = await serialize(board)
+            results[count][name] = {
+                "bytes": len(body),
+                **await measure_async(serialize, [board] * args.repeat),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--visits", type=int, nargs="+", default=[1_000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    random.seed(42)
+    results = asyncio.run(run(args))
+    for count, summaries in results.items():
+        for name, summary in summaries.items():
+            print(
+                f"{count:>8} visits  {name:22} {summary['bytes']:>9} bytes  "
+                f"p50 {summary['p50_ms']:8.3f} ms  p99 {summary['p99_ms']:8.3f} ms"
+            )
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Latency summaries shared by the benchmarks.
+"""
+import statistics
+import time
+
+
+def summarize(durations: list) -> dict:
+    """
+    Summarize a list of durations in seconds.
+
+    Args:
+        durations (list): Measured durations, in seconds.
+
+    Returns:
+        dict: Sample count and mean/p50/p95/p99 latencies in milliseconds.
+    """
+    count = len(durations)
+    if count == 1:
+        durations = durations * 2
+    quantiles = statistics.quantiles(durations, n=100, method="inclusive")
+    return {
+        "count": count,
+        "mean_ms": statistics.fmean(durations) * 1000,
+        "p50_ms": quantiles[49] * 1000,
+        "p95_ms": quantiles[94] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+    }
+
+
+def measure(function, arguments) -> dict:
+    """
+    Call ``function`` once per argument and summarize the latencies.
+    """
+    durations = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+
+async def measure_async(function, arguments) -> dict:
+    """
+    Await ``function`` once per argument and summarize the latencies.
+    """
+    durations = []
+    for argument in arguments:
+        start = time.perf_counter()
+        await function(argument)
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
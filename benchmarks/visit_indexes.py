@@ -0,0 +1,122 @@
+"""
+Benchmark the hot visit queries with and without the visit indexes.
+
+Everything runs inside one transaction that is rolled back at the end, so
+the seeded rows and the dropped indexes never become visible. Point
+``DATABASE_URL`` at a scratch database anyway: seeding a million visits
+holds locks on the tables for the duration of the run.
+
+Usage:
+    python -m benchmarks.visit_indexes --visits 1000000 --residents 5000
+"""
+import argparse
+import json
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, text
+
+from src.config.database import engine
+from src.models import Visit, VisitState
+
+from .seed import seed_visits
+from .stats import measure
+
+INDEX_NAMES = ["ix_visit_resident_id_date", "ix_visit_date", "ix_visit_pending_date"]
+
+
+def drop_indexes(connection):
+    connection.execute(
+        text("ALTER TABLE visit DROP CONSTRAINT IF EXISTS uq_visit_qr_id")
+    )
+    for name in INDEX_NAMES:
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    connection.execute(text("ANALYZE visit"))
+
+
+def create_indexes(connection):
+    exists = connection.execute(
+        text("SELECT 1 FROM pg_constraint WHERE conname = 'uq_visit_qr_id'")
+    ).first()
+    if exists is None:
+        connection.execute(
+            text(
+                "ALTER TABLE visit ADD CONSTRAINT uq_visit_qr_id "
+                "UNIQUE (qr_id, date)"
+            )
+        )
+    for index in Visit.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    connection.execute(text("ANALYZE visit"))
+
+
+def run_queries(connection, samples, repeat):
+    """
+    Time the statements behind each endpoint.
+    """
+    qr_ids = random.choices(samples["qr_ids"], k=repeat)
+    resident_ids = random.choices(samples["resident_ids"], k=repeat)
+    start_of_day = datetime.combine(date.today(), datetime.min.time())
+    end_of_day = datetime.combine(date.today(), datetime.max.time())
+
+    def by_qr(qr_id):
+        connection.execute(select(Visit).filter_by(qr_id=qr_id)).first()
+
+    def by_resident(resident_id):
+        connection.execute(select(Visit).filter(Visit.resident_id == resident_id)).all()
+
+    def guard_board(_):
+        connection.execute(
+            select(Visit).filter(Visit.date.between(start_of_day, end_of_day))
+        ).all()
+
+    def pending_expired(_):
+        connection.execute(
+            select(Visit.id).filter(
+                Visit.state == VisitState.PENDING,
+                Visit.date < datetime.now() - timedelta(hours=24),
+            )
+        ).all()
+
+    return {
+        "GET /api/qr/{qr_id} (visit by qr_id)": measure(by_qr, qr_ids),
+        "GET /api/user/visit (resident)": measure(by_resident, resident_ids),
+        "GET /api/user/visit (guard)": measure(guard_board, range(repeat)),
+        "check_visit_expiry (pending visits)": measure(pending_expired, range(repeat)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--visits", type=int, default=1_000_000)
+    parser.add_argument("--residents", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    random.seed(42)
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            samples = seed_visits(connection, args.visits, args.residents)
+            drop_indexes(connection)
+            before = run_queries(connection, samples, args.repeat)
+            create_indexes(connection)
+            after = run_queries(connection, samples, args.repeat)
+        finally:
+            transaction.rollback()
+
+    results = {"visits": args.visits, "before": before, "after": after}
+    for endpoint in after:
+        print(
+            f"{endpoint:45} "
+            f"p50 {before[endpoint]['p50_ms']:9.2f} -> {after[endpoint]['p50_ms']:7.2f} ms  "
+            f"p99 {before[endpoint]['p99_ms']:9.2f} -> {after[endpoint]['p99_ms']:7.2f} ms"
+        )
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,18 @@ import os
 import sys
 import time
 
-from apscheduler.schedulers.background import BackgroundScheduler
-from fastapi import Depends, FastAPI
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
-from fastapi_utils.tasks import repeat_every
-from sqlalchemy.orm import sessionmaker
+from prometheus_client import REGISTRY
 from starlette.middleware.sessions import SessionMiddleware
 
 from src.admin import add_views_to_app
-from src.config.database import Base, engine, get_session
+from src.config.database import Base, engine
+from src.metrics import MetricsMiddleware, StatsCollector, metrics_response
+from src.passwords import password_executor
 from src.router import router
-from src.tasks import check_visit_expiry
+from src.tasks import expiry_scheduler
 
 os.environ["TZ"] = "America/Guayaquil"
 time.tzset()
@@ -48,10 +48,7 @@ tags_metadata = [
     {"name": "User", "description": "Información de usuarios"},
     {"name": "Visit", "description": "Información de visitas"},
 ]
-scheduler = BackgroundScheduler()
-scheduler.start()
 app = FastAPI(
-    dependencies=[Depends(get_session)],
     title="Safe Citadel API",
     version="0.1.0",
     description=description,
@@ -77,6 +74,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 
 app.include_router(router)
@@ -95,18 +93,23 @@ def healthcheck():
     return {"status": "ok"}
 
 
-# # Schedule the job every 24 hours
-# scheduler.add_job(check_visit_expiry, "interval", hours=24)
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Metrics in the Prometheus text format
+    """
+    return metrics_response()
+
+
+REGISTRY.register(StatsCollector(password_executor))
 
 
 @app.on_event("startup")
-@repeat_every(seconds=3600)
 def startup_event():
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    session = SessionLocal()
-    check_visit_expiry(session=session)
+    expiry_scheduler.start()
 
 
 @app.on_event("shutdown")
 def shutdown_event():
-    scheduler.shutdown()
+    expiry_scheduler.shutdown()
+    password_executor.shutdown()
@@ -0,0 +1,57 @@
+"""recurring visits
+
+Revision ID: 07bd5368ad66
+Revises: 7875c48487c0
+Create Date: 2026-10-18 11:02:37.904415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "07bd5368ad66"
+down_revision = "7875c48487c0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "recurring_visit",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("created_date", sa.DateTime(), nullable=True),
+        sa.Column("weekdays", sa.Integer(), nullable=False),
+        sa.Column("start_time", sa.Time(), nullable=False),
+        sa.Column("end_time", sa.Time(), nullable=False),
+        sa.Column("start_date", sa.Date(), nullable=False),
+        sa.Column("end_date", sa.Date(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("visitor_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("resident_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.ForeignKeyConstraint(["resident_id"], ["resident.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["visitor_id"], ["visitor.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.add_column(
+        "visit",
+        sa.Column("recurring_visit_id", postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    op.create_foreign_key(
+        "visit_recurring_visit_id_fkey",
+        "visit",
+        "recurring_visit",
+        ["recurring_visit_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+    op.create_unique_constraint(
+        "uq_visit_recurring_visit_id_date", "visit", ["recurring_visit_id", "date"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_visit_recurring_visit_id_date", "visit", type_="unique")
+    op.drop_constraint("visit_recurring_visit_id_fkey", "visit", type_="foreignkey")
+    op.drop_column("visit", "recurring_visit_id")
+    op.drop_table("recurring_visit")
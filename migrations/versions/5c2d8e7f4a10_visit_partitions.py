@@ -0,0 +1,151 @@
+"""visit partitions
+
+Revision ID: 5c2d8e7f4a10
+Revises: b3e61f0c2a94
+Create Date: 2026-10-18 15:02:47.190356
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "5c2d8e7f4a10"
+down_revision = "b3e61f0c2a94"
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "id, created_date, date, register_date, state, additional_info, qr_id, "
+    "visitor_id, guard_id, resident_id, recurring_visit_id"
+)
+# Months after the current one that get a partition right away, the expiry
+# scheduler keeps creating them afterwards.
+MONTHS_AHEAD = 3
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def visit_table(name, *constraints, **kwargs):
+    op.create_table(
+        name,
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("created_date", sa.DateTime(), nullable=True),
+        sa.Column("date", sa.DateTime(), nullable=False),
+        sa.Column("register_date", sa.DateTime(), nullable=True),
+        sa.Column(
+            "state",
+            postgresql.ENUM(name="visitstate", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("additional_info", sa.JSON(), nullable=True),
+        sa.Column("qr_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("visitor_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("guard_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("resident_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("recurring_visit_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.ForeignKeyConstraint(["guard_id"], ["guard.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["qr_id"], ["qr.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["resident_id"], ["resident.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["visitor_id"], ["visitor.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["recurring_visit_id"], ["recurring_visit.id"], ondelete="CASCADE"
+        ),
+        *constraints,
+        **kwargs,
+    )
+
+
+def create_indexes():
+    op.create_index(
+        "ix_visit_resident_id_date", "visit", ["resident_id", "date"], unique=False
+    )
+    op.create_index("ix_visit_date", "visit", ["date"], unique=False)
+    op.create_index(
+        "ix_visit_pending_date",
+        "visit",
+        ["date"],
+        unique=False,
+        postgresql_where=sa.text("state = 'PENDING'"),
+    )
+
+
+def drop_indexes(table_name):
+    op.drop_index("ix_visit_pending_date", table_name=table_name)
+    op.drop_index("ix_visit_date", table_name=table_name)
+    op.drop_index("ix_visit_resident_id_date", table_name=table_name)
+
+
+def upgrade() -> None:
+    op.rename_table("visit", "visit_unpartitioned")
+    op.drop_constraint("visit_pkey", "visit_unpartitioned", type_="primary")
+    op.drop_constraint("uq_visit_qr_id", "visit_unpartitioned", type_="unique")
+    op.drop_constraint(
+        "uq_visit_recurring_visit_id_date", "visit_unpartitioned", type_="unique"
+    )
+    drop_indexes("visit_unpartitioned")
+
+    # Postgres requires the partition key in the primary key and in every
+    # unique constraint.
+    visit_table(
+        "visit",
+        sa.PrimaryKeyConstraint("id", "date"),
+        sa.UniqueConstraint("qr_id", "date", name="uq_visit_qr_id"),
+        sa.UniqueConstraint(
+            "recurring_visit_id", "date", name="uq_visit_recurring_visit_id_date"
+        ),
+        postgresql_partition_by="RANGE (date)",
+    )
+    op.execute("CREATE TABLE visit_default PARTITION OF visit DEFAULT")
+    months = set(
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT DISTINCT CAST(date_trunc('month', date) AS date) "
+                "FROM visit_unpartitioned"
+            )
+        )
+        .scalars()
+    )
+    months.update(add_months(date.today(), n) for n in range(MONTHS_AHEAD + 1))
+    for month in sorted(months):
+        op.execute(
+            f"CREATE TABLE visit_y{month.year:04d}m{month.month:02d} "
+            f"PARTITION OF visit FOR VALUES FROM ('{month}') "
+            f"TO ('{add_months(month, 1)}')"
+        )
+    op.execute(
+        f"INSERT INTO visit ({COLUMNS}) SELECT {COLUMNS} FROM visit_unpartitioned"
+    )
+    op.drop_table("visit_unpartitioned")
+    create_indexes()
+
+
+def downgrade() -> None:
+    visit_table("visit_unpartitioned", sa.PrimaryKeyConstraint("id"))
+    op.execute(
+        f"INSERT INTO visit_unpartitioned ({COLUMNS}) SELECT {COLUMNS} FROM visit"
+    )
+    # Archived months are merged back, the archive does not survive the downgrade.
+    archived = op.get_bind().execute(sa.text("SELECT to_regclass('visit_archive')"))
+    if archived.scalar() is not None:
+        op.execute(
+            f"INSERT INTO visit_unpartitioned ({COLUMNS}) "
+            f"SELECT {COLUMNS} FROM visit_archive"
+        )
+        op.drop_table("visit_archive")
+    op.drop_table("visit")
+    op.rename_table("visit_unpartitioned", "visit")
+    op.execute(
+        "ALTER TABLE visit RENAME CONSTRAINT visit_unpartitioned_pkey TO visit_pkey"
+    )
+    op.create_unique_constraint("uq_visit_qr_id", "visit", ["qr_id"])
+    op.create_unique_constraint(
+        "uq_visit_recurring_visit_id_date", "visit", ["recurring_visit_id", "date"]
+    )
+    create_indexes()
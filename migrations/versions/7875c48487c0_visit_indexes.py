@@ -0,0 +1,37 @@
+"""visit indexes
+
+Revision ID: 7875c48487c0
+Revises: 441d567af6e9
+Create Date: 2026-10-18 07:45:12.318201
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "7875c48487c0"
+down_revision = "441d567af6e9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_unique_constraint("uq_visit_qr_id", "visit", ["qr_id"])
+    op.create_index(
+        "ix_visit_resident_id_date", "visit", ["resident_id", "date"], unique=False
+    )
+    op.create_index("ix_visit_date", "visit", ["date"], unique=False)
+    op.create_index(
+        "ix_visit_pending_date",
+        "visit",
+        ["date"],
+        unique=False,
+        postgresql_where=sa.text("state = 'PENDING'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_visit_pending_date", table_name="visit")
+    op.drop_index("ix_visit_date", table_name="visit")
+    op.drop_index("ix_visit_resident_id_date", table_name="visit")
+    op.drop_constraint("uq_visit_qr_id", "visit", type_="unique")
@@ -0,0 +1,50 @@
+"""visit valid until
+
+Revision ID: 9d4b7e2a61c3
+Revises: e81a4c3d9b57
+Create Date: 2026-10-18 19:12:36.208514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "9d4b7e2a61c3"
+down_revision = "e81a4c3d9b57"
+branch_labels = None
+depends_on = None
+
+
+def archive_exists():
+    archived = op.get_bind().execute(sa.text("SELECT to_regclass('visit_archive')"))
+    return archived.scalar() is not None
+
+
+def upgrade() -> None:
+    op.add_column("visit", sa.Column("valid_until", sa.DateTime(), nullable=True))
+    # Partitions archived later must keep the columns of the archive.
+    if archive_exists():
+        op.add_column(
+            "visit_archive", sa.Column("valid_until", sa.DateTime(), nullable=True)
+        )
+    # Occurrences of recurring visits end with their time window.
+    op.execute(
+        "UPDATE visit SET valid_until = "
+        "date_trunc('day', visit.date) + recurring_visit.end_time "
+        "FROM recurring_visit "
+        "WHERE visit.recurring_visit_id = recurring_visit.id"
+    )
+    op.create_index(
+        "ix_visit_pending_valid_until",
+        "visit",
+        ["valid_until"],
+        unique=False,
+        postgresql_where=sa.text("state = 'PENDING' AND valid_until IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_visit_pending_valid_until", table_name="visit")
+    if archive_exists():
+        op.drop_column("visit_archive", "valid_until")
+    op.drop_column("visit", "valid_until")
@@ -0,0 +1,56 @@
+"""visitor dedupe
+
+Revision ID: b3e61f0c2a94
+Revises: 07bd5368ad66
+Create Date: 2026-10-18 12:31:08.512734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "b3e61f0c2a94"
+down_revision = "07bd5368ad66"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("visitor", sa.Column("normalized_name", sa.String(), nullable=True))
+    op.add_column("visitor", sa.Column("document_id", sa.String(), nullable=True))
+    op.add_column(
+        "visitor",
+        sa.Column("resident_id", postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    op.create_foreign_key(
+        "visitor_resident_id_fkey",
+        "visitor",
+        "resident",
+        ["resident_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+    # Same normalization as models.normalize_name. Existing visitors keep no
+    # resident, so they are not merged with each other or with new ones.
+    op.execute(
+        "UPDATE visitor SET normalized_name = "
+        "lower(btrim(regexp_replace(name, '\\s+', ' ', 'g')))"
+    )
+    op.alter_column("visitor", "normalized_name", nullable=False)
+    op.create_index(
+        "uq_visitor_resident_id_normalized_name_document_id",
+        "visitor",
+        ["resident_id", "normalized_name", sa.text("coalesce(document_id, '')")],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "uq_visitor_resident_id_normalized_name_document_id", table_name="visitor"
+    )
+    op.drop_constraint("visitor_resident_id_fkey", "visitor", type_="foreignkey")
+    op.drop_column("visitor", "resident_id")
+    op.drop_column("visitor", "document_id")
+    op.drop_column("visitor", "normalized_name")
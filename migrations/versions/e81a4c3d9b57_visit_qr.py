@@ -0,0 +1,68 @@
+"""visit qr
+
+Revision ID: e81a4c3d9b57
+Revises: 5c2d8e7f4a10
+Create Date: 2026-10-18 18:24:51.630417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "e81a4c3d9b57"
+down_revision = "5c2d8e7f4a10"
+branch_labels = None
+depends_on = None
+
+CLAIM_FUNCTION = """
+CREATE OR REPLACE FUNCTION visit_qr_claim() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- A visit moved to another partition claims its QR code again.
+    INSERT INTO visit_qr (qr_id, visit_id) VALUES (NEW.qr_id, NEW.id)
+    ON CONFLICT (qr_id) DO UPDATE SET visit_id = EXCLUDED.visit_id
+    WHERE visit_qr.visit_id = EXCLUDED.visit_id;
+    IF NOT FOUND THEN
+        RAISE USING
+            MESSAGE = 'QR code ' || NEW.qr_id || ' already belongs to a visit',
+            ERRCODE = 'unique_violation',
+            CONSTRAINT = 'visit_qr_pkey';
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+CLAIM_TRIGGER = """
+CREATE TRIGGER visit_qr_claim AFTER INSERT OR UPDATE OF qr_id ON visit
+FOR EACH ROW WHEN (NEW.qr_id IS NOT NULL) EXECUTE FUNCTION visit_qr_claim()
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "visit_qr",
+        sa.Column("qr_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("visit_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.ForeignKeyConstraint(["qr_id"], ["qr.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("qr_id"),
+    )
+    # Fails if a QR code was given to several visits since the partitioning.
+    op.execute(
+        "INSERT INTO visit_qr (qr_id, visit_id) "
+        "SELECT qr_id, id FROM visit WHERE qr_id IS NOT NULL"
+    )
+    archived = op.get_bind().execute(sa.text("SELECT to_regclass('visit_archive')"))
+    if archived.scalar() is not None:
+        op.execute(
+            "INSERT INTO visit_qr (qr_id, visit_id) "
+            "SELECT qr_id, id FROM visit_archive WHERE qr_id IS NOT NULL"
+        )
+    op.execute(CLAIM_FUNCTION)
+    op.execute(CLAIM_TRIGGER)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER visit_qr_claim ON visit")
+    op.execute("DROP FUNCTION visit_qr_claim()")
+    op.drop_table("visit_qr")
@@ -5,7 +5,16 @@ from fastapi import Request
 from starlette_admin.contrib.sqla import Admin, ModelView
 
 from src.auth import AuthHandler, MyAuthProvider
-from src.models import Guard, Qr, Residence, Resident, User, Visit, Visitor
+from src.models import (
+    Guard,
+    Qr,
+    RecurringVisit,
+    Residence,
+    Resident,
+    User,
+    Visit,
+    Visitor,
+)
 
 auth_handler = AuthHandler()
 
@@ -34,10 +43,18 @@ class UserView(ModelView):
         Returns:
             Any: Created Item
         """
-        data["password"] = auth_handler.get_password_hash(data["password"])
+        data["password"] = await auth_handler.get_password_hash_async(
+            data["password"]
+        )
         return await super().create(request, data)
 
 
+class VisitorView(ModelView):
+    # Derived from the name when it is set.
+    exclude_fields_from_create = ["normalized_name"]
+    exclude_fields_from_edit = ["normalized_name"]
+
+
 def add_views_to_app(app, engine_db):
     auth_provider = MyAuthProvider(engine_db)
     admin = Admin(
@@ -50,7 +67,8 @@ def add_views_to_app(app, engine_db):
     admin.add_view(ModelView(Resident, icon="fa fa-user"))
     admin.add_view(ModelView(Residence, icon="fa fa-home"))
     admin.add_view(ModelView(Visit, icon="fa fa-calendar"))
+    admin.add_view(ModelView(RecurringVisit, icon="fa fa-repeat"))
     admin.add_view(ModelView(Qr, icon="fa fa-qrcode"))
     admin.add_view(ModelView(Guard, icon="fa fa-shield"))
-    admin.add_view(ModelView(Visitor, icon="fa fa-user"))
+    admin.add_view(VisitorView(Visitor, icon="fa fa-user"))
     admin.mount_to(app)
@@ -1,24 +1,27 @@
 """
 Auth
 """
+import hashlib
 import os
 import secrets
 import time
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
 
 
 
-from .config.database import engine, get_session
+from .cache import principal_cache
+from .config.database import AsyncSessionLocal, get_async_session
+from .passwords import password_executor, pwd_context
 import jwt
 from fastapi import HTTPException, Security, Depends, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 from starlette.responses import Response
 from starlette_admin.auth import AdminUser, AuthProvider
 from starlette_admin.exceptions import FormValidationError, LoginFailed
-from .schema import AuthDetails
+from .schema import AuthDetails, Principal
 os.environ["TZ"] = "America/Guayaquil"
 time.tzset()
 
@@ -29,7 +32,7 @@ class AuthHandler:
     """
 
     security = HTTPBearer()
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = pwd_context
     secret = "secret"
 
     def get_password_hash(self, password):
@@ -57,6 +60,66 @@ class AuthHandler:
         """
         return self.pwd_context.verify(plain_password, hashed_password)
 
+    async def get_password_hash_async(self, password):
+        """
+        Hashes the provided password on the password executor, so the event
+        loop is not blocked while bcrypt runs.
+
+        Args:
+            password (str): The plain text password to be hashed.
+
+        Returns:
+            str: The hashed password.
+        """
+        return await password_executor.run(self.get_password_hash, password)
+
+    async def verify_password_async(self, plain_password, hashed_password):
+        """
+        Verifies the password on the password executor, so the event loop is
+        not blocked while bcrypt runs.
+
+        Args:
+            plain_password (str): The plain text password to be verified.
+            hashed_password (str): The hashed password to be compared against.
+
+        Returns:
+            bool: True if the passwords match, False otherwise.
+        """
+        return await password_executor.run(
+            self.verify_password, plain_password, hashed_password
+        )
+
+    def verify_and_update(self, plain_password, hashed_password):
+        """
+        Verifies the password and rehashes it if its hash uses another cost
+        than the configured one.
+
+        Args:
+            plain_password (str): The plain text password to be verified.
+            hashed_password (str): The hashed password to be compared against.
+
+        Returns:
+            tuple: Whether the passwords match, and the new hash to store or
+                None if the current one is up to date.
+        """
+        return self.pwd_context.verify_and_update(plain_password, hashed_password)
+
+    async def verify_and_update_async(self, plain_password, hashed_password):
+        """
+        Runs ``verify_and_update`` on the password executor.
+
+        Args:
+            plain_password (str): The plain text password to be verified.
+            hashed_password (str): The hashed password to be compared against.
+
+        Returns:
+            tuple: Whether the passwords match, and the new hash to store or
+                None if the current one is up to date.
+        """
+        return await password_executor.run(
+            self.verify_and_update, plain_password, hashed_password
+        )
+
     def encode_token(self, user_id):
         """
         Encodes a JWT token with the provided user ID as the subject.
@@ -74,9 +137,9 @@ class AuthHandler:
         }
         return jwt.encode(payload, self.secret, algorithm="HS256")
 
-    def decode_token(self, token):
+    def decode_payload(self, token):
         """
-        Decodes a JWT token and returns the subject (user ID) if the token is valid.
+        Decodes a JWT token and returns its payload if the token is valid.
 
         Args:
             token (str): The JWT token to be decoded.
@@ -85,11 +148,10 @@ class AuthHandler:
             HTTPException: If the token is expired or invalid.
 
         Returns:
-            str: The user ID (subject) of the token.
+            dict: The payload of the token.
         """
         try:
-            payload = jwt.decode(token, self.secret, algorithms=["HS256"])
-            return payload["sub"]
+            return jwt.decode(token, self.secret, algorithms=["HS256"])
         except jwt.ExpiredSignatureError as exc:
             raise HTTPException(
                 status_code=401, detail="Signature has expired"
@@ -97,6 +159,21 @@ class AuthHandler:
         except jwt.InvalidTokenError as e:
             raise HTTPException(status_code=401, detail="Invalid token") from e
 
+    def decode_token(self, token):
+        """
+        Decodes a JWT token and returns the subject (user ID) if the token is valid.
+
+        Args:
+            token (str): The JWT token to be decoded.
+
+        Raises:
+            HTTPException: If the token is expired or invalid.
+
+        Returns:
+            str: The user ID (subject) of the token.
+        """
+        return self.decode_payload(token)["sub"]
+
     def auth_wrapper(self, auth: HTTPAuthorizationCredentials = Security(security)):
         """
         Wrapper function for handling authentication in FastAPI routes.
@@ -112,6 +189,75 @@ class AuthHandler:
         """
         return self.decode_token(auth.credentials)
 
+    async def principal_wrapper(
+        self,
+        auth: HTTPAuthorizationCredentials = Security(security),
+        db: AsyncSession = Depends(get_async_session),
+    ) -> Principal:
+        """
+        Dependency resolving the bearer token into the user it belongs to.
+
+        Verified tokens are cached by hash until they expire, at most
+        ``PRINCIPAL_CACHE_TTL`` seconds, so repeated requests with the same
+        token skip both the signature check and the user lookup. A role or
+        active flag change takes effect once the cached entry runs out.
+
+        Args:
+            auth: The credentials extracted from the Authorization header.
+            db (AsyncSession): SQLAlchemy database session.
+
+        Returns:
+            Principal: ID, role and active flag of the user.
+
+        Raises:
+            HTTPException: If the token is expired, invalid or its user no
+                longer exists.
+        """
+        return await self.get_principal(auth.credentials, db)
+
+    async def get_principal(self, token: str, db: AsyncSession) -> Principal:
+        """
+        Resolve an access token into the user it belongs to, through
+        ``principal_cache``.
+
+        Args:
+            token (str): Access token.
+            db (AsyncSession): SQLAlchemy database session.
+
+        Returns:
+            Principal: ID, role and active flag of the user.
+
+        Raises:
+            HTTPException: If the token is expired, invalid or its user no
+                longer exists.
+        """
+        from .models import User
+
+        key = hashlib.sha256(token.encode()).hexdigest()
+        principal = principal_cache.get(key)
+        if principal is not None:
+            return principal
+        payload = self.decode_payload(token)
+        result = await db.execute(
+            select(User.id, User.role, User.is_active, User.resident_id).filter_by(
+                id=payload["sub"]
+            )
+        )
+        user = result.first()
+        if user is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        principal = Principal(
+            id=user.id,
+            role=user.role.value,
+            is_active=bool(user.is_active),
+            resident_id=user.resident_id,
+        )
+        ttl = principal_cache.ttl
+        if "exp" in payload:
+            ttl = min(ttl, payload["exp"] - time.time())
+        principal_cache.set(key, principal, ttl=ttl)
+        return principal
+
     def refresh_token(self, token):
         """
         Refreshes a JWT token.
@@ -149,11 +295,10 @@ class AuthHandler:
 
 
 class MyAuthProvider(AuthProvider):
-    from src.models import User, Role
     login_path = '/login' 
     logout_path = '/logout'
     allow_paths = ['/login', '/logout']
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = pwd_context
 
     def __init__(self, engine):
        self.engine = engine
@@ -161,11 +306,16 @@ class MyAuthProvider(AuthProvider):
 
     def verify_password(self, plain_password, hashed_password):
         return self.pwd_context.verify(plain_password, hashed_password)
+
+    async def verify_password_async(self, plain_password, hashed_password):
+        return await password_executor.run(
+            self.verify_password, plain_password, hashed_password
+        )
     
     def is_admin(self, role):
-        return role == self.Role.ADMIN
-    
-    session = Session(bind=engine)
+        from .models import Role
+
+        return role == Role.ADMIN
     
     async def login(
         self,
@@ -177,13 +327,17 @@ class MyAuthProvider(AuthProvider):
     ) -> Response:
         
         
-        user = self.session.query(self.User).filter_by(username=username).first()
+        from .models import User
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(User).filter_by(username=username))
+            user = result.scalars().first()
         if len(username) < 3:
             """Form data validation"""
             raise FormValidationError(
                 {"username": "Ensure username has at least 03 characters"}
             )
-        if user and self.verify_password(password, user.password) and self.is_admin(user.role):
+        if user and await self.verify_password_async(password, user.password) and self.is_admin(user.role):
             """Save `username` in session"""
             request.session.update({"username": username})
             return response
@@ -191,7 +345,11 @@ class MyAuthProvider(AuthProvider):
 
     async def is_authenticated(self, request) -> bool:
         username = request.session.get("username", None)
-        user = self.session.query(self.User).filter_by(username=username).first()
+        from .models import User
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(User).filter_by(username=username))
+            user = result.scalars().first()
         if user:  
             """
             Save current `user` object in the request state. Can be used later
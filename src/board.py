@@ -0,0 +1,84 @@
+"""
+Live visit board
+"""
+import asyncio
+import uuid
+from datetime import date
+
+from fastapi import Response, WebSocket, status
+
+from . import crud
+from .config.database import AsyncSessionLocal
+from .events import visit_broker
+from .responses import render
+
+
+async def board_snapshot(user_id: uuid.UUID) -> dict:
+    """
+    Get the board of a guard, as a ``snapshot`` event.
+
+    Args:
+        user_id (uuid.UUID): ID of the guard's user.
+
+    Returns:
+        dict: All of today's visits grouped by state, or None if the user
+            has no board.
+    """
+    async with AsyncSessionLocal() as session:
+        page = await crud.get_user_visits(session, user_id=user_id)
+    if page is None or isinstance(page, Response):
+        return None
+    return {"event": "snapshot", **page}
+
+
+def on_board(event: dict) -> bool:
+    """
+    Tell whether an event concerns today's board.
+    """
+    if event["event"] != "visit":
+        return True
+    return event["visit"]["date"].date() == date.today()
+
+
+async def _wait_disconnect(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+async def stream_board(websocket: WebSocket, user_id: uuid.UUID):
+    """
+    Send the board of a guard over an accepted WebSocket until it closes.
+
+    The guard first gets a ``snapshot`` event with all of today's visits,
+    as returned by ``GET /api/user/visit``, then every ``visit`` event
+    about today's visits and every ``state`` event as they are published. The subscription
+    is taken before the snapshot is read, so no change falls in between. A
+    ``resync`` from the broker is answered with a new snapshot.
+
+    Args:
+        websocket (WebSocket): Accepted WebSocket.
+        user_id (uuid.UUID): ID of the guard's user.
+    """
+    queue = visit_broker.subscribe()
+    disconnected = asyncio.ensure_future(_wait_disconnect(websocket))
+    try:
+        event = {"event": "resync"}
+        while True:
+            if event["event"] == "resync":
+                event = await board_snapshot(user_id)
+                if event is None:
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                    return
+            if on_board(event):
+                await websocket.send_text(render(event).decode())
+            received = asyncio.ensure_future(queue.get())
+            await asyncio.wait(
+                {received, disconnected}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected.done():
+                received.cancel()
+                return
+            event = received.result()
+    finally:
+        disconnected.cancel()
+        visit_broker.unsubscribe(queue)
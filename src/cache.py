@@ -0,0 +1,145 @@
+"""
+In-memory caches
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Bounded least-recently-used cache whose entries expire after a TTL.
+
+    The cache is local to the process: entries invalidated in one worker
+    stay cached in the others until their TTL runs out, so the TTL bounds
+    how stale a read can be.
+
+    Within a process, a value read from the database while the key is
+    invalidated must not be cached afterwards. Readers take the key's
+    ``generation`` before their query and pass it to ``set``, which drops
+    the value if the key was invalidated in between.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        # Counter value of the last invalidation of each key, bounded like
+        # the entries. Keys dropped from it report the highest dropped value.
+        self._generations = OrderedDict()
+        self._generation_floor = 0
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get the value cached for ``key``, None if missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self, key) -> int:
+        """
+        Get the invalidation generation of ``key``, to pass to ``set``.
+        """
+        with self._lock:
+            return self._generations.get(key, self._generation_floor)
+
+    def set(self, key, value, ttl: float = None, generation: int = None):
+        """
+        Cache ``value`` for ``key``, evicting the least recently used entry
+        when the cache is full.
+
+        Args:
+            key: Cache key.
+            value: Value to cache.
+            ttl (float): Seconds the entry stays valid, defaults to the
+                cache TTL.
+            generation (int): ``generation`` of the key taken before
+                ``value`` was read. Nothing is cached if the key was
+                invalidated since.
+        """
+        if self.maxsize <= 0:
+            return
+        expires_at = self.clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            current = self._generations.get(key, self._generation_floor)
+            if generation is not None and generation != current:
+                return
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        """
+        Drop the entries cached for ``keys``.
+        """
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+                self._counter += 1
+                self._generations[key] = self._counter
+                self._generations.move_to_end(key)
+            while len(self._generations) > self.maxsize:
+                _, dropped = self._generations.popitem(last=False)
+                self._generation_floor = max(self._generation_floor, dropped)
+
+    def clear(self):
+        """
+        Drop every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Verification payloads of valid QR codes, keyed by QR id.
+qr_cache = TTLCache(
+    maxsize=int(os.getenv("QR_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("QR_CACHE_TTL", "30")),
+)
+
+# Principals resolved from verified access tokens, keyed by token hash.
+principal_cache = TTLCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "60")),
+)
+
+# Visit counts per state, keyed by resident or by day for guards.
+visit_summary_cache = TTLCache(
+    maxsize=int(os.getenv("VISIT_SUMMARY_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("VISIT_SUMMARY_CACHE_TTL", "5")),
+)
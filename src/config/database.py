@@ -3,15 +3,151 @@ Database Configuration
 """
 
 
+import logging
 import os
+import threading
+import time
+from contextvars import ContextVar
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-engine = create_engine(DATABASE_URL)
+ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Statements running at least this long are logged.
+SLOW_QUERY_THRESHOLD = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200")) / 1000
+
+logger = logging.getLogger(__name__)
+
+
+class WaitTrackingPoolMixin:
+    """
+    Count the checkouts that had to wait for a connection to be returned
+    because the pool and its overflow were exhausted.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_time = 0.0
+        self._waits_lock = threading.Lock()
+
+    def _do_get(self):
+        exhausted = (
+            self._max_overflow > -1
+            and self._overflow >= self._max_overflow
+            and self._pool.empty()
+        )
+        if not exhausted:
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            with self._waits_lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - start
+
+
+class WaitTrackingQueuePool(WaitTrackingPoolMixin, QueuePool):
+    """
+    QueuePool that records checkout waits.
+    """
+
+
+class WaitTrackingAsyncQueuePool(WaitTrackingPoolMixin, AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool that records checkout waits.
+    """
+
+
+pool_options = {
+    "pool_size": POOL_SIZE,
+    "max_overflow": POOL_MAX_OVERFLOW,
+    "pool_timeout": POOL_TIMEOUT,
+    "pool_recycle": POOL_RECYCLE,
+    "pool_pre_ping": POOL_PRE_PING,
+}
+engine = create_engine(DATABASE_URL, poolclass=WaitTrackingQueuePool, **pool_options)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, poolclass=WaitTrackingAsyncQueuePool, **pool_options
+)
+
+
+class QueryStats:
+    """
+    Statements executed on behalf of one request.
+    """
+
+    __slots__ = ("count", "duration", "slow", "slowest", "slowest_statement")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slow = 0
+        self.slowest = 0.0
+        self.slowest_statement = None
+
+    def record(self, statement: str, duration: float):
+        """
+        Account for a statement that took ``duration`` seconds.
+        """
+        self.count += 1
+        self.duration += duration
+        if duration >= SLOW_QUERY_THRESHOLD:
+            self.slow += 1
+        if duration > self.slowest:
+            self.slowest = duration
+            self.slowest_statement = statement
+
+
+# Stats of the request being served. The object is shared with the tasks and
+# threads the request spawns, so statements run there are counted as well.
+query_stats: ContextVar = ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context.query_start
+    stats = query_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    if duration >= SLOW_QUERY_THRESHOLD:
+        # Parameters are left out, they hold personal data.
+        logger.warning(
+            "Slow query", extra={"duration": duration, "statement": statement}
+        )
+
+
+def track_queries(engine):
+    """
+    Time the statements run by ``engine``: add them to the ``query_stats``
+    of the current request and log the slow ones.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+track_queries(engine)
+track_queries(async_engine.sync_engine)
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 Base = declarative_base()
 
@@ -20,9 +156,50 @@ def get_session() -> sessionmaker:
     """
     Get a new database session.
     """
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     session = SessionLocal()
     try:
         yield session
     finally:
         session.close()
+
+
+async def get_async_session() -> AsyncSession:
+    """
+    Get a new asynchronous database session.
+
+    Objects are not expired on commit, so they can still be serialized once
+    the route returns without triggering a lazy load.
+    """
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+def pool_statistics(pool) -> dict:
+    """
+    Get the usage statistics of a connection pool.
+
+    Args:
+        pool (Pool): SQLAlchemy connection pool.
+
+    Returns:
+        dict: Pool size, checked in/out connections, overflow and waits.
+    """
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": pool._max_overflow,
+        "waits": getattr(pool, "waits", 0),
+        "wait_time": getattr(pool, "wait_time", 0.0),
+    }
+
+
+def get_pool_statistics() -> dict:
+    """
+    Get the usage statistics of the sync and async connection pools.
+    """
+    return {
+        "sync": pool_statistics(engine.pool),
+        "async": pool_statistics(async_engine.sync_engine.pool),
+    }
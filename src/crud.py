@@ -2,28 +2,43 @@ import os
 import time
 import uuid
 from datetime import date, datetime
-from typing import Type  # noqa: UP035
+from typing import List, Type  # noqa: UP035
 
 from fastapi import Response, status
 from pydantic import BaseModel
-from sqlalchemy.orm import Session, class_mapper, defer
+from sqlalchemy import func, insert, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import class_mapper, defer, joinedload
 
 from . import models, schema, utils
 from .auth import AuthHandler
+from .cache import qr_cache, visit_summary_cache
 from .config.database import Base
+from .events import state_event, visit_broker, visit_event
+from .tasks import (
+    RECURRING_VISIT_DAYS,
+    expiry_scheduler,
+    materialize_recurring_visits,
+)
 
 os.environ["TZ"] = "America/Guayaquil"
 time.tzset()
 
 auth_handler = AuthHandler()
 
+VISIT_PAGE_SIZE = 50
+MAX_VISIT_PAGE_SIZE = 200
 
-def create_model(db: Session, model_schema: Type[BaseModel], model: Type[Base]):
+
+async def create_model(
+    db: AsyncSession, model_schema: Type[BaseModel], model: Type[Base]
+):
     """
     Create a new model instance in the database.
 
     Args:
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
         model_schema (Type[BaseModel]): Pydantic model schema.
         model (Type[Base]): SQLAlchemy model.
 
@@ -32,142 +47,373 @@ def create_model(db: Session, model_schema: Type[BaseModel], model: Type[Base]):
     """
     db_model = model(**model_schema.dict())
     db.add(db_model)
-    db.commit()
-    db.refresh(db_model)
+    await db.commit()
+    await db.refresh(db_model)
     return db_model
 
 
-def create_visitor(db: Session, name: str):
+async def resolve_visitors(
+    session: AsyncSession, visitors: list, resident_id: uuid.UUID = None
+) -> list:
+    """
+    Get the visitor records of a resident's visitors, creating the new ones.
+
+    A resident's visitors are matched on their normalized name and document
+    id through the unique index on ``visitor``. All of them are written with
+    one ``INSERT ... ON CONFLICT DO UPDATE``, which returns the existing row
+    of a repeat visitor with the latest spelling of its name. Visitors
+    without a resident, e.g. walk-ins registered by a guard, always get a
+    new row. The caller commits.
+
+    Args:
+        session (AsyncSession): SQLAlchemy database session.
+        visitors (list): ``(name, document_id)`` pairs, the document id may
+            be None.
+        resident_id (uuid.UUID): Resident the visitors belong to.
+
+    Returns:
+        list: Visitor instances, in the order of ``visitors``.
+    """
+    keys = [
+        (models.normalize_name(name), (document_id or "").strip() or None)
+        for name, document_id in visitors
+    ]
+    rows = {}
+    for index, ((name, _), key) in enumerate(zip(visitors, keys, strict=True)):
+        rows[key if resident_id else index] = {
+            "id": uuid.uuid4(),
+            "name": name,
+            "normalized_name": key[0],
+            "document_id": key[1],
+            "resident_id": resident_id,
+        }
+    statement = pg_insert(models.Visitor).values(list(rows.values()))
+    if resident_id is not None:
+        statement = statement.on_conflict_do_update(
+            index_elements=[
+                models.Visitor.resident_id,
+                models.Visitor.normalized_name,
+                models.VISITOR_DOCUMENT_KEY,
+            ],
+            set_={"name": statement.excluded.name, "updated_at": datetime.now()},
+        )
+    result = await session.execute(
+        select(models.Visitor)
+        .from_statement(statement.returning(*models.Visitor.__table__.c))
+        .execution_options(populate_existing=True)
+    )
+    resolved = result.scalars().all()
+    # RETURNING does not keep the order of the VALUES.
+    if resident_id is None:
+        by_id = {visitor.id: visitor for visitor in resolved}
+        return [by_id[row["id"]] for row in rows.values()]
+    # Matched like the conflict target, which treats an empty document as none.
+    by_key = {
+        (visitor.normalized_name, (visitor.document_id or "").strip() or None): visitor
+        for visitor in resolved
+    }
+    return [by_key[key] for key in keys]
+
+
+async def create_visitor(
+    db: AsyncSession,
+    name: str,
+    resident_id: uuid.UUID = None,
+    document_id: str = None,
+):
     """
-    Create a new visitor record in the database.
+    Create a visitor record, or reuse the resident's existing one.
 
     Args:
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
         name (str): Name of the visitor.
+        resident_id (uuid.UUID): Resident the visitor belongs to.
+        document_id (str): Identity document of the visitor.
 
     Returns:
-        Visitor: Created visitor instance.
+        Visitor: Created or existing visitor instance.
     """
-    while True:
-        new_id = uuid.uuid4()
-        existing_visitor = db.query(models.Visitor).filter_by(id=new_id).first()
-        if existing_visitor is None:
-            visitor = models.Visitor(id=new_id, name=name)
-            db.add(visitor)
-            db.commit()
-            return visitor
-        return existing_visitor
+    (visitor,) = await resolve_visitors(db, [(name, document_id)], resident_id)
+    await db.commit()
+    return visitor
 
 
-def create_qr(db: Session):
+async def create_qr(db: AsyncSession):
     """
     Create a new QR code record in the database.
 
     Args:
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
 
     Returns:
         Qr: Created QR code instance.
     """
-    while True:
-        new_id = uuid.uuid4()
-        existing_qr = db.query(models.Qr).filter_by(id=new_id).first()
-        if existing_qr is None:
-            qr = models.Qr(id=new_id)
-            db.add(qr)
-            db.commit()
-            return qr
-        return existing_qr
+    qr = models.Qr(id=uuid.uuid4())
+    db.add(qr)
+    await db.commit()
+    return qr
 
 
-def create_visit(session: Session, name: str, date: datetime, user_id: uuid.UUID):
+async def create_visit(
+    session: AsyncSession,
+    name: str,
+    date: datetime,
+    principal: schema.Principal,
+    document_id: str = None,
+):
     """
     Create a new visit record in the database.
 
+    The visitor is resolved with ``resolve_visitors``, so a resident's
+    repeat visitor reuses its record. The QR code and the visit get their
+    ids client side and everything is committed once. A uuid4 collision is
+    left to the primary key constraint.
+
     Args:
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
         name (str): Name of the visitor.
         date (datetime): Date of the visit.
-        visit (schema.VisitCreate): Visit data.
+        principal (schema.Principal): Authenticated user.
+        document_id (str): Identity document of the visitor.
 
     Returns:
         Visit: Created visit instance.
     """
-    user = session.query(models.User).filter_by(id=user_id).first()
-    visit = schema.VisitCreate()
-    if not user.is_active:
+    if not principal.is_active:
+        return Response(status_code=status.HTTP_401_UNAUTHORIZED)
+    is_guard = principal.role == models.Role.GUARD.value
+    if not is_guard and principal.resident_id is None:
+        return Response(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    (visitor,) = await resolve_visitors(
+        session, [(name, document_id)], principal.resident_id
+    )
+    visit = models.Visit(id=uuid.uuid4(), date=date, visitor_id=visitor.id)
+    if is_guard:
+        visit.state = models.VisitState.REGISTERED
+    else:
+        qr = models.Qr(id=uuid.uuid4())
+        session.add(qr)
+        visit.qr_id = qr.id
+        visit.resident_id = principal.resident_id
+        visit.state = models.VisitState.PENDING
+    session.add(visit)
+    await session.commit()
+    visit_broker.publish(visit_event(visit, visitor.name))
+    if not is_guard:
+        expiry_scheduler.notify(visit.date)
+    return visit
+
+
+async def create_visits(
+    session: AsyncSession,
+    visits: List[schema.VisitRequest],
+    principal: schema.Principal,
+):
+    """
+    Create several visits in one transaction.
+
+    Ids are generated client side, so the QR codes, visitors and visits are
+    each written with a single multi-row ``INSERT`` and committed once,
+    whatever the number of visits. Visitors are resolved with
+    ``resolve_visitors``.
+
+    Args:
+        session (AsyncSession): SQLAlchemy database session.
+        visits (List[schema.VisitRequest]): Visitor names and dates.
+        principal (schema.Principal): Authenticated user.
+
+    Returns:
+        list: Created visit instances, in the order they were requested.
+    """
+    if not principal.is_active:
         return Response(status_code=status.HTTP_401_UNAUTHORIZED)
-    if user.role == models.Role.GUARD:
-        visit.state = schema.VisitState.REGISTERED
-        visit.date = date
-        visit.visitor_id = create_visitor(session, name).id
-        new_visit = create_model(session, visit, models.Visit)
-        return new_visit
-
-    resident = session.query(models.Resident)
-    resident = resident.join(models.User).filter(models.User.id == user_id).first()
-    visit.qr_id = create_qr(session).id
-    visit.visitor_id = create_visitor(session, name).id
-    visit.date = date
-    visit.resident_id = resident.id
-    visit.state = schema.VisitState.PENDING
-    new_visit = create_model(session, visit, models.Visit)
-    return new_visit
-
-
-def create_residence(db: Session, address: str, resident_id: uuid.UUID):
+    is_guard = principal.role == models.Role.GUARD.value
+    if not is_guard and principal.resident_id is None:
+        return Response(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    visitors = await resolve_visitors(
+        session,
+        [(visit.name, visit.document_id) for visit in visits],
+        principal.resident_id,
+    )
+    qr_rows = [] if is_guard else [{"id": uuid.uuid4()} for _ in visits]
+    visit_rows = [
+        {
+            "id": uuid.uuid4(),
+            "date": visit.date,
+            "visitor_id": visitor.id,
+            "qr_id": None if is_guard else qr_rows[index]["id"],
+            "resident_id": principal.resident_id,
+            "state": (
+                models.VisitState.REGISTERED if is_guard else models.VisitState.PENDING
+            ),
+        }
+        for index, (visit, visitor) in enumerate(zip(visits, visitors, strict=True))
+    ]
+    if qr_rows:
+        await session.execute(insert(models.Qr).values(qr_rows))
+    result = await session.execute(
+        select(models.Visit).from_statement(
+            insert(models.Visit).values(visit_rows).returning(*models.Visit.__table__.c)
+        )
+    )
+    created = {visit.id: visit for visit in result.scalars()}
+    await session.commit()
+    visit_broker.publish(
+        *(
+            visit_event(created[row["id"]], visitor.name)
+            for row, visitor in zip(visit_rows, visitors, strict=True)
+        )
+    )
+    if not is_guard:
+        expiry_scheduler.notify(min(visit.date for visit in visits))
+    return [created[row["id"]] for row in visit_rows]
+
+
+async def create_recurring_visit(
+    session: AsyncSession,
+    recurring: schema.RecurringVisitCreate,
+    principal: schema.Principal,
+):
+    """
+    Create a recurring visit for a resident.
+
+    Only the occurrences of the next ``RECURRING_VISIT_DAYS`` days get a
+    visit and a QR code right away; the expiry scheduler creates the
+    following ones as the days go by.
+
+    Args:
+        session (AsyncSession): SQLAlchemy database session.
+        recurring (schema.RecurringVisitCreate): Visitor name and schedule.
+        principal (schema.Principal): Authenticated user.
+
+    Returns:
+        dict: Recurring visit and its materialized visits.
+    """
+    if not principal.is_active or principal.resident_id is None:
+        return Response(status_code=status.HTTP_401_UNAUTHORIZED)
+    (visitor,) = await resolve_visitors(
+        session, [(recurring.name, recurring.document_id)], principal.resident_id
+    )
+    recurring_visit = models.RecurringVisit(
+        id=uuid.uuid4(),
+        weekdays=sum(1 << (weekday - 1) for weekday in set(recurring.weekdays)),
+        start_time=recurring.start_time,
+        end_time=recurring.end_time,
+        start_date=recurring.start_date or date.today(),
+        end_date=recurring.end_date,
+        is_active=True,
+        visitor_id=visitor.id,
+        resident_id=principal.resident_id,
+    )
+    session.add(recurring_visit)
+    await session.flush()
+    visits = await session.run_sync(
+        materialize_recurring_visits,
+        datetime.now(),
+        RECURRING_VISIT_DAYS,
+        [recurring_visit.id],
+    )
+    await session.commit()
+    visit_broker.publish(*(visit_event(visit, visitor.name) for visit in visits))
+    if visits:
+        expiry_scheduler.notify(min(visit.date for visit in visits))
+    return {"recurring_visit": recurring_visit, "visits": visits}
+
+
+async def cancel_recurring_visit(
+    session: AsyncSession,
+    recurring_visit_id: uuid.UUID,
+    principal: schema.Principal,
+):
+    """
+    Stop a resident's recurring visit and cancel its pending visits.
+
+    Args:
+        session (AsyncSession): SQLAlchemy database session.
+        recurring_visit_id (uuid.UUID): ID of the recurring visit.
+        principal (schema.Principal): Authenticated user.
+
+    Returns:
+        dict: Number of pending visits cancelled, or a 404 response.
+    """
+    result = await session.execute(
+        update(models.RecurringVisit)
+        .where(
+            models.RecurringVisit.id == recurring_visit_id,
+            models.RecurringVisit.resident_id == principal.resident_id,
+        )
+        .values(is_active=False)
+        .returning(models.RecurringVisit.id)
+    )
+    if result.first() is None:
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+    result = await session.execute(
+        update(models.Visit)
+        .where(
+            models.Visit.recurring_visit_id == recurring_visit_id,
+            models.Visit.state == models.VisitState.PENDING,
+        )
+        .values(state=models.VisitState.CANCELLED)
+        .returning(models.Visit.id, models.Visit.qr_id)
+        .execution_options(synchronize_session=False)
+    )
+    cancelled = result.all()
+    await session.commit()
+    qr_cache.invalidate(*(str(visit.qr_id) for visit in cancelled))
+    if cancelled:
+        visit_broker.publish(
+            state_event(models.VisitState.CANCELLED, [visit.id for visit in cancelled])
+        )
+    return {"cancelled": len(cancelled)}
+
+
+async def create_residence(db: AsyncSession, address: str, resident_id: uuid.UUID):
     """
     Create a new residence record in the database.
 
     Args:
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
         address (str): Address of the residence.
         resident_id (uuid.UUID): ID of the resident.
 
     Returns:
         Residence: Created residence instance.
     """
-    while True:
-        new_id = uuid.uuid4()
-        existing_residence = db.query(models.Residence).filter_by(id=new_id).first()
-        if existing_residence is None:
-            residence = models.Residence(
-                id=new_id, address=address, resident_id=resident_id
-            )
-            db.add(residence)
-            db.commit()
-            return residence
-        return existing_residence
+    residence = models.Residence(
+        id=uuid.uuid4(), address=address, resident_id=resident_id
+    )
+    db.add(residence)
+    await db.commit()
+    return residence
 
 
-def create_user(db: Session, user: schema.UserCreate):
+async def create_user(db: AsyncSession, user: schema.UserCreate):
     """
     Create a new user record in the database.
 
     Args:
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
         user (schema.UserCreate): User data.
 
     Returns:
         User: Created user instance.
     """
-    while True:
-        new_id = uuid.uuid4()
-        existing_user = db.query(models.User).filter_by(id=new_id).first()
-        if existing_user is None:
-            user = models.User(id=new_id, **user.dict())
-            db.add(user)
-            db.commit()
-            return user
-        return existing_user
+    user = models.User(id=uuid.uuid4(), **user.dict())
+    db.add(user)
+    await db.commit()
+    return user
 
 
-def create_resident(db: Session, address: str, resident: schema.ResidentCreate):
+async def create_resident(
+    db: AsyncSession, address: str, resident: schema.ResidentCreate
+):
     """
     Create a new resident record in the database.
 
     Args:
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
         address (str): Address of the residence.
         resident (schema.ResidentCreate): Resident data.
 
@@ -179,14 +425,14 @@ def create_resident(db: Session, address: str, resident: schema.ResidentCreate):
         name=resident.name,
         username=resident.username,
     )
-    user = create_user(
+    user = await create_user(
         db,
         user=user,
     )
     user_id = user.id
     resident.user_id = user_id
-    resident = create_model(db, resident, models.Resident)
-    create_residence(db=db, address=address, resident_id=resident.id)
+    resident = await create_model(db, resident, models.Resident)
+    await create_residence(db=db, address=address, resident_id=resident.id)
     return resident
 
 
@@ -206,24 +452,27 @@ def get_visit_states():
     return {"visit_state": list_visits_state}
 
 
-def get_profile(db: Session, user_id: uuid.UUID):
+async def get_profile(db: AsyncSession, user_id: uuid.UUID):
     """
     Get the profile of a user.
 
     Args:
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
         user_id (uuid.UUID): ID of the user.
 
     Returns:
         dict: User profile.
     """
-    user = db.query(models.User).filter_by(id=user_id).first()
+    result = await db.execute(select(models.User).filter_by(id=user_id))
+    user = result.scalars().first()
 
     if user and user.role == "RESIDENT":
-        resident = db.query(models.Resident).filter_by(user_id=user_id).first()
-        residence = (
-            db.query(models.Residence).filter_by(id=resident.residence_id).first()
+        result = await db.execute(select(models.Resident).filter_by(user_id=user_id))
+        resident = result.scalars().first()
+        result = await db.execute(
+            select(models.Residence).filter_by(id=resident.residence_id)
         )
+        residence = result.scalars().first()
         return {
             "user": {
                 "id": user.id,
@@ -231,11 +480,7 @@ def get_profile(db: Session, user_id: uuid.UUID):
                 "username": user.username,
                 "phone": resident.phone,
             },
-            "residence": {
-                "address": residence.address,
-                "created_at": residence.created_date,
-                "information": residence.information,
-            },
+            "residence": residence,
         }
     return {"user": user}
 
@@ -250,79 +495,174 @@ def defer_everything_but(entity, cols):
     ]
 
 
-def get_user_visits(db: Session, user_id: uuid.UUID):
+async def get_user_visits(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    limit: int = None,
+    cursor: str = None,
+    date_from: datetime = None,
+    date_to: datetime = None,
+    state: schema.VisitState = None,
+):
     """
-    Get the visits of a user.
+    Get a page of the visits of a user, grouped by state.
+
+    Residents page through their whole history, guards through today's
+    visits, newest first. Pages are cut with a keyset on ``(date, id)``:
+    ``next_cursor`` points after the last visit of the page and is None on
+    the last page, so fetching a page costs the same however deep it is.
+    Guards get all of today's visits at once unless they pass a ``limit``
+    or a ``cursor``. Visitors (and residents, for guards) are eager-loaded
+    together with the visits.
 
     Args:
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
         user_id (uuid.UUID): ID of the user.
+        limit (int): Maximum number of visits in the page, defaults to
+            ``VISIT_PAGE_SIZE``.
+        cursor (str): ``next_cursor`` of the previous page.
+        date_from (datetime): Only visits on or after this date.
+        date_to (datetime): Only visits on or before this date.
+        state (schema.VisitState): Only visits in this state.
 
     Returns:
-        dict: User visits.
+        dict: Visits of the page grouped by state, and the next cursor.
     """
-    user = db.query(models.User).filter_by(id=user_id).first()
+    result = await db.execute(
+        select(models.User)
+        .options(joinedload(models.User.resident), joinedload(models.User.guard))
+        .filter_by(id=user_id)
+    )
+    user = result.scalars().first()
     if user is None:
         return Response(status_code=status.HTTP_401_UNAUTHORIZED)
     if user.role == models.Role.RESIDENT:
-        resident = db.query(models.Resident)
-        resident = resident.join(models.User).filter(models.User.id == user_id).first()
-        if resident is None:
+        if user.resident is None:
             return Response(status_code=status.HTTP_401_UNAUTHORIZED)
-        visits = db.query(models.Visit).filter_by(resident_id=resident.id).all()
-
-        grouped = utils.grouped_dict(visits)
-        for key in grouped.keys():
-            for visit in grouped[key]:
-                visitor = (
-                    db.query(models.Visitor).filter_by(id=visit.visitor_id).first()
-                )
-                visit.visitor = visitor
-        return {"visits": grouped}
-    if user.role == models.Role.GUARD:
-        guard = db.query(models.Guard)
-        guard = guard.join(models.User).filter(models.User.id == user_id).first()
-        if guard is None:
+        query = (
+            select(models.Visit)
+            .options(joinedload(models.Visit.visitor))
+            .filter(models.Visit.resident_id == user.resident.id)
+        )
+    elif user.role == models.Role.GUARD:
+        if user.guard is None:
             return Response(status_code=status.HTTP_401_UNAUTHORIZED)
         today = date.today()
         start_of_day = datetime.combine(today, datetime.min.time())
         end_of_day = datetime.combine(today, datetime.max.time())
-        visits = (
-            db.query(models.Visit)
+        query = (
+            select(models.Visit)
+            .options(
+                joinedload(models.Visit.visitor), joinedload(models.Visit.resident)
+            )
             .filter(models.Visit.date.between(start_of_day, end_of_day))
-            .all()
         )
-        gruoped_visits = utils.grouped_dict(visits)
-        for key in gruoped_visits.keys():
-            for visit in gruoped_visits[key]:
-                visitor = (
-                    db.query(models.Visitor).filter_by(id=visit.visitor_id).first()
-                )
-                resident = (
-                    db.query(models.Resident).filter_by(id=visit.resident_id).first()
-                )
-                visit.visitor = visitor
-                visit.resident = resident
-        return {"visits": gruoped_visits}
-
-
-def login(db: Session, auth_details: schema.AuthDetails):
+    else:
+        return None
+    if limit is None and (user.role == models.Role.RESIDENT or cursor is not None):
+        limit = VISIT_PAGE_SIZE
+
+    if date_from is not None:
+        query = query.filter(models.Visit.date >= date_from)
+    if date_to is not None:
+        query = query.filter(models.Visit.date <= date_to)
+    if state is not None:
+        query = query.filter(models.Visit.state == models.VisitState(state.value))
+    if cursor is not None:
+        try:
+            cursor_date, cursor_id = utils.decode_cursor(cursor)
+        except ValueError:
+            return Response(status_code=status.HTTP_400_BAD_REQUEST)
+        # The plain date bound lets the (resident_id, date) index drive the scan.
+        query = query.filter(
+            models.Visit.date <= cursor_date,
+            tuple_(models.Visit.date, models.Visit.id) < (cursor_date, cursor_id),
+        )
+    query = query.order_by(models.Visit.date.desc(), models.Visit.id.desc())
+    if limit is not None:
+        query = query.limit(limit + 1)
+    result = await db.execute(query)
+    visits = result.scalars().all()
+    next_cursor = None
+    if limit is not None and len(visits) > limit:
+        visits = visits[:limit]
+        next_cursor = utils.encode_cursor(visits[-1].date, visits[-1].id)
+    return {"visits": utils.grouped_dict(visits), "next_cursor": next_cursor}
+
+
+async def get_visit_summary(session: AsyncSession, principal: schema.Principal):
+    """
+    Count the visits of a user per state.
+
+    Residents get the counts of their whole history, guards those of
+    today's visits, computed with one ``GROUP BY``. Summaries are kept in
+    ``visit_summary_cache`` for ``VISIT_SUMMARY_CACHE_TTL`` seconds, so a
+    count can lag behind by that long.
+
+    Args:
+        session (AsyncSession): SQLAlchemy database session.
+        principal (schema.Principal): Authenticated user.
+
+    Returns:
+        dict: Number of visits per state, every state included, and total.
+    """
+    if principal.role == models.Role.GUARD.value:
+        today = date.today()
+        key = f"guard:{today}"
+        condition = models.Visit.date.between(
+            datetime.combine(today, datetime.min.time()),
+            datetime.combine(today, datetime.max.time()),
+        )
+    elif principal.resident_id is not None:
+        key = f"resident:{principal.resident_id}"
+        condition = models.Visit.resident_id == principal.resident_id
+    else:
+        return Response(status_code=status.HTTP_401_UNAUTHORIZED)
+    cached = visit_summary_cache.get(key)
+    if cached is not None:
+        return cached
+    result = await session.execute(
+        select(models.Visit.state, func.count())
+        .where(condition)
+        .group_by(models.Visit.state)
+    )
+    counts = {state.value: 0 for state in models.VisitState}
+    for state, count in result:
+        counts[state.value] = count
+    summary = {"counts": counts, "total": sum(counts.values())}
+    visit_summary_cache.set(key, summary)
+    return summary
+
+
+async def login(db: AsyncSession, auth_details: schema.AuthDetails):
     """
     Login a user.
 
+    A password hashed with another cost than ``BCRYPT_ROUNDS`` is rehashed
+    with the configured one once it has been verified.
+
     Args:
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
         username (str): Username of the user.
         password (str): Password of the user.
 
     Returns:
         dict: User data.
     """
-    user = db.query(models.User).filter_by(username=auth_details.username).first()
-    if (user is None) or (
-        not auth_handler.verify_password(auth_details.password, user.password)
-    ) or (not user.is_active):
+    result = await db.execute(
+        select(models.User).filter_by(username=auth_details.username)
+    )
+    user = result.scalars().first()
+    if user is None:
         return Response(status_code=status.HTTP_401_UNAUTHORIZED)
+    valid, new_hash = await auth_handler.verify_and_update_async(
+        auth_details.password, user.password
+    )
+    if (not valid) or (not user.is_active):
+        return Response(status_code=status.HTTP_401_UNAUTHORIZED)
+    if new_hash is not None:
+        user.password = new_hash
+        await db.commit()
     token = auth_handler.encode_token(user.id)
     refresh_token = auth_handler.refresh_token(token)
     return {
@@ -331,82 +671,126 @@ def login(db: Session, auth_details: schema.AuthDetails):
     }
 
 
-def update_password(db: Session, auth_details: schema.AuthDetails):
+async def update_password(db: AsyncSession, auth_details: schema.AuthDetails):
     """
     Update user password
     """
-    user = db.query(models.User).filter_by(username=auth_details.username).first()
+    result = await db.execute(
+        select(models.User).filter_by(username=auth_details.username)
+    )
+    user = result.scalars().first()
     if not user:
         return Response(status_code=status.HTTP_401_UNAUTHORIZED)
-    hash_password = auth_handler.get_password_hash(auth_details.password)
+    hash_password = await auth_handler.get_password_hash_async(auth_details.password)
     user.password = hash_password
-    db.commit()
+    await db.commit()
     return {"user": user}
 
 
-def get_visit(session: Session, visit_id: uuid.UUID, user_id: uuid.UUID):
+async def get_visit(
+    session: AsyncSession, visit_id: uuid.UUID, principal: schema.Principal
+):
     """
     Get a visit by id
     """
-    user = session.query(models.User).filter_by(id=user_id).first()
-    if user.role == models.Role.GUARD:
-        return session.query(models.Visit).filter_by(id=visit_id).first()
+    if principal.role == models.Role.GUARD.value:
+        result = await session.execute(select(models.Visit).filter_by(id=visit_id))
+        return result.scalars().first()
 
-    resident = session.query(models.Resident)
-    resident = resident.join(models.User).filter(models.User.id == user_id).first()
-    if resident is None:
+    if principal.resident_id is None:
         return Response(status_code=status.HTTP_401_UNAUTHORIZED)
-    visit = session.query(models.Visit).filter(models.Visit.id == visit_id).first()
+    result = await session.execute(
+        select(models.Visit)
+        .options(joinedload(models.Visit.visitor))
+        .filter(models.Visit.id == visit_id)
+    )
+    visit = result.scalars().first()
 
     if visit is None:
         return Response(status_code=status.HTTP_404_NOT_FOUND)
-    visitor = session.query(models.Visitor).filter_by(id=visit.visitor_id).first()
-    return {"visit": visit, "visitor": visitor}
+    return {"visit": visit, "visitor": visit.visitor}
 
 
-def register_visit(session: Session, qr_id: uuid.UUID, user_id: uuid.UUID):
+async def transition_visit(
+    session: AsyncSession,
+    qr_id: uuid.UUID,
+    expected: models.VisitState,
+    target: models.VisitState,
+):
     """
-    Register a visit by QR code
-    """
-    qr = session.query(models.Qr).filter_by(id=qr_id).first()
-    if qr is None:
-        return Response(status_code=status.HTTP_404_NOT_FOUND)
-    visit = session.query(models.Visit).filter_by(qr_id=qr_id).first()
-    if visit.state.value == schema.VisitState.REGISTERED.value:
+    Move the visit of a QR code from ``expected`` to ``target`` state.
+
+    The check and the write are one conditional ``UPDATE ... RETURNING``,
+    so concurrent scans of the same code cannot both succeed. Occurrences
+    of recurring visits past their ``valid_until`` are not moved. The state
+    is only read again when the update matched nothing, to tell a missing
+    visit from a conflict.
+
+    Args:
+        session (AsyncSession): SQLAlchemy database session.
+        qr_id (uuid.UUID): ID of the QR code.
+        expected (VisitState): State the visit must be in.
+        target (VisitState): State the visit moves to.
+
+    Returns:
+        Visit: Updated visit instance, or a 404/409 response.
+    """
+    now = datetime.now()
+    statement = (
+        update(models.Visit)
+        .where(
+            models.Visit.qr_id == qr_id,
+            models.Visit.state == expected,
+            or_(models.Visit.valid_until.is_(None), models.Visit.valid_until > now),
+        )
+        .values(state=target, register_date=now)
+        .returning(*models.Visit.__table__.c)
+    )
+    result = await session.execute(
+        select(models.Visit)
+        .from_statement(statement)
+        .execution_options(populate_existing=True)
+    )
+    visit = result.scalars().first()
+    await session.commit()
+    if visit is None:
+        result = await session.execute(select(models.Visit.id).filter_by(qr_id=qr_id))
+        if result.first() is None:
+            return Response(status_code=status.HTTP_404_NOT_FOUND)
         return Response(status_code=status.HTTP_409_CONFLICT)
-    visit.state = schema.VisitState.REGISTERED
-    visit.register_date = datetime.now()
-    session.commit()
+    qr_cache.invalidate(str(qr_id))
+    visit_broker.publish(visit_event(visit))
     return visit
 
 
-def canceled_visit(session: Session, qr_id: uuid.UUID, user_id: uuid.UUID):
+async def register_visit(session: AsyncSession, qr_id: uuid.UUID, user_id: uuid.UUID):
     """
-    Cancel a visit by QR code
+    Register a pending visit by QR code
     """
-    qr = session.query(models.Qr).filter_by(id=qr_id).first()
-    if qr is None:
-        return Response(status_code=status.HTTP_404_NOT_FOUND)
-    visit = session.query(models.Visit).filter_by(qr_id=qr_id).first()
-    if visit.state.value == schema.VisitState.CANCELLED.value:
-        return Response(status_code=status.HTTP_409_CONFLICT)
-    visit.state = schema.VisitState.CANCELLED
-    visit.register_date = datetime.now()
-    session.commit()
-    return visit
+    return await transition_visit(
+        session, qr_id, models.VisitState.PENDING, models.VisitState.REGISTERED
+    )
+
+
+async def canceled_visit(session: AsyncSession, qr_id: uuid.UUID, user_id: uuid.UUID):
+    """
+    Cancel a pending visit by QR code
+    """
+    return await transition_visit(
+        session, qr_id, models.VisitState.PENDING, models.VisitState.CANCELLED
+    )
 
 
-def verify_visit(session: Session, qr_id: uuid.UUID, user_id: uuid.UUID):
+async def verify_visit(session: AsyncSession, qr_id: uuid.UUID, user_id: uuid.UUID):
     """
     Verify a visit by QR code
     """
-    qr = session.query(models.QR).filter_by(id=qr_id).first()
+    result = await session.execute(select(models.Qr).filter_by(id=qr_id))
+    qr = result.scalars().first()
     if qr is None:
         return Response(status_code=status.HTTP_404_NOT_FOUND)
-    visit = session.query(models.Visit).filter_by(qr_id=qr_id).first()
-    if (
-        visit.state.value == schema.VisitState.REGISTERED.value
-        or visit.state.value == schema.VisitState.CANCELLED
-    ):
+    result = await session.execute(select(models.Visit).filter_by(qr_id=qr_id))
+    visit = result.scalars().first()
+    if visit.state != models.VisitState.PENDING or utils.window_ended(visit):
         return Response(status_code=status.HTTP_409_CONFLICT)
     return visit
@@ -0,0 +1,123 @@
+"""
+Visit events
+"""
+import asyncio
+import os
+import threading
+
+VISIT_EVENT_QUEUE_SIZE = int(os.getenv("VISIT_EVENT_QUEUE_SIZE", "1000"))
+
+
+def visit_event(visit, visitor_name: str = None) -> dict:
+    """
+    Build the event published when a visit is created or changes.
+
+    Args:
+        visit (Visit): Created or updated visit.
+        visitor_name (str): Name of the visitor, when it is at hand.
+
+    Returns:
+        dict: Event with the columns of the visit.
+    """
+    payload = visit.to_dict()
+    payload["visitor"] = (
+        None if visitor_name is None else {"id": visit.visitor_id, "name": visitor_name}
+    )
+    return {"event": "visit", "visit": payload}
+
+
+def state_event(state, visit_ids) -> dict:
+    """
+    Build the event published when several visits move to ``state`` at once.
+
+    Args:
+        state (VisitState): New state of the visits.
+        visit_ids (list): IDs of the visits.
+
+    Returns:
+        dict: Event with the state and the visit IDs.
+    """
+    return {"event": "state", "state": state, "visit_ids": list(visit_ids)}
+
+
+class VisitBroker:
+    """
+    In-process publish/subscribe channel for visit events.
+
+    Each subscriber gets a bounded ``asyncio.Queue`` on its own event loop.
+    Events can be published from any thread, e.g. the expiry job, and are
+    handed to the subscriber loops with ``call_soon_threadsafe``. A
+    subscriber that falls ``queue_size`` events behind has its queue
+    replaced by a single ``resync`` event, telling it to reload a snapshot.
+
+    The broker is local to the process: with several workers, a subscriber
+    only sees the changes made by the worker it is connected to.
+    """
+
+    def __init__(self, queue_size: int = VISIT_EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.published = 0
+        self.overflows = 0
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Register a subscriber on the running event loop.
+
+        Returns:
+            asyncio.Queue: Queue the events are delivered to.
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """
+        Stop delivering events to ``queue``.
+        """
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def publish(self, *events: dict):
+        """
+        Deliver ``events`` to every subscriber, in order.
+        """
+        if not events:
+            return
+        with self._lock:
+            self.published += len(events)
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, events)
+            except RuntimeError:
+                # The loop of the subscriber is closed.
+                self.unsubscribe(queue)
+
+    def _deliver(self, queue: asyncio.Queue, events: tuple):
+        for event in events:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"event": "resync"})
+                with self._lock:
+                    self.overflows += 1
+                return
+
+    def stats(self) -> dict:
+        """
+        Get the broker counters.
+        """
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "overflows": self.overflows,
+            }
+
+
+visit_broker = VisitBroker()
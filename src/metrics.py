@@ -0,0 +1,230 @@
+"""
+Prometheus metrics
+"""
+import os
+import time
+
+from fastapi import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.datastructures import MutableHeaders
+
+from .config.database import QueryStats, get_pool_statistics, query_stats
+
+# Adds the query statistics of each response as X-DB-* headers.
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to serve HTTP requests.",
+    ["route", "method", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being served.",
+    ["method"],
+)
+DB_STATEMENTS = Histogram(
+    "db_statements_per_request",
+    "SQL statements executed per request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+DB_TIME = Histogram(
+    "db_time_per_request_seconds",
+    "Time spent executing SQL statements per request.",
+    ["route"],
+)
+DB_SLOWEST = Histogram(
+    "db_slowest_statement_seconds",
+    "Duration of the slowest SQL statement of each request.",
+    ["route"],
+)
+DB_SLOW_STATEMENTS = Counter(
+    "db_slow_statements",
+    "SQL statements slower than SLOW_QUERY_THRESHOLD_MS.",
+    ["route"],
+)
+
+QR_VERIFICATIONS = Counter(
+    "qr_verifications",
+    "QR code verifications by outcome: valid, not_found or conflict.",
+    ["outcome"],
+)
+VISIT_EXPIRY_DURATION = Histogram(
+    "visit_expiry_job_duration_seconds",
+    "Duration of the visit expiry job.",
+)
+VISITS_EXPIRED = Counter("visits_expired", "Visits expired by the expiry job.")
+VISIT_EXPIRY_FAILURES = Counter(
+    "visit_expiry_job_failures", "Runs of the visit expiry job that failed."
+)
+PASSWORD_HASH_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1, 2.5, 5)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "Time spent in bcrypt per call.",
+    ["operation"],
+    buckets=PASSWORD_HASH_BUCKETS,
+)
+PASSWORD_HASH_WAIT = Histogram(
+    "password_hash_wait_seconds",
+    "Time bcrypt calls waited for a free worker.",
+    buckets=(0,) + PASSWORD_HASH_BUCKETS,
+)
+POOL_GAUGES = {
+    "size": "Connections the pool keeps open.",
+    "checked_out": "Connections in use.",
+    "checked_in": "Idle connections in the pool.",
+    "overflow": "Connections opened beyond the pool size.",
+}
+
+_route_names = {}
+
+
+def route_name(scope) -> str:
+    """
+    Get the path template of the route that handled a request, e.g.
+    ``/api/qr/{qr_id}``, to label its metrics with.
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    name = _route_names.get(endpoint)
+    if name is None:
+        for route in scope["app"].routes:
+            if endpoint in (
+                getattr(route, "endpoint", None),
+                getattr(route, "app", None),
+            ):
+                name = route.path or "/"
+                break
+        else:
+            name = getattr(endpoint, "__name__", "unmatched")
+        _route_names[endpoint] = name
+    return name
+
+
+def query_headers(stats: QueryStats) -> dict:
+    """
+    Get the ``X-DB-*`` debug headers describing the statements of a request.
+    """
+    headers = {
+        "X-DB-Statements": str(stats.count),
+        "X-DB-Time-Ms": f"{stats.duration * 1000:.2f}",
+    }
+    if stats.slowest_statement is not None:
+        headers["X-DB-Slowest-Ms"] = f"{stats.slowest * 1000:.2f}"
+        # Header values are single line.
+        statement = " ".join(stats.slowest_statement.split())
+        headers["X-DB-Slowest-Statement"] = statement[:500]
+    return headers
+
+
+class MetricsMiddleware:
+    """
+    Measure each HTTP request: its duration and status, and the number,
+    total and slowest durations of its SQL statements.
+
+    The measures feed the ``http_*`` and ``db_*`` histograms labelled with
+    the route. With ``debug`` set, the statement statistics are also
+    returned as ``X-DB-*`` response headers. Statements are recorded by the
+    engine hooks of ``config.database``, in the ``QueryStats`` this
+    middleware installs in ``query_stats``.
+    """
+
+    def __init__(self, app, debug: bool = DEBUG):
+        self.app = app
+        self.debug = debug
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        # Requests failing before a response is started end up as errors.
+        status = 500
+
+        async def send_with_stats(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.debug:
+                    headers = MutableHeaders(scope=message)
+                    for name, value in query_headers(stats).items():
+                        headers.append(name, value)
+            await send(message)
+
+        method = scope["method"]
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            duration = time.perf_counter() - start
+            in_progress.dec()
+            query_stats.reset(token)
+            route = route_name(scope)
+            HTTP_REQUEST_DURATION.labels(route, method, status).observe(duration)
+            DB_STATEMENTS.labels(route).observe(stats.count)
+            DB_TIME.labels(route).observe(stats.duration)
+            DB_SLOWEST.labels(route).observe(stats.slowest)
+            if stats.slow:
+                DB_SLOW_STATEMENTS.labels(route).inc(stats.slow)
+
+
+class StatsCollector:
+    """
+    Report the connection pool and password executor counters of
+    ``/api/stats`` when the metrics are scraped.
+    """
+
+    def __init__(self, password_executor):
+        self.password_executor = password_executor
+
+    def collect(self):
+        pools = get_pool_statistics()
+        for name, documentation in POOL_GAUGES.items():
+            gauge = GaugeMetricFamily(f"db_pool_{name}", documentation, labels=["pool"])
+            for pool, statistics in pools.items():
+                gauge.add_metric([pool], statistics[name])
+            yield gauge
+        waits = CounterMetricFamily(
+            "db_pool_waits",
+            "Checkouts that waited for a connection.",
+            labels=["pool"],
+        )
+        wait_time = CounterMetricFamily(
+            "db_pool_wait_seconds",
+            "Time checkouts waited for a connection.",
+            labels=["pool"],
+        )
+        for pool, statistics in pools.items():
+            waits.add_metric([pool], statistics["waits"])
+            wait_time.add_metric([pool], statistics["wait_time"])
+        yield waits
+        yield wait_time
+
+        executor = self.password_executor.stats()
+        yield GaugeMetricFamily(
+            "password_hash_running", "bcrypt calls running.", executor["running"]
+        )
+        yield GaugeMetricFamily(
+            "password_hash_queued",
+            "bcrypt calls waiting for a worker.",
+            executor["queued"],
+        )
+
+
+def metrics_response() -> Response:
+    """
+    Render the metrics in the Prometheus text format.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
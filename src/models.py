@@ -1,19 +1,38 @@
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 from numbers import Integral
 from uuid import uuid4
 
 from fastapi import Request
-from sqlalchemy import JSON, Boolean, Column, DateTime, ForeignKey, String, Table
+from sqlalchemy import (
+    DDL,
+    JSON,
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    Time,
+    UniqueConstraint,
+    event,
+    text,
+)
 from sqlalchemy.dialects.postgresql import ENUM, UUID
 from sqlalchemy.event import listens_for
-from sqlalchemy.orm import class_mapper, relationship
+from sqlalchemy.orm import class_mapper, relationship, validates
 
 from .auth import AuthHandler
 from .config.database import Base
 
 auth_handler = AuthHandler()
 
+# Visitors without a document id share the empty key, so they still collide.
+VISITOR_DOCUMENT_KEY = text("coalesce(document_id, '')")
+
 
 class VisitState(Enum):
     PENDING = "PENDING"
@@ -76,11 +95,42 @@ class User(Base):
 
 
 class Visit(Base):
+    """
+    Visit of a visitor to a resident.
+
+    The table is range partitioned by month on ``date``, see ``partitions``.
+    Postgres requires the partition key in every primary key and unique
+    constraint, so ``date`` is part of them; the mapper still identifies
+    visits by ``id`` alone.
+    """
+
     __tablename__ = "visit"
+    __table_args__ = (
+        UniqueConstraint("qr_id", "date", name="uq_visit_qr_id"),
+        Index("ix_visit_resident_id_date", "resident_id", "date"),
+        Index("ix_visit_date", "date"),
+        Index(
+            "ix_visit_pending_date",
+            "date",
+            postgresql_where=text("state = 'PENDING'"),
+        ),
+        Index(
+            "ix_visit_pending_valid_until",
+            "valid_until",
+            postgresql_where=text("state = 'PENDING' AND valid_until IS NOT NULL"),
+        ),
+        UniqueConstraint(
+            "recurring_visit_id", "date", name="uq_visit_recurring_visit_id_date"
+        ),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     created_date = Column(DateTime, default=datetime.now)
-    date = Column(DateTime, nullable=False)
+    date = Column(DateTime, primary_key=True)
     register_date = Column(DateTime, default=None)
+    # End of the time window of a recurring visit occurrence. Other visits
+    # stay valid for ``tasks.VISIT_VALIDITY`` after their date.
+    valid_until = Column(DateTime, nullable=True)
     state = Column(ENUM(VisitState), nullable=False, default=VisitState.PENDING)
     additional_info = Column(JSON, nullable=True)
     qr_id = Column(UUID(as_uuid=True), ForeignKey("qr.id", ondelete="CASCADE"))
@@ -91,41 +141,117 @@ class Visit(Base):
     resident_id = Column(
         UUID(as_uuid=True), ForeignKey("resident.id", ondelete="CASCADE")
     )
+    recurring_visit_id = Column(
+        UUID(as_uuid=True), ForeignKey("recurring_visit.id", ondelete="CASCADE")
+    )
     qr = relationship("Qr", back_populates="visit")
     visitor = relationship("Visitor", back_populates="visits")
     guard = relationship("Guard", back_populates="visits")
     resident = relationship("Resident", back_populates="visits")
+    recurring_visit = relationship("RecurringVisit", back_populates="visits")
+    _column_names = None
+    __mapper_args__ = {"primary_key": [id]}
 
     def __repr__(self):
         return f"Visit(id={self.id}, state={self.state}, date={self.date})"
 
+    @classmethod
+    def column_names(cls) -> tuple:
+        """
+        Names of the column attributes, read from the mapper once.
+        """
+        if cls._column_names is None:
+            cls._column_names = tuple(
+                prop.key for prop in class_mapper(cls).column_attrs
+            )
+        return cls._column_names
+
     def to_dict(self):
-        # Get the list of column properties
-        column_props = class_mapper(self.__class__).column_attrs
+        return {name: getattr(self, name) for name in self.column_names()}
 
-        # Initialize an empty dictionary to store the attributes
-        visit_dict = {}
+    async def __admin_repr__(self, request: Request):
+        return f"{self.visitor.name} - {self.state}"
 
-        # Iterate through the column properties and add them to the dictionary
-        for prop in column_props:
-            prop_name = prop.key
-            prop_value = getattr(self, prop_name)
-            visit_dict[prop_name] = prop_value
 
-        return visit_dict
+class RecurringVisit(Base):
+    """
+    Visit repeated on some weekdays, e.g. a maid from Monday to Friday
+    between 08:00 and 17:00. Concrete visits are only created a few days
+    ahead, see ``tasks.materialize_recurring_visits``.
+    """
+
+    __tablename__ = "recurring_visit"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    created_date = Column(DateTime, default=datetime.now)
+    # Bit n - 1 is set when the visit occurs on ISO weekday n (1 = Monday).
+    weekdays = Column(Integer, nullable=False)
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    start_date = Column(Date, nullable=False, default=date.today)
+    end_date = Column(Date, nullable=True)
+    is_active = Column(Boolean, nullable=False, default=True)
+    visitor_id = Column(
+        UUID(as_uuid=True), ForeignKey("visitor.id", ondelete="CASCADE")
+    )
+    resident_id = Column(
+        UUID(as_uuid=True), ForeignKey("resident.id", ondelete="CASCADE")
+    )
+    visitor = relationship("Visitor")
+    resident = relationship("Resident")
+    visits = relationship("Visit", back_populates="recurring_visit")
+
+    def occurs_on(self, day: date) -> bool:
+        """
+        Check whether the visit takes place on ``day``.
+        """
+        if day < self.start_date or (self.end_date and day > self.end_date):
+            return False
+        return bool(self.weekdays & (1 << (day.isoweekday() - 1)))
+
+    def __repr__(self):
+        return f"RecurringVisit(id={self.id}, weekdays={self.weekdays})"
 
     async def __admin_repr__(self, request: Request):
-        return f"{self.visitor.name} - {self.state}"
+        return f"{self.visitor.name} - {self.start_time}-{self.end_time}"
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize a visitor name for matching: case folded, without surrounding
+    or repeated whitespace.
+    """
+    return " ".join(name.split()).lower()
 
 
 class Visitor(Base):
     __tablename__ = "visitor"
+    __table_args__ = (
+        # One visitor per resident, name and document. Visitors without a
+        # resident, e.g. walk-ins registered by a guard, are never merged.
+        Index(
+            "uq_visitor_resident_id_normalized_name_document_id",
+            "resident_id",
+            "normalized_name",
+            VISITOR_DOCUMENT_KEY,
+            unique=True,
+        ),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     name = Column(String, nullable=False)
+    normalized_name = Column(String, nullable=False)
+    document_id = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    resident_id = Column(
+        UUID(as_uuid=True), ForeignKey("resident.id", ondelete="CASCADE")
+    )
     visits = relationship("Visit", back_populates="visitor")
 
+    @validates("name")
+    def validate_name(self, key, name):
+        self.normalized_name = None if name is None else normalize_name(name)
+        return name
+
     def __repr__(self):
         return f"Visitor(id={self.id}, name={self.name})"
 
@@ -195,8 +321,57 @@ class Qr(Base):
         return f"Qr(id={self.id}, code={self.code})"
 
 
+# QR codes of the visits. ``uq_visit_qr_id`` only holds within a month of
+# the partitioned visit table, the primary key here keeps a QR code on a
+# single visit. Rows are added by the ``visit_qr_claim`` trigger.
+visit_qr = Table(
+    "visit_qr",
+    Base.metadata,
+    Column(
+        "qr_id",
+        UUID(as_uuid=True),
+        ForeignKey("qr.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column("visit_id", UUID(as_uuid=True), nullable=False),
+)
+
+VISIT_QR_CLAIM_FUNCTION = """
+CREATE OR REPLACE FUNCTION visit_qr_claim() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- A visit moved to another partition claims its QR code again.
+    INSERT INTO visit_qr (qr_id, visit_id) VALUES (NEW.qr_id, NEW.id)
+    ON CONFLICT (qr_id) DO UPDATE SET visit_id = EXCLUDED.visit_id
+    WHERE visit_qr.visit_id = EXCLUDED.visit_id;
+    IF NOT FOUND THEN
+        RAISE USING
+            MESSAGE = 'QR code ' || NEW.qr_id || ' already belongs to a visit',
+            ERRCODE = 'unique_violation',
+            CONSTRAINT = 'visit_qr_pkey';
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+VISIT_QR_CLAIM_TRIGGER = """
+CREATE TRIGGER visit_qr_claim AFTER INSERT OR UPDATE OF qr_id ON visit
+FOR EACH ROW WHEN (NEW.qr_id IS NOT NULL) EXECUTE FUNCTION visit_qr_claim()
+"""
+
+# Rows whose month has no partition yet land here instead of failing.
+event.listen(
+    Visit.__table__,
+    "after_create",
+    DDL("CREATE TABLE visit_default PARTITION OF visit DEFAULT"),
+)
+event.listen(Visit.__table__, "after_create", DDL(VISIT_QR_CLAIM_FUNCTION))
+event.listen(Visit.__table__, "after_create", DDL(VISIT_QR_CLAIM_TRIGGER))
+
+
 # Ensure that the User model has a relationship to the RefreshToken
-    
+
+
 @listens_for(User, "before_delete")
 def delete_related_guard_or_resident(mapper, connection, target):
     if target.guard:
@@ -216,4 +391,3 @@ def delete_related_guard_or_resident(mapper, connection, target):
         connection.execute(
             Resident.__table__.delete().where(Resident.id == target.resident.id)
         )
-
@@ -0,0 +1,225 @@
+"""
+Visit table partitions
+
+The ``visit`` table is range partitioned by month on ``date``. Monthly
+partitions are named like ``visit_y2026m10`` and created a few months ahead
+by the expiry scheduler; ``visit_default`` catches the dates no partition
+covers yet. Months older than ``VISIT_ARCHIVE_AFTER_MONTHS`` are moved to
+``visit_archive``, which the app never reads, so the guard board and the
+expiry queries only touch the recent partitions.
+
+Usage:
+    python -m src.partitions create --months-ahead 3
+    python -m src.partitions archive --after-months 6
+"""
+import argparse
+import logging
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from .config.database import engine
+
+logger = logging.getLogger(__name__)
+
+VISIT_PARTITION_MONTHS_AHEAD = int(os.getenv("VISIT_PARTITION_MONTHS_AHEAD", "3"))
+VISIT_ARCHIVE_AFTER_MONTHS = int(os.getenv("VISIT_ARCHIVE_AFTER_MONTHS", "6"))
+# Tablespace archived partitions are moved to, e.g. on cheaper or compressed
+# storage. They stay in the default tablespace when unset.
+VISIT_ARCHIVE_TABLESPACE = os.getenv("VISIT_ARCHIVE_TABLESPACE")
+VISIT_DEFAULT_PARTITION = "visit_default"
+VISIT_ARCHIVE_TABLE = "visit_archive"
+# Serializes partition maintenance between processes.
+PARTITION_LOCK_KEY = 0x76697369
+PARTITION_NAME = re.compile(r"^visit_y(\d{4})m(\d{2})$")
+
+
+def add_months(month: date, months: int) -> date:
+    """
+    Get the first day of the month ``months`` after the month of ``month``.
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """
+    Get the name of the visit partition of the month of ``month``.
+    """
+    return f"visit_y{month.year:04d}m{month.month:02d}"
+
+
+def monthly_partitions(connection: Connection, table: str = "visit") -> dict:
+    """
+    List the monthly partitions attached to ``table``.
+
+    Returns:
+        dict: Partition names by the first day of their month.
+    """
+    names = connection.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = CAST(:table AS regclass)"
+        ),
+        {"table": table},
+    ).scalars()
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def create_visit_partition(connection: Connection, month: date) -> str:
+    """
+    Create the visit partition of the month of ``month``.
+
+    Visits of that month already stored in the default partition are moved
+    into the new partition before it is attached, otherwise Postgres
+    refuses the attachment.
+
+    Args:
+        connection (Connection): Connection inside a transaction.
+        month (date): Any day of the month.
+
+    Returns:
+        str: Name of the partition.
+    """
+    name = partition_name(month)
+    start = add_months(month, 0)
+    end = add_months(month, 1)
+    connection.execute(text(f"CREATE TABLE {name} (LIKE visit INCLUDING DEFAULTS)"))
+    connection.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {VISIT_DEFAULT_PARTITION} "
+            "WHERE date >= :start AND date < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        {"start": start, "end": end},
+    )
+    connection.execute(
+        text(
+            f"ALTER TABLE visit ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+    )
+    return name
+
+
+def ensure_visit_partitions(
+    connection: Connection,
+    today: date,
+    months_ahead: int = VISIT_PARTITION_MONTHS_AHEAD,
+) -> list:
+    """
+    Create the missing visit partitions from the current month to
+    ``months_ahead`` months later. The caller commits.
+
+    Args:
+        connection (Connection): Connection inside a transaction.
+        today (date): Reference day.
+        months_ahead (int): Number of months after the current one to cover.
+
+    Returns:
+        list: Names of the created partitions.
+    """
+    connection.execute(
+        text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY}
+    )
+    existing = monthly_partitions(connection)
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(today, offset)
+        if month not in existing:
+            created.append(create_visit_partition(connection, month))
+    return created
+
+
+def archive_visit_partitions(
+    connection: Connection,
+    today: date,
+    after_months: int = VISIT_ARCHIVE_AFTER_MONTHS,
+    tablespace: str = VISIT_ARCHIVE_TABLESPACE,
+) -> list:
+    """
+    Move the visit partitions of the months ended more than ``after_months``
+    months ago to ``visit_archive``. The caller commits.
+
+    Partitions are detached from ``visit`` and attached to the archive as
+    they are, without copying rows. A partition that still holds pending
+    visits is left in place until the expiry job has handled them.
+
+    Args:
+        connection (Connection): Connection inside a transaction.
+        today (date): Reference day.
+        after_months (int): Number of complete months kept in ``visit``.
+        tablespace (str): Tablespace to move archived partitions to.
+
+    Returns:
+        list: Names of the archived partitions.
+    """
+    connection.execute(
+        text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY}
+    )
+    connection.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {VISIT_ARCHIVE_TABLE} "
+            "(LIKE visit INCLUDING DEFAULTS) PARTITION BY RANGE (date)"
+        )
+    )
+    cutoff = add_months(today, -after_months)
+    archived = []
+    for month, name in sorted(monthly_partitions(connection).items()):
+        if month >= cutoff:
+            break
+        pending = connection.execute(
+            text(f"SELECT 1 FROM {name} WHERE state = 'PENDING' LIMIT 1")
+        ).first()
+        if pending is not None:
+            logger.warning(
+                "Visit partition has pending visits", extra={"partition": name}
+            )
+            continue
+        connection.execute(text(f"ALTER TABLE visit DETACH PARTITION {name}"))
+        if tablespace:
+            connection.execute(text(f"ALTER TABLE {name} SET TABLESPACE {tablespace}"))
+        connection.execute(
+            text(
+                f"ALTER TABLE {VISIT_ARCHIVE_TABLE} ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+            )
+        )
+        archived.append(name)
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Create the upcoming partitions")
+    create.add_argument(
+        "--months-ahead", type=int, default=VISIT_PARTITION_MONTHS_AHEAD
+    )
+    archive = commands.add_parser("archive", help="Archive the old partitions")
+    archive.add_argument("--after-months", type=int, default=VISIT_ARCHIVE_AFTER_MONTHS)
+    archive.add_argument("--tablespace", default=VISIT_ARCHIVE_TABLESPACE)
+    args = parser.parse_args()
+
+    with engine.begin() as connection:
+        if args.command == "create":
+            names = ensure_visit_partitions(connection, date.today(), args.months_ahead)
+        else:
+            names = archive_visit_partitions(
+                connection, date.today(), args.after_months, args.tablespace
+            )
+    for name in names:
+        print(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Password hashing
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from .metrics import PASSWORD_HASH_DURATION, PASSWORD_HASH_WAIT
+
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(min(os.cpu_count() or 1, 4)))
+)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Shared by the API and the admin. Hashes with another cost are flagged by
+# ``needs_update`` and rehashed at the next successful login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS
+)
+
+
+class PasswordExecutor:
+    """
+    Thread pool that runs password hashing and verification off the event
+    loop.
+
+    bcrypt spends each call in C with the GIL released, so threads hash in
+    parallel while the event loop keeps serving other requests. The number
+    of workers caps how many hashes run at once; further calls wait in the
+    executor queue, whose depth is reported by ``stats``. The time calls
+    wait for a worker and spend hashing feed the ``password_hash_*``
+    histograms.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.queued = 0
+        self.max_queued = 0
+        self.running = 0
+        self.completed = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hash"
+        )
+
+    async def run(self, function, *args):
+        """
+        Run ``function(*args)`` on the executor and wait for its result.
+
+        Args:
+            function (callable): Blocking hashing or verification function.
+            *args: Arguments passed to ``function``.
+
+        Returns:
+            Any: The return value of ``function``.
+        """
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        future = self._executor.submit(self._call, function, args, time.perf_counter())
+        future.add_done_callback(self._discard_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def _call(self, function, args, submitted):
+        start = time.perf_counter()
+        PASSWORD_HASH_WAIT.observe(start - submitted)
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return function(*args)
+        finally:
+            PASSWORD_HASH_DURATION.labels(function.__name__).observe(
+                time.perf_counter() - start
+            )
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    def _discard_cancelled(self, future):
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def stats(self) -> dict:
+        """
+        Get the executor counters.
+        """
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "running": self.running,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+            }
+
+    def shutdown(self):
+        """
+        Wait for the running calls and stop the worker threads.
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+password_executor = PasswordExecutor(max_workers=PASSWORD_HASH_WORKERS)
@@ -0,0 +1,82 @@
+"""
+Response rendering
+"""
+import uuid
+
+import orjson
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from sqlalchemy.orm.base import instance_state
+
+from . import models, schema
+
+# Response model each ORM class is rendered with.
+RESPONSE_MODELS = {
+    models.User: schema.UserResponse,
+    models.Visit: schema.VisitResponse,
+    models.Visitor: schema.VisitorResponse,
+    models.Resident: schema.ResidentResponse,
+    models.Residence: schema.ResidenceResponse,
+    models.RecurringVisit: schema.RecurringVisitResponse,
+}
+RESPONSE_FIELDS = {
+    orm_class: tuple(response_model.__fields__)
+    for orm_class, response_model in RESPONSE_MODELS.items()
+}
+
+
+def _render_default(value):
+    fields = RESPONSE_FIELDS.get(type(value))
+    if fields is not None:
+        loaded = instance_state(value).dict
+        return {name: loaded.get(name) for name in fields}
+    if isinstance(value, uuid.UUID):
+        # asyncpg's UUID subclass, orjson only writes uuid.UUID itself.
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.dict()
+    raise TypeError
+
+
+def render(content) -> bytes:
+    """
+    Dump a payload of ORM instances to JSON with orjson.
+
+    ORM instances are written as the fields of their ``RESPONSE_MODELS``
+    entry, with attributes that were not loaded as null.
+    """
+    return orjson.dumps(
+        content, default=_render_default, option=orjson.OPT_NON_STR_KEYS
+    )
+
+
+class ModelResponse(ORJSONResponse):
+    """
+    orjson response that renders ORM instances through their response model.
+
+    Routes returning ORM instances leave FastAPI to validate them into the
+    response model and walk the result with ``jsonable_encoder``, both in
+    Python. This response dumps the payload with ``render`` instead: orjson
+    writes UUIDs, datetimes and enums natively and only calls back for ORM
+    instances.
+    """
+
+    def render(self, content) -> bytes:
+        return render(content)
+
+
+def model_response(content) -> Response:
+    """
+    Render what ``crud`` returned for a route as a ``ModelResponse``.
+
+    Args:
+        content (Any): Payload of ORM instances, or a response, e.g. an error
+            status, which is returned as is.
+
+    Returns:
+        Response: Rendered response.
+    """
+    if isinstance(content, Response):
+        return content
+    return ModelResponse(content)
@@ -1,96 +1,271 @@
 from datetime import datetime
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends, Request, Response, status
-from sqlalchemy.orm import Session
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    status,
+)
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from . import crud, models, utils
+from . import board, crud, models, utils
 from .auth import AuthHandler, MyAuthProvider
-from .config.database import engine, get_session
-from .schema import AuthDetails
+from .cache import qr_cache, visit_summary_cache
+from .config.database import (
+    AsyncSessionLocal,
+    engine,
+    get_async_session,
+    get_pool_statistics,
+)
+from .events import visit_broker
+from .passwords import password_executor
+from .responses import model_response
+from .schema import (
+    AccessToken,
+    AuthDetails,
+    BulkVisitCreate,
+    CancelledVisits,
+    HealthStatus,
+    Principal,
+    Profile,
+    QrVerification,
+    RecurringVisitCreate,
+    RecurringVisitCreated,
+    Stats,
+    Token,
+    VisitDetail,
+    VisitPage,
+    VisitResponse,
+    VisitState,
+    VisitStates,
+    VisitSummary,
+    naive_local,
+)
 
 models.Base.metadata.create_all(bind=engine)
 
 router = APIRouter(
     prefix="/api",
+    default_response_class=ORJSONResponse,
 )
 auth_handler = AuthHandler()
 
 
-@router.post("/login/", tags=["Authorization"])
-def login_user(auth_details: AuthDetails, db: Session = Depends(get_session)):
-    return crud.login(db, auth_details)
+@router.post("/login/", tags=["Authorization"], response_model=Token)
+async def login_user(
+    auth_details: AuthDetails, db: AsyncSession = Depends(get_async_session)
+):
+    return await crud.login(db, auth_details)
 
 
-@router.get("/visit/states", tags=["Visit States"])
-def get_visit_states(request: Request):
+@router.get("/visit/states", tags=["Visit States"], response_model=VisitStates)
+async def get_visit_states(request: Request):
     """
     Get all visit states.
     """
     return crud.get_visit_states()
 
 
-@router.get("/user", tags=["User"])
-def get_user(
+@router.get("/user", tags=["User"], response_model=Profile)
+async def get_user(
     request: Request,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
     user_id=Depends(auth_handler.auth_wrapper),
 ):
     """
     Get user by ID.
     """
-    return crud.get_profile(db, user_id=user_id)
+    return await crud.get_profile(db, user_id=user_id)
 
 
-@router.get("/user/visit", tags=["User"])
-def ger_user_visits(
+@router.get("/user/visit", tags=["User"], response_model=Optional[VisitPage])
+async def ger_user_visits(
     request: Request,
-    db: Session = Depends(get_session),
+    limit: Optional[int] = Query(None, ge=1, le=crud.MAX_VISIT_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    state: Optional[VisitState] = None,
+    db: AsyncSession = Depends(get_async_session),
     user_id=Depends(auth_handler.auth_wrapper),
 ):
     """
-    Get user visits by ID.
+    Get a page of the user's visits, newest first, grouped by state.
+
+    Pass the ``next_cursor`` of a page as ``cursor`` to get the next one.
+    Guards get all of today's visits unless they pass ``limit`` or ``cursor``.
+    """
+    visits = await crud.get_user_visits(
+        db,
+        user_id=user_id,
+        limit=limit,
+        cursor=cursor,
+        date_from=naive_local(date_from),
+        date_to=naive_local(date_to),
+        state=state,
+    )
+    return model_response(visits)
+
 
+@router.websocket("/ws/board")
+async def visit_board(websocket: WebSocket, token: str):
+    """
+    Live board of today's visits for guards.
+
+    Browsers cannot set headers on a WebSocket, so the access token is
+    passed as the ``token`` query parameter. The board starts with a
+    snapshot and then receives the visit events as they happen.
+    """
+    async with AsyncSessionLocal() as session:
+        try:
+            principal = await auth_handler.get_principal(token, session)
+        except HTTPException:
+            principal = None
+    if (
+        principal is None
+        or not principal.is_active
+        or principal.role != models.Role.GUARD.value
+    ):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    await board.stream_board(websocket, principal.id)
+
+
+@router.get("/user/visit/summary", tags=["User"], response_model=VisitSummary)
+async def get_user_visit_summary(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_session),
+    principal: Principal = Depends(auth_handler.principal_wrapper),
+):
+    """
+    Count the user's visits per state.
     """
-    return crud.get_user_visits(db, user_id=user_id)
+    max_age = int(visit_summary_cache.ttl)
+    response.headers["Cache-Control"] = f"private, max-age={max_age}"
+    return await crud.get_visit_summary(session=db, principal=principal)
 
 
-@router.post("/visit/", tags=["Visit"])
-def create_visit(
+@router.post("/visit/", tags=["Visit"], response_model=VisitResponse)
+async def create_visit(
     request: Request,
     name: str,
     date: datetime,
-    db: Session = Depends(get_session),
-    user_id=Depends(auth_handler.auth_wrapper),
+    document_id: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_session),
+    principal: Principal = Depends(auth_handler.principal_wrapper),
 ):
     """
     Create a visit.
+
+    A resident's visitor with the same name and document as an earlier one
+    reuses its record.
     """
-    return crud.create_visit(session=db, name=name, date=date, user_id=user_id)
+    visit = await crud.create_visit(
+        session=db,
+        name=name,
+        date=naive_local(date),
+        principal=principal,
+        document_id=document_id,
+    )
+    return model_response(visit)
 
 
-@router.get("/visit/{visit_id}", tags=["Visit"])
-def get_visit(
+@router.post("/visit/bulk", tags=["Visit"], response_model=List[VisitResponse])
+async def create_visits(
+    request: Request,
+    bulk: BulkVisitCreate,
+    db: AsyncSession = Depends(get_async_session),
+    principal: Principal = Depends(auth_handler.principal_wrapper),
+):
+    """
+    Create several visits at once, e.g. the guest list of an event.
+    """
+    visits = await crud.create_visits(
+        session=db, visits=bulk.visits, principal=principal
+    )
+    return model_response(visits)
+
+
+@router.post("/visit/recurring", tags=["Visit"], response_model=RecurringVisitCreated)
+async def create_recurring_visit(
+    request: Request,
+    recurring: RecurringVisitCreate,
+    db: AsyncSession = Depends(get_async_session),
+    principal: Principal = Depends(auth_handler.principal_wrapper),
+):
+    """
+    Create a visit repeated on some weekdays.
+    """
+    created = await crud.create_recurring_visit(
+        session=db, recurring=recurring, principal=principal
+    )
+    return model_response(created)
+
+
+@router.patch(
+    "/visit/recurring/{recurring_visit_id}/cancel",
+    tags=["Visit"],
+    response_model=CancelledVisits,
+)
+async def cancel_recurring_visit(
+    request: Request,
+    recurring_visit_id: str,
+    db: AsyncSession = Depends(get_async_session),
+    principal: Principal = Depends(auth_handler.principal_wrapper),
+):
+    """
+    Stop a recurring visit and cancel its pending visits.
+    """
+    return await crud.cancel_recurring_visit(
+        session=db, recurring_visit_id=recurring_visit_id, principal=principal
+    )
+
+
+@router.get(
+    "/visit/{visit_id}",
+    tags=["Visit"],
+    response_model=Optional[Union[VisitDetail, VisitResponse]],
+)
+async def get_visit(
     request: Request,
     visit_id: str,
-    db: Session = Depends(get_session),
-    user_id=Depends(auth_handler.auth_wrapper),
+    db: AsyncSession = Depends(get_async_session),
+    principal: Principal = Depends(auth_handler.principal_wrapper),
 ):
     """
     Get visit by ID.
     """
-    return crud.get_visit(session=db, visit_id=visit_id, user_id=user_id)
+    visit = await crud.get_visit(session=db, visit_id=visit_id, principal=principal)
+    return model_response(visit)
 
 
-@router.post("/user/update-password", tags=["User"], status_code=201)
-def update_password(auth_details: AuthDetails, db: Session = Depends(get_session)):
+@router.post(
+    "/user/update-password", tags=["User"], status_code=201, response_model=Profile
+)
+async def update_password(
+    auth_details: AuthDetails, db: AsyncSession = Depends(get_async_session)
+):
     """
     Update user password.
     """
-    return crud.update_password(db, auth_details=auth_details)
+    return await crud.update_password(db, auth_details=auth_details)
 
 
-@router.get("/refresh", status_code=status.HTTP_200_OK, tags=["Authorization"])
-def get_new_access_token(token: str):
+@router.get(
+    "/refresh",
+    status_code=status.HTTP_200_OK,
+    tags=["Authorization"],
+    response_model=AccessToken,
+)
+async def get_new_access_token(token: str):
     auth_handler.verify_refresh_token(token)
     new_access_token = auth_handler.refresh_token(token)
     return {
@@ -100,21 +275,24 @@ def get_new_access_token(token: str):
     }
 
 
-@router.get("/qr/{qr_id}", tags=["QR Code"])
-def verify_qr_code(
+@router.get("/qr/{qr_id}", tags=["QR Code"], response_model=QrVerification)
+async def verify_qr_code(
     request: Request,
     qr_id: str,
-    session: Session = Depends(get_session),
-    user_id=Depends(auth_handler.auth_wrapper),
+    session: AsyncSession = Depends(get_async_session),
+    principal: Principal = Depends(auth_handler.principal_wrapper),
 ):
     """
     Verify QR code.
     """
-    return utils.verify_qr_code(db=session, qr_id=qr_id, user_id=user_id)
+    verification = await utils.verify_qr_code(
+        db=session, qr_id=qr_id, principal=principal
+    )
+    return model_response(verification)
 
 
-@router.get("/health", tags=["Health"])
-def health_check(request: Request):
+@router.get("/health", tags=["Health"], response_model=HealthStatus)
+async def health_check(request: Request):
     """
     Health check.
     """
@@ -123,27 +301,49 @@ def health_check(request: Request):
     return {"status": "OK"}
 
 
-@router.post("/visit/register", tags=["Visit"])
-def register_visit(
+@router.get("/stats", tags=["Health"], response_model=Stats)
+async def get_stats(
+    request: Request,
+    principal: Principal = Depends(auth_handler.principal_wrapper),
+):
+    """
+    Connection pool, cache, password hashing and visit event statistics.
+
+    Only active admins can read them.
+    """
+    if not principal.is_active or principal.role != models.Role.ADMIN.value:
+        return Response(status_code=status.HTTP_403_FORBIDDEN)
+    return {
+        "pool": get_pool_statistics(),
+        "qr_cache": qr_cache.stats(),
+        "password_hashing": password_executor.stats(),
+        "visit_events": visit_broker.stats(),
+    }
+
+
+@router.post("/visit/register", tags=["Visit"], response_model=VisitResponse)
+async def register_visit(
     request: Request,
     qr_id: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     user_id=Depends(auth_handler.auth_wrapper),
 ):
     """
     Register a visit.
     """
-    return crud.register_visit(session=session, qr_id=qr_id, user_id=user_id)
+    visit = await crud.register_visit(session=session, qr_id=qr_id, user_id=user_id)
+    return model_response(visit)
 
 
-@router.patch("/visit/cancel", tags=["Visit"])
-def cancel_visit(
+@router.patch("/visit/cancel", tags=["Visit"], response_model=VisitResponse)
+async def cancel_visit(
     request: Request,
     qr_id: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     user_id=Depends(auth_handler.auth_wrapper),
 ):
     """
     Cancel a visit.
     """
-    return crud.canceled_visit(session=session, qr_id=qr_id, user_id=user_id)
+    visit = await crud.canceled_visit(session=session, qr_id=qr_id, user_id=user_id)
+    return model_response(visit)
@@ -1,15 +1,30 @@
 import os
 import time
 import uuid
-from datetime import datetime
+from datetime import date, datetime
+from datetime import time as time_of_day
 from enum import Enum
-from typing import Optional, Union
+from typing import Dict, List, Optional, Union
 
-from pydantic import UUID4, BaseModel
+from pydantic import UUID4, BaseModel, conint, conlist, validator
+from pydantic.utils import GetterDict
+from sqlalchemy import inspect
 
 os.environ["TZ"] = "America/Guayaquil"
 time.tzset()
 
+BULK_VISIT_LIMIT = 500
+
+
+def naive_local(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Convert an aware datetime to the naive local time the visit dates are
+    stored in. Naive datetimes are already local and returned as they are.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
 
 class AuthDetails(BaseModel):
     """
@@ -20,6 +35,17 @@ class AuthDetails(BaseModel):
     password: str
 
 
+class Principal(BaseModel):
+    """
+    Authenticated user resolved from a verified access token.
+    """
+
+    id: uuid.UUID
+    role: str
+    is_active: bool
+    resident_id: Optional[uuid.UUID] = None
+
+
 class VisitState(str, Enum):
     """
     Enumeration of visit states.
@@ -82,6 +108,26 @@ class VisitCreate(VisitBase):
     """
 
 
+class VisitRequest(BaseModel):
+    """
+    Visitor name and date of a visit to create.
+    """
+
+    name: str
+    date: datetime
+    document_id: Optional[str] = None
+
+    _naive_date = validator("date", allow_reuse=True)(naive_local)
+
+
+class BulkVisitCreate(BaseModel):
+    """
+    Model for creating several visits at once.
+    """
+
+    visits: conlist(VisitRequest, min_items=1, max_items=BULK_VISIT_LIMIT)
+
+
 class Visit(VisitBase):
     """
     Visit model.
@@ -152,6 +198,27 @@ class FrequentVisitor(FrequentVisitorBase):
         orm_mode = True
 
 
+class RecurringVisitCreate(BaseModel):
+    """
+    Model for creating a RecurringVisit.
+    """
+
+    name: str
+    document_id: Optional[str] = None
+    weekdays: conlist(conint(ge=1, le=7), min_items=1)
+    start_time: time_of_day
+    end_time: time_of_day
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+    @validator("end_time")
+    def end_after_start(cls, end_time, values):
+        """Reject empty or inverted time windows."""
+        if "start_time" in values and end_time <= values["start_time"]:
+            raise ValueError("end_time must be after start_time")
+        return end_time
+
+
 class GuardBase(BaseModel):
     """
     Base model for Guard.
@@ -272,3 +339,252 @@ class UserLogin(BaseModel):
 
     username: str
     password: str
+
+
+class LoadedGetterDict(GetterDict):
+    """
+    Read the attributes of an ORM instance without triggering lazy loads.
+
+    Attributes that were not loaded with the instance, such as relationships
+    that were not eager-loaded, read as missing and fall back to the field
+    default instead of querying through the async session.
+    """
+
+    __slots__ = ("_unloaded",)
+
+    def __init__(self, obj):
+        super().__init__(obj)
+        state = inspect(obj, raiseerr=False)
+        self._unloaded = state.unloaded if state is not None else ()
+
+    def get(self, key, default=None):
+        if key in self._unloaded:
+            return default
+        return getattr(self._obj, key, default)
+
+
+class ORMResponse(BaseModel):
+    """
+    Base model for responses read from ORM instances.
+    """
+
+    class Config:
+        """Pydantic configuration."""
+
+        orm_mode = True
+        getter_dict = LoadedGetterDict
+
+    @validator("*", pre=True)
+    def enum_value(cls, value):
+        """Read ORM enum columns by value."""
+        if isinstance(value, Enum):
+            return value.value
+        return value
+
+
+class Token(BaseModel):
+    """
+    Tokens returned by login.
+    """
+
+    token: str
+    refresh_token: str
+
+
+class AccessToken(BaseModel):
+    """
+    Access token returned by a token refresh.
+    """
+
+    access_token: str
+    token_type: str
+    status: int
+
+
+class VisitStates(BaseModel):
+    """
+    List of visit states.
+    """
+
+    visit_state: List[VisitState]
+
+
+class UserResponse(ORMResponse):
+    """
+    User returned by the API, without its password hash.
+    """
+
+    id: uuid.UUID
+    name: str
+    username: str
+    role: Optional[str] = None
+    phone: Optional[str] = None
+    is_active: Optional[bool] = None
+    created_date: Optional[datetime] = None
+    updated_date: Optional[datetime] = None
+
+
+class VisitorResponse(ORMResponse):
+    """
+    Visitor returned by the API.
+    """
+
+    id: uuid.UUID
+    name: str
+    document_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class ResidentResponse(ORMResponse):
+    """
+    Resident returned by the API.
+    """
+
+    id: uuid.UUID
+    phone: str
+
+
+class ResidenceResponse(ORMResponse):
+    """
+    Residence returned by the API.
+    """
+
+    id: uuid.UUID
+    address: str
+    created_date: Optional[datetime] = None
+    information: Optional[dict] = None
+
+
+class Profile(BaseModel):
+    """
+    Profile of a user.
+    """
+
+    user: UserResponse
+    residence: Optional[ResidenceResponse] = None
+
+
+class VisitResponse(ORMResponse):
+    """
+    Visit returned by the API.
+
+    ``visitor`` and ``resident`` are only filled in when they were loaded
+    together with the visit.
+    """
+
+    id: uuid.UUID
+    created_date: Optional[datetime] = None
+    date: datetime
+    register_date: Optional[datetime] = None
+    valid_until: Optional[datetime] = None
+    state: VisitState
+    additional_info: Optional[dict] = None
+    qr_id: Optional[uuid.UUID] = None
+    visitor_id: Optional[uuid.UUID] = None
+    guard_id: Optional[uuid.UUID] = None
+    resident_id: Optional[uuid.UUID] = None
+    recurring_visit_id: Optional[uuid.UUID] = None
+    visitor: Optional[VisitorResponse] = None
+    resident: Optional[ResidentResponse] = None
+
+
+class VisitDetail(BaseModel):
+    """
+    Visit and visitor returned to residents.
+    """
+
+    visit: VisitResponse
+    visitor: Optional[VisitorResponse] = None
+
+
+class VisitPage(BaseModel):
+    """
+    Page of visits grouped by state.
+    """
+
+    visits: Dict[VisitState, List[VisitResponse]]
+    next_cursor: Optional[str] = None
+
+    @validator("visits", pre=True)
+    def state_keys(cls, visits):
+        """Read ORM enum keys by value."""
+        return {
+            getattr(state, "value", state): group for state, group in visits.items()
+        }
+
+
+class VisitSummary(BaseModel):
+    """
+    Number of visits per state.
+    """
+
+    counts: Dict[VisitState, int]
+    total: int
+
+
+class RecurringVisitResponse(ORMResponse):
+    """
+    Recurring visit returned by the API.
+
+    ``weekdays`` is the stored bitmask, bit ``n - 1`` set for ISO weekday
+    ``n``.
+    """
+
+    id: uuid.UUID
+    created_date: Optional[datetime] = None
+    weekdays: int
+    start_time: time_of_day
+    end_time: time_of_day
+    start_date: date
+    end_date: Optional[date] = None
+    is_active: bool
+    visitor_id: Optional[uuid.UUID] = None
+    resident_id: Optional[uuid.UUID] = None
+
+
+class RecurringVisitCreated(BaseModel):
+    """
+    Recurring visit and the visits materialized with it.
+    """
+
+    recurring_visit: RecurringVisitResponse
+    visits: List[VisitResponse]
+
+
+class CancelledVisits(BaseModel):
+    """
+    Number of visits cancelled.
+    """
+
+    cancelled: int
+
+
+class QrVerification(BaseModel):
+    """
+    Visit of a verified QR code and the people it involves.
+    """
+
+    resident: Optional[ResidentResponse] = None
+    visitor: Optional[VisitorResponse] = None
+    visit: VisitResponse
+    residence: Optional[ResidenceResponse] = None
+
+
+class HealthStatus(BaseModel):
+    """
+    Health check status.
+    """
+
+    status: str
+
+
+class Stats(BaseModel):
+    """
+    Connection pool, cache, password hashing and visit event statistics.
+    """
+
+    pool: dict
+    qr_cache: dict
+    password_hashing: dict
+    visit_events: dict
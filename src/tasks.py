@@ -1,26 +1,373 @@
 import datetime
+import logging
+import os
+import threading
+import time
+import uuid
 from datetime import timedelta
 
-from sqlalchemy.orm import Session
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, sessionmaker
 
-# Start the scheduler
-from .models import Visit, VisitState  # replace with your own models
+from .cache import qr_cache
+from .config.database import SessionLocal
+from .events import state_event, visit_broker, visit_event
+from .metrics import VISIT_EXPIRY_DURATION, VISIT_EXPIRY_FAILURES, VISITS_EXPIRED
+from .models import Qr, RecurringVisit, Visit, VisitState
+from .partitions import VISIT_PARTITION_MONTHS_AHEAD, ensure_visit_partitions
 
+logger = logging.getLogger(__name__)
 
-def check_visit_expiry(session: Session):
+VISIT_VALIDITY = timedelta(hours=24)
+EXPIRY_BATCH_SIZE = 500
+# Upper bound between two runs, so visits written by other processes are
+# never left pending for long.
+EXPIRY_MAX_INTERVAL = timedelta(minutes=15)
+# Run slightly after the due time, expire_visits uses a strict comparison.
+EXPIRY_GRACE = timedelta(seconds=1)
+# Days ahead, today included, for which recurring visits get concrete rows.
+RECURRING_VISIT_DAYS = int(os.getenv("RECURRING_VISIT_DAYS", "2"))
+
+
+def expire_visits(
+    session: Session,
+    now: datetime.datetime,
+    batch_size: int = EXPIRY_BATCH_SIZE,
+) -> int:
+    """
+    Mark the pending visits whose validity window has passed as expired:
+    ``VISIT_VALIDITY`` after their date, or their ``valid_until`` for
+    occurrences of recurring visits.
+
+    Visits are updated in batches with one ``UPDATE`` per batch, each
+    committed on its own so a large backlog never holds a long transaction.
+    Rows locked by a concurrent scan are skipped and picked up by the next
+    run. The QR codes of expired visits are dropped from ``qr_cache``.
+
+    Args:
+        session (Session): SQLAlchemy database session.
+        now (datetime): Reference time for the validity window.
+        batch_size (int): Maximum number of visits updated per statement.
+
+    Returns:
+        int: Number of visits expired.
+    """
+    cutoff = now - VISIT_VALIDITY
+    expirable = (
+        select(Visit.id)
+        .where(
+            Visit.state == VisitState.PENDING,
+            or_(Visit.date < cutoff, Visit.valid_until < now),
+        )
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    statement = (
+        update(Visit)
+        .where(Visit.id.in_(expirable.scalar_subquery()))
+        .values(state=VisitState.EXPIRED)
+        .returning(Visit.id, Visit.qr_id)
+        .execution_options(synchronize_session=False)
+    )
+    expired = 0
+    while True:
+        visits = session.execute(statement).all()
+        session.commit()
+        qr_cache.invalidate(*(str(visit.qr_id) for visit in visits if visit.qr_id))
+        if visits:
+            visit_broker.publish(
+                state_event(VisitState.EXPIRED, [visit.id for visit in visits])
+            )
+        expired += len(visits)
+        if len(visits) < batch_size:
+            return expired
+
+
+def check_visit_expiry(session: Session, batch_size: int = EXPIRY_BATCH_SIZE) -> int:
+    """
+    Expire the pending visits older than ``VISIT_VALIDITY`` and close the
+    session.
+
+    Returns:
+        int: Number of visits expired, 0 if the job failed.
+    """
+    start = time.perf_counter()
+    try:
+        expired = expire_visits(session, datetime.datetime.now(), batch_size)
+    except Exception:
+        logger.exception("Visit expiry job failed")
+        VISIT_EXPIRY_FAILURES.inc()
+        session.rollback()
+        return 0
+    finally:
+        session.close()
+    duration = time.perf_counter() - start
+    VISIT_EXPIRY_DURATION.observe(duration)
+    VISITS_EXPIRED.inc(expired)
+    logger.info(
+        "Visit expiry job finished", extra={"expired": expired, "duration": duration}
+    )
+    return expired
+
+
+def materialize_recurring_visits(
+    session: Session,
+    now: datetime.datetime,
+    days: int = RECURRING_VISIT_DAYS,
+    recurring_visit_ids: list = None,
+) -> list:
+    """
+    Create the visits and QR codes of the recurring visits occurring in the
+    next ``days`` days.
+
+    Occurrences that already have a visit, or whose time window has already
+    ended, are skipped, so running this repeatedly only fills the horizon as
+    it moves forward. The QR codes and visits are written with one
+    multi-row ``INSERT`` each; a visit created concurrently for the same
+    occurrence is ignored through the unique ``(recurring_visit_id, date)``
+    constraint and its unused QR code removed. The caller commits.
+
+    Args:
+        session (Session): SQLAlchemy database session.
+        now (datetime): Reference time for the horizon.
+        days (int): Number of days, today included, to materialize.
+        recurring_visit_ids (list): Only materialize these recurring visits.
+
+    Returns:
+        list: Created visits.
+    """
+    today = now.date()
+    horizon = today + timedelta(days=days)
+    query = select(RecurringVisit).where(
+        RecurringVisit.is_active,
+        RecurringVisit.start_date < horizon,
+        or_(RecurringVisit.end_date.is_(None), RecurringVisit.end_date >= today),
+    )
+    if recurring_visit_ids is not None:
+        query = query.where(RecurringVisit.id.in_(recurring_visit_ids))
+    schedules = session.execute(query).scalars().all()
+    if not schedules:
+        return []
+    existing = set(
+        session.execute(
+            select(Visit.recurring_visit_id, Visit.date).where(
+                Visit.recurring_visit_id.in_([schedule.id for schedule in schedules]),
+                Visit.date >= datetime.datetime.combine(today, datetime.time.min),
+            )
+        ).all()
+    )
+    qr_rows, visit_rows = [], []
+    for schedule in schedules:
+        for offset in range(days):
+            day = today + timedelta(days=offset)
+            start = datetime.datetime.combine(day, schedule.start_time)
+            end = datetime.datetime.combine(day, schedule.end_time)
+            if (
+                not schedule.occurs_on(day)
+                or end <= now
+                or (schedule.id, start) in existing
+            ):
+                continue
+            qr_rows.append({"id": uuid.uuid4()})
+            visit_rows.append(
+                {
+                    "id": uuid.uuid4(),
+                    "date": start,
+                    "state": VisitState.PENDING,
+                    "qr_id": qr_rows[-1]["id"],
+                    "visitor_id": schedule.visitor_id,
+                    "resident_id": schedule.resident_id,
+                    "recurring_visit_id": schedule.id,
+                    "valid_until": end,
+                }
+            )
+    if not visit_rows:
+        return []
+    session.execute(insert(Qr).values(qr_rows))
+    statement = (
+        pg_insert(Visit)
+        .values(visit_rows)
+        .on_conflict_do_nothing(index_elements=["recurring_visit_id", "date"])
+        .returning(*Visit.__table__.c)
+    )
+    visits = session.execute(select(Visit).from_statement(statement)).scalars().all()
+    unused = {row["id"] for row in qr_rows} - {visit.qr_id for visit in visits}
+    if unused:
+        session.execute(delete(Qr).where(Qr.id.in_(unused)))
+    return visits
+
+
+def check_recurring_visits(session: Session, days: int = RECURRING_VISIT_DAYS) -> int:
+    """
+    Materialize the upcoming recurring visits and close the session.
+
+    Returns:
+        int: Number of visits created, 0 if the job failed.
+    """
+    try:
+        visits = materialize_recurring_visits(session, datetime.datetime.now(), days)
+        # Built before the commit expires the visits.
+        events = [visit_event(visit) for visit in visits]
+        session.commit()
+    except Exception:
+        logger.exception("Recurring visit job failed")
+        session.rollback()
+        return 0
+    finally:
+        session.close()
+    visit_broker.publish(*events)
+    if events:
+        logger.info("Recurring visits materialized", extra={"created": len(events)})
+    return len(events)
+
+
+def check_visit_partitions(
+    session: Session, months_ahead: int = VISIT_PARTITION_MONTHS_AHEAD
+) -> list:
+    """
+    Create the visit partitions of the coming months and close the session.
+
+    Returns:
+        list: Names of the created partitions, empty if the job failed.
+    """
     try:
-        current_time = datetime.datetime.now()
-        pending_visits = (
-            session.query(Visit).filter(Visit.state == VisitState.PENDING).all()
+        created = ensure_visit_partitions(
+            session.connection(), datetime.date.today(), months_ahead
         )
-        print(pending_visits)
-        for visit in pending_visits:
-            # If the visit is pending and it's been 24 hours since the QR code was created
-            if visit.date + timedelta(hours=24) < current_time:
-                # Update the state of the visit to expired
-                visit.state = VisitState.CANCELLED
         session.commit()
-    except Exception as e:
-        print(f"An error occurred: {str(e)}")
+    except Exception:
+        logger.exception("Visit partition job failed")
+        session.rollback()
+        return []
     finally:
         session.close()
+    if created:
+        logger.info("Visit partitions created", extra={"partitions": created})
+    return created
+
+
+def next_expiry(session: Session):
+    """
+    Get the moment the oldest pending visit becomes expirable.
+
+    The lookup probes the partial indexes on the date and on the end of
+    the time window of pending visits once each.
+
+    Returns:
+        datetime: Due time of the next expiry, None if nothing is pending.
+    """
+    oldest, window_end = session.execute(
+        select(
+            select(func.min(Visit.date))
+            .where(Visit.state == VisitState.PENDING)
+            .scalar_subquery(),
+            select(func.min(Visit.valid_until))
+            .where(Visit.state == VisitState.PENDING, Visit.valid_until.isnot(None))
+            .scalar_subquery(),
+        )
+    ).one()
+    due = []
+    if oldest is not None:
+        due.append(oldest + VISIT_VALIDITY)
+    if window_end is not None:
+        due.append(window_end)
+    if not due:
+        return None
+    return min(due) + EXPIRY_GRACE
+
+
+class ExpiryScheduler:
+    """
+    Run the expiry job when the next pending visit is due instead of on a
+    fixed interval.
+
+    After each run the job is rescheduled for the due time of the oldest
+    pending visit, capped at ``max_interval``. Newly created visits that
+    fall due earlier bring the next run forward through ``notify``. Each
+    run first creates the upcoming visit partitions and materializes the
+    upcoming occurrences of recurring visits.
+    """
+
+    job_id = "visit-expiry"
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        scheduler: BackgroundScheduler = None,
+        max_interval: timedelta = EXPIRY_MAX_INTERVAL,
+        batch_size: int = EXPIRY_BATCH_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.scheduler = scheduler or BackgroundScheduler()
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.next_run = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the scheduler and run the job right away.
+        """
+        self.scheduler.start()
+        self.schedule(datetime.datetime.now(), force=True)
+
+    def shutdown(self):
+        """
+        Stop the scheduler without waiting for a running job.
+        """
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+    def run(self):
+        """
+        Create the upcoming visit partitions, materialize the upcoming
+        recurring visits, expire the due visits and schedule the next run.
+        """
+        check_visit_partitions(self.session_factory())
+        check_recurring_visits(self.session_factory())
+        check_visit_expiry(self.session_factory(), self.batch_size)
+        try:
+            with self.session_factory() as session:
+                due = next_expiry(session)
+        except Exception:
+            logger.exception("Could not look up the next visit expiry")
+            due = None
+        now = datetime.datetime.now()
+        next_run = now + self.max_interval
+        if due is not None and due < next_run:
+            next_run = max(due, now + EXPIRY_GRACE)
+        self.schedule(next_run, force=True)
+
+    def notify(self, visit_date: datetime.datetime):
+        """
+        Bring the next run forward if a new pending visit is due before it.
+
+        Args:
+            visit_date (datetime): Date of the pending visit.
+        """
+        if not self.scheduler.running:
+            return
+        self.schedule(visit_date + VISIT_VALIDITY + EXPIRY_GRACE)
+
+    def schedule(self, run_date: datetime.datetime, force: bool = False):
+        """
+        Schedule the job at ``run_date``, unless a run is already planned
+        earlier and ``force`` is not set.
+        """
+        with self._lock:
+            if not force and self.next_run is not None and self.next_run <= run_date:
+                return
+            self.next_run = run_date
+            self.scheduler.add_job(
+                self.run,
+                "date",
+                run_date=run_date,
+                id=self.job_id,
+                replace_existing=True,
+                misfire_grace_time=None,
+            )
+
+
+expiry_scheduler = ExpiryScheduler(SessionLocal)
@@ -1,62 +1,145 @@
-import itertools
+import base64
 import uuid
+from datetime import datetime
+from operator import attrgetter, itemgetter
 
 from fastapi import Response, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import models, schema
+from .cache import qr_cache
+from .metrics import QR_VERIFICATIONS
 
 
-def verify_qr_code(db: Session, qr_id: str, user_id: uuid.UUID):
+def window_ended(visit: models.Visit, now: datetime = None) -> bool:
+    """
+    Tell whether the time window of a recurring visit occurrence is over.
+
+    Occurrences stop opening the gate at ``valid_until``, even before the
+    expiry job marks them as expired. Other visits have no window.
+    """
+    if visit.valid_until is None:
+        return False
+    return visit.valid_until <= (now or datetime.now())
+
+
+async def verify_qr_code(db: AsyncSession, qr_id: str, principal: schema.Principal):
     """
     Verify a QR code record in the database.
 
+    The visit, visitor, resident and residence are fetched by ``qr_id`` in a
+    single statement. Valid payloads are kept in ``qr_cache`` so repeated
+    scans of the same code skip the database until the visit changes state.
+
     Args:
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
         qr_id (str): ID of the QR code.
+        principal (schema.Principal): Authenticated user.
 
     Returns:
         QR: Verified QR instance.
     """
-    user = db.query(models.User).filter_by(id=user_id).first()
-    if user is None:
-        return Response(status_code=status.HTTP_401_UNAUTHORIZED)
-    qr = db.query(models.Qr).filter_by(id=qr_id).first()
-    if qr is None:
-        return Response(status_code=status.HTTP_404_NOT_FOUND)
-    visit = db.query(models.Visit).filter_by(qr_id=qr_id).first()
-    if visit is None:
+    cached = qr_cache.get(str(qr_id))
+    if cached is not None and not window_ended(cached["visit"]):
+        QR_VERIFICATIONS.labels("valid").inc()
+        return cached
+    # A registration or cancellation committed during the query must not
+    # be hidden by caching what the query read.
+    generation = qr_cache.generation(str(qr_id))
+    result = await db.execute(
+        select(
+            models.Visit,
+            models.Visitor,
+            models.Resident,
+            models.Residence,
+        )
+        .outerjoin(models.Visitor, models.Visit.visitor_id == models.Visitor.id)
+        .outerjoin(models.Resident, models.Visit.resident_id == models.Resident.id)
+        .outerjoin(
+            models.residents_residences,
+            models.residents_residences.c.resident_id == models.Visit.resident_id,
+        )
+        .outerjoin(
+            models.Residence,
+            models.Residence.id == models.residents_residences.c.residence_id,
+        )
+        .filter(models.Visit.qr_id == qr_id)
+        .limit(1)
+    )
+    row = result.first()
+    if row is None:
+        QR_VERIFICATIONS.labels("not_found").inc()
         return Response(status_code=status.HTTP_404_NOT_FOUND)
-    if (
-        visit.state.value == schema.VisitState.REGISTERED
-        or visit.state.value == schema.VisitState.CANCELLED
-    ):
+    visit, visitor, resident, residence = row
+    # Registered, cancelled and expired visits no longer open the gate.
+    if visit.state != models.VisitState.PENDING or window_ended(visit):
+        QR_VERIFICATIONS.labels("conflict").inc()
         return Response(status_code=status.HTTP_409_CONFLICT)
-    resident = db.query(models.Resident).filter_by(id=visit.resident_id).first()
-    visitor = db.query(models.Visitor).filter_by(id=visit.visitor_id).first()
-    residence = (
-        db.query(models.Residence)
-        .filter(models.Residence.residents.any(id=visit.resident_id))
-        .first()
-    )
-    return {
+    QR_VERIFICATIONS.labels("valid").inc()
+    payload = {
         "resident": resident,
         "visitor": visitor,
         "visit": visit,
         "residence": residence,
     }
+    qr_cache.set(str(qr_id), payload, generation=generation)
+    return payload
+
+
+def encode_cursor(visit_date: datetime, visit_id: uuid.UUID) -> str:
+    """
+    Encode the position of a visit in a ``(date, id)`` ordered listing.
+
+    Args:
+        visit_date (datetime): Date of the last visit of a page.
+        visit_id (uuid.UUID): ID of the last visit of a page.
+
+    Returns:
+        str: Opaque, URL-safe cursor.
+    """
+    raw = f"{visit_date.isoformat()}|{visit_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Decode a cursor made by ``encode_cursor``.
+
+    Args:
+        cursor (str): Opaque cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+
+    Returns:
+        tuple: Date and ID of the visit the cursor points at.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        visit_date, visit_id = raw.split("|")
+        return datetime.fromisoformat(visit_date), uuid.UUID(visit_id)
+    except (TypeError, UnicodeDecodeError, ValueError) as error:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from error
 
 
 def grouped_dict(it) -> dict:
     """
-    Group a list of dictionaries by a key.
+    Group visits, or dictionaries with a ``state`` key, by state.
+
+    Items are bucketed in a single pass, so every item is kept whatever the
+    order of the input. Groups appear in the order their state is first
+    seen and keep the input order.
     """
-    if it is None:
-        return {}
-    if len(it) == 0:
-        return {}
-    if isinstance(it, list):
-        if isinstance(it[0], dict):
-            return {k: list(g) for k, g in itertools.groupby(it, lambda t: t["state"])}
-    grouped = {k: list(g) for k, g in itertools.groupby(it, lambda t: t.state)}
+    grouped = {}
+    if not it:
+        return grouped
+    key = itemgetter("state") if isinstance(it[0], dict) else attrgetter("state")
+    for item in it:
+        state = key(item)
+        group = grouped.get(state)
+        if group is None:
+            grouped[state] = [item]
+        else:
+            group.append(item)
     return grouped
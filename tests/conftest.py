@@ -0,0 +1,93 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from src.cache import principal_cache, qr_cache, visit_summary_cache
+from src.config.database import ASYNC_DATABASE_URL, Base, engine
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """
+    Start every test with empty in-memory caches.
+    """
+    qr_cache.clear()
+    principal_cache.clear()
+    visit_summary_cache.clear()
+
+
+@pytest.fixture
+def db_session():
+    """
+    Database session bound to a transaction that is rolled back after the test.
+    """
+    Base.metadata.create_all(bind=engine)
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection)
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+@pytest_asyncio.fixture
+async def async_engine():
+    """
+    Async engine owned by the test's event loop.
+    """
+    Base.metadata.create_all(bind=engine)
+    test_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=NullPool)
+    try:
+        yield test_engine
+    finally:
+        await test_engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def async_session(async_engine):
+    """
+    Async database session bound to a transaction that is rolled back after
+    the test. Commits issued by the code under test only release a savepoint.
+    """
+    async with async_engine.connect() as connection:
+        transaction = await connection.begin()
+        session = AsyncSession(bind=connection, expire_on_commit=False)
+        await session.begin_nested()
+
+        @event.listens_for(session.sync_session, "after_transaction_end")
+        def restart_savepoint(sync_session, sync_transaction):
+            if sync_transaction.nested and not sync_transaction._parent.nested:
+                sync_session.begin_nested()
+
+        try:
+            yield session
+        finally:
+            await session.close()
+            await transaction.rollback()
+
+
+@pytest.fixture
+def statement_counter(async_engine):
+    """
+    Count the SQL statements executed on the test engine.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(
+        async_engine.sync_engine, "before_cursor_execute", before_cursor_execute
+    )
+    try:
+        yield statements
+    finally:
+        event.remove(
+            async_engine.sync_engine, "before_cursor_execute", before_cursor_execute
+        )
@@ -1,12 +1,19 @@
 import datetime
+import time
+from contextlib import asynccontextmanager
 from datetime import timedelta
+from types import SimpleNamespace
+from uuid import uuid4
 
 import jwt
 import pytest
 from fastapi import HTTPException
 from fastapi.security import HTTPAuthorizationCredentials
 
-from src.auth import AuthHandler
+from src import auth
+from src.auth import AuthHandler, MyAuthProvider
+from src.cache import principal_cache
+from src.models import Resident, Role, User
 
 
 class TestAuthHandler:
@@ -153,3 +160,144 @@ class TestAuthHandler:
 
         # Assert
         assert result is False
+
+    # Tests that the API and the admin share one password context
+    def test_password_context_is_shared(self):
+        assert AuthHandler().pwd_context is MyAuthProvider.pwd_context
+
+
+class TestPrincipalWrapper:
+    # Tests that a valid token resolves to the user's id, role and active flag
+    @pytest.mark.asyncio
+    async def test_resolves_principal(self, async_session):
+        auth_handler = AuthHandler()
+        user = User(
+            id=uuid4(),
+            name="Resident",
+            role=Role.RESIDENT,
+            username=f"resident-{uuid4()}",
+            resident=Resident(id=uuid4(), phone="0999999999"),
+        )
+        async_session.add(user)
+        await async_session.flush()
+        credentials = HTTPAuthorizationCredentials(
+            scheme="Bearer", credentials=auth_handler.encode_token(user.id)
+        )
+
+        principal = await auth_handler.principal_wrapper(credentials, async_session)
+
+        assert principal.id == user.id
+        assert principal.role == "RESIDENT"
+        assert principal.is_active is True
+        assert principal.resident_id == user.resident.id
+
+    # Tests that a repeated token skips the decode and the user lookup
+    @pytest.mark.asyncio
+    async def test_repeated_token_hits_cache(
+        self, async_session, statement_counter, mocker
+    ):
+        auth_handler = AuthHandler()
+        user = User(
+            id=uuid4(), name="Guard", role=Role.GUARD, username=f"guard-{uuid4()}"
+        )
+        async_session.add(user)
+        await async_session.flush()
+        credentials = HTTPAuthorizationCredentials(
+            scheme="Bearer", credentials=auth_handler.encode_token(user.id)
+        )
+        first = await auth_handler.principal_wrapper(credentials, async_session)
+        statement_counter.clear()
+        decode = mocker.spy(auth_handler, "decode_payload")
+
+        second = await auth_handler.principal_wrapper(credentials, async_session)
+
+        assert second is first
+        assert statement_counter == []
+        decode.assert_not_called()
+
+    # Tests that a cached principal does not outlive its token
+    @pytest.mark.asyncio
+    async def test_cache_entry_bounded_by_token_expiry(self, async_session, mocker):
+        auth_handler = AuthHandler()
+        user = User(
+            id=uuid4(), name="Guard", role=Role.GUARD, username=f"guard-{uuid4()}"
+        )
+        async_session.add(user)
+        await async_session.flush()
+        token = auth_handler.create_access_token(
+            {"sub": str(user.id), "exp": int(time.time()) + 5}
+        )
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+        clock = mocker.patch.object(principal_cache, "clock", return_value=0)
+        decode = mocker.spy(auth_handler, "decode_payload")
+        await auth_handler.principal_wrapper(credentials, async_session)
+
+        clock.return_value = 4
+        await auth_handler.principal_wrapper(credentials, async_session)
+        clock.return_value = 6
+        await auth_handler.principal_wrapper(credentials, async_session)
+
+        assert decode.call_count == 2
+
+    # Tests that a token of a deleted user is rejected
+    @pytest.mark.asyncio
+    async def test_unknown_user_rejected(self, async_session):
+        auth_handler = AuthHandler()
+        credentials = HTTPAuthorizationCredentials(
+            scheme="Bearer", credentials=auth_handler.encode_token(uuid4())
+        )
+
+        with pytest.raises(HTTPException) as error:
+            await auth_handler.principal_wrapper(credentials, async_session)
+
+        assert error.value.status_code == 401
+        assert principal_cache.stats()["size"] == 0
+
+    # Tests that an invalid token is rejected and not cached
+    @pytest.mark.asyncio
+    async def test_invalid_token_rejected(self, async_session):
+        auth_handler = AuthHandler()
+        credentials = HTTPAuthorizationCredentials(
+            scheme="Bearer", credentials="invalid_token"
+        )
+
+        with pytest.raises(HTTPException):
+            await auth_handler.principal_wrapper(credentials, async_session)
+
+        assert principal_cache.stats()["size"] == 0
+
+
+class TestMyAuthProvider:
+    @staticmethod
+    def use_session(mocker, session):
+        @asynccontextmanager
+        async def session_factory():
+            yield session
+
+        mocker.patch.object(auth, "AsyncSessionLocal", session_factory)
+
+    # Tests that an admin session is resolved to its user through the async session
+    @pytest.mark.asyncio
+    async def test_is_authenticated(self, async_session, mocker):
+        user = User(
+            id=uuid4(), name="Admin", role=Role.ADMIN, username=f"admin-{uuid4()}"
+        )
+        async_session.add(user)
+        await async_session.flush()
+        self.use_session(mocker, async_session)
+        request = SimpleNamespace(
+            session={"username": user.username}, state=SimpleNamespace()
+        )
+
+        assert await MyAuthProvider(None).is_authenticated(request) is True
+        assert request.state.user.id == user.id
+
+    # Tests that an unknown username is not authenticated
+    @pytest.mark.asyncio
+    async def test_unknown_user_not_authenticated(self, async_session, mocker):
+        self.use_session(mocker, async_session)
+        request = SimpleNamespace(
+            session={"username": f"admin-{uuid4()}"}, state=SimpleNamespace()
+        )
+
+        assert await MyAuthProvider(None).is_authenticated(request) is False
@@ -0,0 +1,102 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from main import app
+from src import board
+from src.events import visit_broker, visit_event
+from src.models import Visit, VisitState
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = asyncio.Event()
+
+    async def receive(self):
+        await self.closed.wait()
+        return {"type": "websocket.disconnect"}
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code):
+        self.closed.set()
+
+
+async def wait_until(condition):
+    while not condition():
+        await asyncio.sleep(0.001)
+
+
+def make_visit(date):
+    return Visit(id=uuid4(), date=date, state=VisitState.PENDING)
+
+
+class TestStreamBoard:
+    # Tests that the board sends a snapshot, then today's visit events
+    @pytest.mark.asyncio
+    async def test_snapshot_then_events(self, mocker):
+        mocker.patch.object(
+            board, "board_snapshot", return_value={"event": "snapshot", "visits": {}}
+        )
+        websocket = FakeWebSocket()
+        stream = asyncio.ensure_future(board.stream_board(websocket, uuid4()))
+        await wait_until(lambda: websocket.sent)
+
+        today = make_visit(datetime.now())
+        visit_broker.publish(
+            visit_event(make_visit(datetime.now() - timedelta(days=2))),
+            visit_event(today),
+        )
+        await wait_until(lambda: len(websocket.sent) == 2)
+        websocket.closed.set()
+        await asyncio.wait_for(stream, timeout=1)
+
+        assert websocket.sent[0] == {"event": "snapshot", "visits": {}}
+        assert websocket.sent[1]["visit"]["id"] == str(today.id)
+        assert visit_broker.stats()["subscribers"] == 0
+
+    # Tests that a resync sends a new snapshot
+    @pytest.mark.asyncio
+    async def test_resync_sends_snapshot(self, mocker):
+        snapshot = mocker.patch.object(
+            board, "board_snapshot", return_value={"event": "snapshot", "visits": {}}
+        )
+        websocket = FakeWebSocket()
+        stream = asyncio.ensure_future(board.stream_board(websocket, uuid4()))
+        await wait_until(lambda: websocket.sent)
+
+        visit_broker.publish({"event": "resync"})
+        await wait_until(lambda: len(websocket.sent) == 2)
+        websocket.closed.set()
+        await asyncio.wait_for(stream, timeout=1)
+
+        assert snapshot.await_count == 2
+        assert websocket.sent[1]["event"] == "snapshot"
+
+    # Tests that the connection is closed when the user has no board
+    @pytest.mark.asyncio
+    async def test_closes_without_board(self, mocker):
+        mocker.patch.object(board, "board_snapshot", return_value=None)
+        websocket = FakeWebSocket()
+
+        await asyncio.wait_for(board.stream_board(websocket, uuid4()), timeout=1)
+
+        assert websocket.closed.is_set()
+        assert websocket.sent == []
+
+
+class TestVisitBoardEndpoint:
+    # Tests that a connection with an invalid token is refused
+    def test_invalid_token_refused(self):
+        client = TestClient(app)
+
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/api/ws/board?token=invalid"):
+                pass
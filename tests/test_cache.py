@@ -0,0 +1,93 @@
+from src.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache:
+    # Tests that a cached value is returned and counted as a hit
+    def test_get_returns_cached_value(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+
+        cache.set("a", 1)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    # Tests that entries expire once their TTL has passed
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=30)
+
+        clock.now = 10
+
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+
+    # Tests that the least recently used entry is evicted when the cache is full
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    # Tests that invalidated entries are dropped and counted
+    def test_invalidate_drops_entries(self):
+        cache = TTLCache(maxsize=4, ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        cache.invalidate("a", "b", "missing")
+
+        assert cache.get("a") is None
+        assert cache.stats()["invalidations"] == 2
+        assert cache.stats()["size"] == 0
+
+    # Tests that a cache without capacity stores nothing
+    def test_zero_size_disables_cache(self):
+        cache = TTLCache(maxsize=0, ttl=10)
+
+        cache.set("a", 1)
+
+        assert cache.get("a") is None
+
+    # Tests that a value read before an invalidation of its key is not cached
+    def test_set_after_invalidation_is_dropped(self):
+        cache = TTLCache(maxsize=4, ttl=10)
+        stale = cache.generation("a")
+        fresh = cache.generation("b")
+
+        cache.invalidate("a")
+        cache.set("a", 1, generation=stale)
+        cache.set("b", 2, generation=fresh)
+
+        assert cache.get("a") is None
+        assert cache.get("b") == 2
+        cache.set("a", 3, generation=cache.generation("a"))
+        assert cache.get("a") == 3
+
+    # Tests that invalidations stay detected once their key is no longer tracked
+    def test_dropped_generations_stay_detected(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        stale = cache.generation("a")
+
+        cache.invalidate("a", "b", "c")
+        cache.set("a", 1, generation=stale)
+
+        assert cache.get("a") is None
@@ -0,0 +1,843 @@
+import asyncio
+from datetime import datetime, time, timedelta
+from uuid import uuid4
+
+import pytest
+from passlib.context import CryptContext
+from pydantic import ValidationError
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src import crud
+from src.cache import qr_cache, visit_summary_cache
+from src.models import (
+    Guard,
+    Qr,
+    RecurringVisit,
+    Resident,
+    Role,
+    User,
+    Visit,
+    Visitor,
+    VisitState,
+)
+from src.schema import (
+    BULK_VISIT_LIMIT,
+    AuthDetails,
+    BulkVisitCreate,
+    Principal,
+    RecurringVisitCreate,
+    VisitRequest,
+)
+from src.tasks import RECURRING_VISIT_DAYS
+
+
+async def seed_resident_visits(session, count):
+    resident = Resident(id=uuid4(), phone="0999999999")
+    user = User(
+        id=uuid4(),
+        name="Resident",
+        role=Role.RESIDENT,
+        username=f"resident-{uuid4()}",
+        resident=resident,
+    )
+    session.add(user)
+    for index in range(count):
+        session.add(
+            Visit(
+                date=datetime.now(),
+                state=VisitState.PENDING,
+                visitor=Visitor(name=f"Visitor {index}"),
+                resident=resident,
+            )
+        )
+    await session.flush()
+    return user
+
+
+async def seed_guard(session):
+    user = User(
+        id=uuid4(),
+        name="Guard",
+        role=Role.GUARD,
+        username=f"guard-{uuid4()}",
+        guard=Guard(id=uuid4()),
+    )
+    session.add(user)
+    await session.flush()
+    return user
+
+
+async def seed_login_user(session, rounds):
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    user = User(
+        id=uuid4(),
+        name="Guard",
+        role=Role.GUARD,
+        username=f"guard-{uuid4()}",
+        password=context.hash("password123"),
+    )
+    session.add(user)
+    await session.flush()
+    return user
+
+
+class TestGetUserVisits:
+    # Tests that a resident's visits are returned with their visitors loaded
+    @pytest.mark.asyncio
+    async def test_resident_visits_include_visitor(self, async_session):
+        user = await seed_resident_visits(async_session, 3)
+        async_session.expunge_all()
+
+        result = await crud.get_user_visits(async_session, user_id=user.id)
+
+        visits = result["visits"][VisitState.PENDING]
+        assert len(visits) == 3
+        assert all("visitor" in visit.__dict__ for visit in visits)
+
+    # Tests that the statement count for a resident does not grow with the number of visits
+    @pytest.mark.asyncio
+    async def test_resident_statement_count_is_constant(
+        self, async_session, statement_counter
+    ):
+        few = await seed_resident_visits(async_session, 2)
+        many = await seed_resident_visits(async_session, 40)
+        async_session.expunge_all()
+
+        statement_counter.clear()
+        await crud.get_user_visits(async_session, user_id=few.id)
+        few_count = len(statement_counter)
+
+        statement_counter.clear()
+        await crud.get_user_visits(async_session, user_id=many.id)
+        many_count = len(statement_counter)
+
+        assert few_count == many_count
+
+    # Tests that the statement count for a guard does not grow with the number of visits
+    @pytest.mark.asyncio
+    async def test_guard_statement_count_is_constant(
+        self, async_session, statement_counter
+    ):
+        guard = await seed_guard(async_session)
+        await seed_resident_visits(async_session, 2)
+        async_session.expunge_all()
+
+        statement_counter.clear()
+        await crud.get_user_visits(async_session, user_id=guard.id)
+        few_count = len(statement_counter)
+
+        await seed_resident_visits(async_session, 40)
+        async_session.expunge_all()
+
+        statement_counter.clear()
+        result = await crud.get_user_visits(async_session, user_id=guard.id)
+        many_count = len(statement_counter)
+
+        assert few_count == many_count
+        visits = result["visits"][VisitState.PENDING]
+        assert all("resident" in visit.__dict__ for visit in visits)
+
+
+class TestGetUserVisitsPagination:
+    @staticmethod
+    async def seed_history(session, dates, state=VisitState.PENDING):
+        user = await seed_resident_visits(session, 0)
+        visits = [
+            Visit(
+                date=visit_date,
+                state=state,
+                visitor=Visitor(name="Visitor"),
+                resident=user.resident,
+            )
+            for visit_date in dates
+        ]
+        session.add_all(visits)
+        await session.flush()
+        return user, visits
+
+    # Tests that following the cursors returns every visit once, newest first
+    @pytest.mark.asyncio
+    async def test_cursor_walks_whole_history(self, async_session):
+        day = datetime(2026, 1, 1)
+        dates = [day, day, day + timedelta(days=1), day + timedelta(days=2)] * 2
+        user, visits = await self.seed_history(async_session, dates)
+        expected = sorted(visits, key=lambda visit: (visit.date, visit.id))[::-1]
+
+        pages, cursor = [], None
+        while True:
+            result = await crud.get_user_visits(
+                async_session, user_id=user.id, limit=3, cursor=cursor
+            )
+            pages.append(result["visits"][VisitState.PENDING])
+            cursor = result["next_cursor"]
+            if cursor is None:
+                break
+
+        assert [len(page) for page in pages] == [3, 3, 2]
+        assert [visit.id for page in pages for visit in page] == [
+            visit.id for visit in expected
+        ]
+
+    # Tests that guards get the whole day unless they ask for a page
+    @pytest.mark.asyncio
+    async def test_guard_day_unpaginated_by_default(self, async_session, mocker):
+        mocker.patch.object(crud, "VISIT_PAGE_SIZE", 2)
+        guard = await seed_guard(async_session)
+        resident = await seed_resident_visits(async_session, 3)
+
+        day = await crud.get_user_visits(async_session, user_id=guard.id)
+        page = await crud.get_user_visits(async_session, user_id=guard.id, limit=2)
+        history = await crud.get_user_visits(async_session, user_id=resident.id)
+
+        assert len(day["visits"][VisitState.PENDING]) >= 3
+        assert day["next_cursor"] is None
+        assert len(page["visits"][VisitState.PENDING]) == 2
+        assert page["next_cursor"] is not None
+        assert len(history["visits"][VisitState.PENDING]) == 2
+        assert history["next_cursor"] is not None
+
+    # Tests that the date window and state filters narrow the page
+    @pytest.mark.asyncio
+    async def test_date_and_state_filters(self, async_session):
+        day = datetime(2026, 1, 1)
+        user, visits = await self.seed_history(
+            async_session, [day + timedelta(days=offset) for offset in range(5)]
+        )
+        visits[4].state = VisitState.REGISTERED
+        await async_session.flush()
+
+        window = await crud.get_user_visits(
+            async_session,
+            user_id=user.id,
+            date_from=day + timedelta(days=1),
+            date_to=day + timedelta(days=3),
+        )
+        registered = await crud.get_user_visits(
+            async_session, user_id=user.id, state=VisitState.REGISTERED
+        )
+
+        assert [visit.id for visit in window["visits"][VisitState.PENDING]] == [
+            visits[3].id,
+            visits[2].id,
+            visits[1].id,
+        ]
+        assert [visit.id for visit in registered["visits"][VisitState.REGISTERED]] == [
+            visits[4].id
+        ]
+        assert list(registered["visits"]) == [VisitState.REGISTERED]
+        assert registered["next_cursor"] is None
+
+    # Tests that a malformed cursor is rejected
+    @pytest.mark.asyncio
+    async def test_invalid_cursor_bad_request(self, async_session):
+        user, _ = await self.seed_history(async_session, [datetime.now()])
+
+        result = await crud.get_user_visits(
+            async_session, user_id=user.id, cursor="not-a-cursor"
+        )
+
+        assert result.status_code == 400
+
+
+class TestGetVisitSummary:
+    # Tests that a resident's visits are counted per state in one statement
+    @pytest.mark.asyncio
+    async def test_resident_counts_single_statement(
+        self, async_session, statement_counter
+    ):
+        user = await seed_resident_visits(async_session, 3)
+        async_session.add(
+            Visit(
+                date=datetime.now(),
+                state=VisitState.CANCELLED,
+                resident=user.resident,
+            )
+        )
+        await async_session.flush()
+        principal = Principal(
+            id=user.id, role="RESIDENT", is_active=True, resident_id=user.resident.id
+        )
+        statement_counter.clear()
+
+        summary = await crud.get_visit_summary(async_session, principal)
+
+        assert len(statement_counter) == 1
+        assert summary == {
+            "counts": {"PENDING": 3, "REGISTERED": 0, "CANCELLED": 1, "EXPIRED": 0},
+            "total": 4,
+        }
+
+    # Tests that a repeated summary is served from the cache
+    @pytest.mark.asyncio
+    async def test_repeated_summary_hits_cache(self, async_session, statement_counter):
+        user = await seed_resident_visits(async_session, 2)
+        principal = Principal(
+            id=user.id, role="RESIDENT", is_active=True, resident_id=user.resident.id
+        )
+        first = await crud.get_visit_summary(async_session, principal)
+        statement_counter.clear()
+
+        second = await crud.get_visit_summary(async_session, principal)
+
+        assert second is first
+        assert statement_counter == []
+
+    # Tests that guards get the counts of today's visits only
+    @pytest.mark.asyncio
+    async def test_guard_counts_today(self, async_session):
+        guard = await seed_guard(async_session)
+        principal = Principal(id=guard.id, role="GUARD", is_active=True)
+        before = await crud.get_visit_summary(async_session, principal)
+        visit_summary_cache.clear()
+        async_session.add_all(
+            [
+                Visit(date=datetime.now(), state=VisitState.REGISTERED),
+                Visit(
+                    date=datetime.now() - timedelta(days=2),
+                    state=VisitState.REGISTERED,
+                ),
+            ]
+        )
+        await async_session.flush()
+
+        after = await crud.get_visit_summary(async_session, principal)
+
+        assert after["counts"]["REGISTERED"] == before["counts"]["REGISTERED"] + 1
+        assert after["total"] == before["total"] + 1
+
+
+class TestVisitStateTransitions:
+    # Tests that registering a visit drops its cached QR verification
+    @pytest.mark.asyncio
+    async def test_register_visit_invalidates_qr_cache(self, async_session):
+        visit = Visit(date=datetime.now(), state=VisitState.PENDING, qr=Qr(id=uuid4()))
+        async_session.add(visit)
+        await async_session.flush()
+        qr_id = str(visit.qr_id)
+        qr_cache.set(qr_id, {"visit": visit})
+
+        await crud.register_visit(async_session, qr_id=qr_id, user_id=None)
+
+        assert qr_cache.get(qr_id) is None
+
+    # Tests that cancelling a visit drops its cached QR verification
+    @pytest.mark.asyncio
+    async def test_canceled_visit_invalidates_qr_cache(self, async_session):
+        visit = Visit(date=datetime.now(), state=VisitState.PENDING, qr=Qr(id=uuid4()))
+        async_session.add(visit)
+        await async_session.flush()
+        qr_id = str(visit.qr_id)
+        qr_cache.set(qr_id, {"visit": visit})
+
+        await crud.canceled_visit(async_session, qr_id=qr_id, user_id=None)
+
+        assert qr_cache.get(qr_id) is None
+
+    # Tests that a registered visit is published with its new state
+    @pytest.mark.asyncio
+    async def test_register_visit_publishes_event(self, async_session, mocker):
+        publish = mocker.patch.object(crud.visit_broker, "publish")
+        visit = Visit(date=datetime.now(), state=VisitState.PENDING, qr=Qr(id=uuid4()))
+        async_session.add(visit)
+        await async_session.flush()
+
+        await crud.register_visit(async_session, qr_id=visit.qr_id, user_id=None)
+
+        (event,) = publish.call_args.args
+        assert event["event"] == "visit"
+        assert event["visit"]["id"] == visit.id
+        assert event["visit"]["state"] == VisitState.REGISTERED
+
+    # Tests that registering an unknown QR code returns 404
+    @pytest.mark.asyncio
+    async def test_register_unknown_qr(self, async_session):
+        result = await crud.register_visit(async_session, qr_id=uuid4(), user_id=None)
+
+        assert result.status_code == 404
+
+    # Tests that a cancelled visit cannot be registered
+    @pytest.mark.asyncio
+    async def test_register_cancelled_visit_conflict(self, async_session):
+        visit = Visit(
+            date=datetime.now(), state=VisitState.CANCELLED, qr=Qr(id=uuid4())
+        )
+        async_session.add(visit)
+        await async_session.flush()
+
+        result = await crud.register_visit(
+            async_session, qr_id=visit.qr_id, user_id=None
+        )
+
+        assert result.status_code == 409
+
+    # Tests that a recurring visit occurrence cannot be registered after its window
+    @pytest.mark.asyncio
+    async def test_register_after_window_conflict(self, async_session, mocker):
+        visit = Visit(
+            date=datetime(2026, 10, 19, 8, 0),
+            valid_until=datetime(2026, 10, 19, 17, 0),
+            state=VisitState.PENDING,
+            qr=Qr(id=uuid4()),
+        )
+        async_session.add(visit)
+        await async_session.flush()
+        clock = mocker.patch("src.crud.datetime", wraps=datetime)
+        clock.now.return_value = datetime(2026, 10, 19, 17, 30)
+
+        result = await crud.register_visit(
+            async_session, qr_id=visit.qr_id, user_id=None
+        )
+
+        assert result.status_code == 409
+        await async_session.refresh(visit)
+        assert visit.state == VisitState.PENDING
+
+    # Tests that the registration is a single statement and returns the updated visit
+    @pytest.mark.asyncio
+    async def test_register_visit_single_statement(
+        self, async_session, statement_counter
+    ):
+        visit = Visit(date=datetime.now(), state=VisitState.PENDING, qr=Qr(id=uuid4()))
+        async_session.add(visit)
+        await async_session.flush()
+        statement_counter.clear()
+
+        result = await crud.register_visit(
+            async_session, qr_id=visit.qr_id, user_id=None
+        )
+
+        assert result.state == VisitState.REGISTERED
+        assert result.register_date is not None
+        assert [s for s in statement_counter if "SAVEPOINT" not in s] == [
+            statement_counter[0]
+        ]
+
+
+class TestConcurrentRegistration:
+    # Tests that parallel registrations of the same QR code succeed exactly once
+    @pytest.mark.asyncio
+    async def test_parallel_registrations_succeed_once(self, async_engine):
+        qr_id, visit_id = uuid4(), uuid4()
+        async with AsyncSession(async_engine) as session:
+            session.add(
+                Visit(
+                    id=visit_id,
+                    date=datetime.now(),
+                    state=VisitState.PENDING,
+                    qr=Qr(id=qr_id),
+                )
+            )
+            await session.commit()
+
+        async def scan():
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                return await crud.register_visit(session, qr_id=qr_id, user_id=None)
+
+        try:
+            results = await asyncio.gather(*(scan() for _ in range(10)))
+        finally:
+            async with AsyncSession(async_engine) as session:
+                await session.execute(delete(Visit).where(Visit.id == visit_id))
+                await session.execute(delete(Qr).where(Qr.id == qr_id))
+                await session.commit()
+
+        registered = [result for result in results if isinstance(result, Visit)]
+        conflicts = [result for result in results if not isinstance(result, Visit)]
+        assert len(registered) == 1
+        assert [result.status_code for result in conflicts] == [409] * 9
+
+
+class TestLoginRehash:
+    # Tests that a password hashed with a lower cost is rehashed at login
+    @pytest.mark.asyncio
+    async def test_outdated_hash_is_upgraded(self, async_session, mocker):
+        context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=5)
+        mocker.patch.object(crud.auth_handler, "pwd_context", context)
+        user = await seed_login_user(async_session, rounds=4)
+        old_hash = user.password
+
+        result = await crud.login(
+            async_session, AuthDetails(username=user.username, password="password123")
+        )
+
+        assert "token" in result
+        assert user.password != old_hash
+        assert not context.needs_update(user.password)
+        assert context.verify("password123", user.password)
+
+    # Tests that an up to date hash is left untouched
+    @pytest.mark.asyncio
+    async def test_current_hash_is_kept(self, async_session, mocker):
+        context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+        mocker.patch.object(crud.auth_handler, "pwd_context", context)
+        user = await seed_login_user(async_session, rounds=4)
+        old_hash = user.password
+
+        result = await crud.login(
+            async_session, AuthDetails(username=user.username, password="password123")
+        )
+
+        assert "token" in result
+        assert user.password == old_hash
+
+    # Tests that a wrong password is rejected without rehashing
+    @pytest.mark.asyncio
+    async def test_wrong_password_is_not_rehashed(self, async_session, mocker):
+        context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=5)
+        mocker.patch.object(crud.auth_handler, "pwd_context", context)
+        user = await seed_login_user(async_session, rounds=4)
+        old_hash = user.password
+
+        result = await crud.login(
+            async_session, AuthDetails(username=user.username, password="incorrect")
+        )
+
+        assert result.status_code == 401
+        assert user.password == old_hash
+
+
+class TestCreateVisit:
+    # Tests that a resident's visit is written without lookups and committed once
+    @pytest.mark.asyncio
+    async def test_resident_visit_single_commit(
+        self, async_session, statement_counter, mocker
+    ):
+        notify = mocker.patch.object(crud.expiry_scheduler, "notify")
+        user = await seed_resident_visits(async_session, 0)
+        principal = Principal(
+            id=user.id, role="RESIDENT", is_active=True, resident_id=user.resident.id
+        )
+        date = datetime.now()
+        statement_counter.clear()
+
+        visit = await crud.create_visit(async_session, "Guest", date, principal)
+
+        assert [s.split()[0] for s in statement_counter if "SAVEPOINT" not in s] == [
+            "INSERT",
+            "INSERT",
+            "INSERT",
+        ]
+        # Each commit releases the test savepoint
+        releases = [s for s in statement_counter if s.startswith("RELEASE")]
+        assert len(releases) == 1
+        assert visit.state == VisitState.PENDING
+        assert visit.resident_id == user.resident.id
+        assert (await async_session.get(Qr, visit.qr_id)) is not None
+        assert (await async_session.get(Visitor, visit.visitor_id)).name == "Guest"
+        notify.assert_called_once_with(date)
+
+    # Tests that a guard's visit is registered without a QR code
+    @pytest.mark.asyncio
+    async def test_guard_visit_registered(self, async_session):
+        guard = await seed_guard(async_session)
+        principal = Principal(id=guard.id, role="GUARD", is_active=True)
+
+        visit = await crud.create_visit(
+            async_session, "Delivery", datetime.now(), principal
+        )
+
+        assert visit.state == VisitState.REGISTERED
+        assert visit.qr_id is None
+
+    # Tests that a created visit is published with its visitor name
+    @pytest.mark.asyncio
+    async def test_publishes_created_visit(self, async_session, mocker):
+        publish = mocker.patch.object(crud.visit_broker, "publish")
+        guard = await seed_guard(async_session)
+        principal = Principal(id=guard.id, role="GUARD", is_active=True)
+
+        visit = await crud.create_visit(
+            async_session, "Delivery", datetime.now(), principal
+        )
+
+        (event,) = publish.call_args.args
+        assert event["visit"]["id"] == visit.id
+        assert event["visit"]["visitor"] == {
+            "id": visit.visitor_id,
+            "name": "Delivery",
+        }
+
+    # Tests that a user without a resident cannot create pending visits
+    @pytest.mark.asyncio
+    async def test_resident_without_residence_unauthorized(self, async_session):
+        principal = Principal(id=uuid4(), role="RESIDENT", is_active=True)
+
+        result = await crud.create_visit(
+            async_session, "Guest", datetime.now(), principal
+        )
+
+        assert result.status_code == 401
+
+
+class TestCreateVisits:
+    # Tests that a resident's visits are created pending, each with its own QR code and visitor
+    @pytest.mark.asyncio
+    async def test_resident_visits_are_pending_with_qr(self, async_session, mocker):
+        notify = mocker.patch.object(crud.expiry_scheduler, "notify")
+        user = await seed_resident_visits(async_session, 0)
+        principal = Principal(
+            id=user.id, role="RESIDENT", is_active=True, resident_id=user.resident.id
+        )
+        now = datetime.now()
+        requests = [
+            VisitRequest(name=f"Guest {index}", date=now + timedelta(hours=index))
+            for index in range(3)
+        ]
+
+        visits = await crud.create_visits(async_session, requests, principal)
+
+        assert [visit.state for visit in visits] == [VisitState.PENDING] * 3
+        assert [visit.date for visit in visits] == [r.date for r in requests]
+        assert len({visit.qr_id for visit in visits}) == 3
+        assert all(visit.resident_id == user.resident.id for visit in visits)
+        assert all(visit.created_date is not None for visit in visits)
+        result = await async_session.execute(
+            select(Qr).filter(Qr.id.in_([visit.qr_id for visit in visits]))
+        )
+        qrs = result.scalars().all()
+        assert len(qrs) == 3
+        assert all(qr.code is not None for qr in qrs)
+        notify.assert_called_once_with(now)
+
+    # Tests that an aware date is stored and scheduled as naive local time
+    @pytest.mark.asyncio
+    async def test_aware_date_is_naive_local(self, async_session, mocker):
+        notify = mocker.patch.object(crud.expiry_scheduler, "notify")
+        user = await seed_resident_visits(async_session, 0)
+        principal = Principal(
+            id=user.id, role="RESIDENT", is_active=True, resident_id=user.resident.id
+        )
+        requests = [VisitRequest(name="Guest", date="2026-10-18T15:00:00Z")]
+
+        visits = await crud.create_visits(async_session, requests, principal)
+
+        await async_session.refresh(visits[0])
+        assert visits[0].date == datetime(2026, 10, 18, 10, 0)
+        notify.assert_called_once_with(datetime(2026, 10, 18, 10, 0))
+
+    # Tests that the number of statements does not grow with the number of visits
+    @pytest.mark.asyncio
+    async def test_statement_count_is_constant(
+        self, async_session, statement_counter, mocker
+    ):
+        mocker.patch.object(crud.expiry_scheduler, "notify")
+        user = await seed_resident_visits(async_session, 0)
+        principal = Principal(
+            id=user.id, role="RESIDENT", is_active=True, resident_id=user.resident.id
+        )
+        requests = [
+            VisitRequest(name=f"Guest {index}", date=datetime.now())
+            for index in range(150)
+        ]
+        statement_counter.clear()
+
+        visits = await crud.create_visits(async_session, requests, principal)
+
+        inserts = [s for s in statement_counter if s.startswith("INSERT")]
+        assert len(visits) == 150
+        assert len(inserts) == 3
+
+    # Tests that a guard's visits are registered without QR codes
+    @pytest.mark.asyncio
+    async def test_guard_visits_are_registered(self, async_session):
+        guard = await seed_guard(async_session)
+        principal = Principal(id=guard.id, role="GUARD", is_active=True)
+        requests = [VisitRequest(name="Delivery", date=datetime.now())]
+
+        visits = await crud.create_visits(async_session, requests, principal)
+
+        assert visits[0].state == VisitState.REGISTERED
+        assert visits[0].qr_id is None
+
+    # Tests that an inactive user cannot create visits
+    @pytest.mark.asyncio
+    async def test_inactive_user_unauthorized(self, async_session):
+        principal = Principal(id=uuid4(), role="RESIDENT", is_active=False)
+        requests = [VisitRequest(name="Guest", date=datetime.now())]
+
+        result = await crud.create_visits(async_session, requests, principal)
+
+        assert result.status_code == 401
+
+    # Tests that a batch must hold between one and BULK_VISIT_LIMIT visits
+    def test_batch_size_is_bounded(self):
+        request = {"name": "Guest", "date": datetime.now()}
+
+        with pytest.raises(ValidationError):
+            BulkVisitCreate(visits=[])
+        with pytest.raises(ValidationError):
+            BulkVisitCreate(visits=[request] * (BULK_VISIT_LIMIT + 1))
+        assert len(BulkVisitCreate(visits=[request]).visits) == 1
+
+
+class TestRecurringVisits:
+    # Tests that only the upcoming occurrences of a recurring visit are materialized
+    @pytest.mark.asyncio
+    async def test_create_materializes_horizon(self, async_session, mocker):
+        notify = mocker.patch.object(crud.expiry_scheduler, "notify")
+        user = await seed_resident_visits(async_session, 0)
+        principal = Principal(
+            id=user.id, role="RESIDENT", is_active=True, resident_id=user.resident.id
+        )
+        recurring = RecurringVisitCreate(
+            name="Maid",
+            weekdays=[1, 2, 3, 4, 5, 6, 7],
+            start_time=time.min,
+            end_time=time.max,
+        )
+
+        result = await crud.create_recurring_visit(async_session, recurring, principal)
+
+        visits = result["visits"]
+        assert result["recurring_visit"].weekdays == 0b1111111
+        assert len(visits) == RECURRING_VISIT_DAYS
+        assert all(visit.qr_id is not None for visit in visits)
+        notify.assert_called_once_with(min(visit.date for visit in visits))
+
+    # Tests that cancelling a recurring visit stops it and cancels its pending visits
+    @pytest.mark.asyncio
+    async def test_cancel_cancels_pending_visits(self, async_session, mocker):
+        mocker.patch.object(crud.expiry_scheduler, "notify")
+        user = await seed_resident_visits(async_session, 0)
+        principal = Principal(
+            id=user.id, role="RESIDENT", is_active=True, resident_id=user.resident.id
+        )
+        recurring = RecurringVisitCreate(
+            name="Driver",
+            weekdays=[1, 2, 3, 4, 5, 6, 7],
+            start_time=time.min,
+            end_time=time.max,
+        )
+        created = await crud.create_recurring_visit(async_session, recurring, principal)
+        recurring_visit_id = created["recurring_visit"].id
+
+        result = await crud.cancel_recurring_visit(
+            async_session, recurring_visit_id, principal
+        )
+
+        assert result == {"cancelled": RECURRING_VISIT_DAYS}
+        recurring_visit = await async_session.get(
+            RecurringVisit, recurring_visit_id, populate_existing=True
+        )
+        assert recurring_visit.is_active is False
+        states = await async_session.execute(
+            select(Visit.state).filter_by(recurring_visit_id=recurring_visit_id)
+        )
+        assert set(states.scalars()) == {VisitState.CANCELLED}
+
+    # Tests that another resident's recurring visit cannot be cancelled
+    @pytest.mark.asyncio
+    async def test_cancel_other_resident_not_found(self, async_session):
+        principal = Principal(
+            id=uuid4(), role="RESIDENT", is_active=True, resident_id=uuid4()
+        )
+
+        result = await crud.cancel_recurring_visit(async_session, uuid4(), principal)
+
+        assert result.status_code == 404
+
+    # Tests that a recurring visit needs a non-empty time window
+    def test_time_window_must_not_be_empty(self):
+        with pytest.raises(ValidationError):
+            RecurringVisitCreate(
+                name="Maid", weekdays=[1], start_time=time(17), end_time=time(8)
+            )
+
+
+class TestResolveVisitors:
+    # Tests that a resident's repeat visitor reuses one record with the latest name
+    @pytest.mark.asyncio
+    async def test_repeat_visitor_reused(self, async_session, statement_counter):
+        user = await seed_resident_visits(async_session, 0)
+        resident_id = user.resident.id
+        (first,) = await crud.resolve_visitors(
+            async_session, [("Ana  Pérez", None)], resident_id
+        )
+        statement_counter.clear()
+
+        (second,) = await crud.resolve_visitors(
+            async_session, [(" ana pérez ", "")], resident_id
+        )
+
+        assert second.id == first.id
+        assert second.name == " ana pérez "
+        assert [s.split()[0] for s in statement_counter] == ["INSERT"]
+
+    # Tests that different documents or residents keep visitors apart
+    @pytest.mark.asyncio
+    async def test_document_and_resident_distinguish(self, async_session):
+        first_user = await seed_resident_visits(async_session, 0)
+        second_user = await seed_resident_visits(async_session, 0)
+
+        visitors = await crud.resolve_visitors(
+            async_session,
+            [("Ana", None), ("Ana", "0912345678"), ("Ana", " 0912345678 ")],
+            first_user.resident.id,
+        )
+        (other,) = await crud.resolve_visitors(
+            async_session, [("Ana", None)], second_user.resident.id
+        )
+
+        assert visitors[0].id != visitors[1].id
+        assert visitors[1].id == visitors[2].id
+        assert other.id != visitors[0].id
+
+    # Tests that visitors without a resident always get a new record
+    @pytest.mark.asyncio
+    async def test_walk_ins_not_merged(self, async_session):
+        visitors = await crud.resolve_visitors(
+            async_session, [("Delivery", None), ("Delivery", None)]
+        )
+
+        assert visitors[0].id != visitors[1].id
+
+    # Tests that walk-ins are returned in the order they were given
+    @pytest.mark.asyncio
+    async def test_walk_ins_keep_order(self, async_session):
+        names = [f"Delivery {index}" for index in range(50)]
+
+        visitors = await crud.resolve_visitors(
+            async_session, [(name, None) for name in names]
+        )
+
+        assert [visitor.name for visitor in visitors] == names
+
+    # Tests that an existing visitor stored with an empty document is matched
+    @pytest.mark.asyncio
+    async def test_empty_document_matched(self, async_session):
+        user = await seed_resident_visits(async_session, 0)
+        existing = Visitor(
+            name="Ana",
+            normalized_name="ana",
+            document_id="",
+            resident_id=user.resident.id,
+        )
+        async_session.add(existing)
+        await async_session.flush()
+
+        (visitor,) = await crud.resolve_visitors(
+            async_session, [("Ana", None)], user.resident.id
+        )
+
+        assert visitor.id == existing.id
+
+    # Tests that a bulk invitation naming the same visitor twice shares the visitor
+    @pytest.mark.asyncio
+    async def test_bulk_duplicates_share_visitor(self, async_session, mocker):
+        mocker.patch.object(crud.expiry_scheduler, "notify")
+        user = await seed_resident_visits(async_session, 0)
+        principal = Principal(
+            id=user.id, role="RESIDENT", is_active=True, resident_id=user.resident.id
+        )
+        date = datetime.now()
+
+        visits = await crud.create_visits(
+            async_session,
+            [VisitRequest(name="Ana", date=date), VisitRequest(name="ANA", date=date)],
+            principal,
+        )
+        again = await crud.create_visit(async_session, "ana", date, principal)
+
+        assert visits[0].visitor_id == visits[1].visitor_id == again.visitor_id
+        assert visits[0].id != visits[1].id
@@ -0,0 +1,84 @@
+import logging
+import threading
+
+from sqlalchemy import create_engine, text
+
+from src.config.database import (
+    DATABASE_URL,
+    QueryStats,
+    WaitTrackingQueuePool,
+    get_pool_statistics,
+    pool_statistics,
+    query_stats,
+)
+
+
+class TestPoolStatistics:
+    # Tests that the statistics of both pools are reported
+    def test_get_pool_statistics_reports_both_pools(self):
+        statistics = get_pool_statistics()
+
+        assert set(statistics) == {"sync", "async"}
+        for pool in statistics.values():
+            assert {"size", "checked_out", "overflow", "waits"} <= set(pool)
+
+    # Tests that a checkout waiting on an exhausted pool is counted
+    def test_exhausted_pool_counts_waits(self):
+        engine = create_engine(
+            DATABASE_URL,
+            poolclass=WaitTrackingQueuePool,
+            pool_size=1,
+            max_overflow=0,
+        )
+        connection = engine.connect()
+        waiter = threading.Thread(target=lambda: engine.connect().close())
+        waiter.start()
+        waiter.join(timeout=0.2)
+        connection.close()
+        waiter.join()
+
+        statistics = pool_statistics(engine.pool)
+        engine.dispose()
+
+        assert statistics["waits"] == 1
+        assert statistics["checked_out"] == 0
+
+
+class TestQueryStats:
+    # Tests that the statements of the current request are counted and timed
+    def test_counts_statements(self, db_session):
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        try:
+            db_session.execute(text("SELECT 1"))
+            db_session.execute(text("SELECT pg_sleep(0.01)"))
+        finally:
+            query_stats.reset(token)
+
+        assert stats.count == 2
+        assert stats.slowest >= 0.01
+        assert stats.duration >= stats.slowest
+        assert stats.slowest_statement == "SELECT pg_sleep(0.01)"
+
+    # Tests that statements outside of a request are not counted anywhere
+    def test_without_request(self, db_session):
+        db_session.execute(text("SELECT 1"))
+
+        assert query_stats.get() is None
+
+    # Tests that statements over the threshold are logged and counted as slow
+    def test_slow_statements_are_logged(self, db_session, mocker, caplog):
+        mocker.patch("src.config.database.SLOW_QUERY_THRESHOLD", 0.005)
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        try:
+            with caplog.at_level(logging.WARNING, logger="src.config.database"):
+                db_session.execute(text("SELECT 1"))
+                db_session.execute(text("SELECT pg_sleep(0.01)"))
+        finally:
+            query_stats.reset(token)
+
+        assert stats.slow == 1
+        assert [record.statement for record in caplog.records] == [
+            "SELECT pg_sleep(0.01)"
+        ]
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from src.events import VisitBroker, state_event, visit_event
+from src.models import Visit, VisitState
+
+
+class TestVisitEvents:
+    # Tests that a visit event carries the visit columns and its visitor
+    def test_visit_event(self):
+        visit = Visit(id=uuid4(), date=datetime.now(), visitor_id=uuid4())
+
+        event = visit_event(visit, "Guest")
+
+        assert event["event"] == "visit"
+        assert event["visit"]["id"] == visit.id
+        assert event["visit"]["visitor"] == {"id": visit.visitor_id, "name": "Guest"}
+
+    # Tests that a state event lists the visits that changed
+    def test_state_event(self):
+        ids = [uuid4(), uuid4()]
+
+        event = state_event(VisitState.EXPIRED, iter(ids))
+
+        assert event == {
+            "event": "state",
+            "state": VisitState.EXPIRED,
+            "visit_ids": ids,
+        }
+
+
+class TestVisitBroker:
+    # Tests that every subscriber gets the published events in order
+    @pytest.mark.asyncio
+    async def test_publish_to_subscribers(self):
+        broker = VisitBroker()
+        first, second = broker.subscribe(), broker.subscribe()
+
+        broker.publish({"event": "a"}, {"event": "b"})
+        await asyncio.sleep(0)
+
+        for queue in (first, second):
+            assert [queue.get_nowait(), queue.get_nowait()] == [
+                {"event": "a"},
+                {"event": "b"},
+            ]
+        assert broker.stats()["published"] == 2
+
+    # Tests that events published from another thread reach the event loop
+    @pytest.mark.asyncio
+    async def test_publish_from_thread(self):
+        broker = VisitBroker()
+        queue = broker.subscribe()
+
+        thread = threading.Thread(target=broker.publish, args=({"event": "a"},))
+        thread.start()
+        thread.join()
+
+        assert await asyncio.wait_for(queue.get(), timeout=1) == {"event": "a"}
+
+    # Tests that a subscriber falling behind gets a single resync event
+    @pytest.mark.asyncio
+    async def test_overflow_resyncs(self):
+        broker = VisitBroker(queue_size=2)
+        queue = broker.subscribe()
+
+        broker.publish(*({"event": "visit", "n": n} for n in range(3)))
+        await asyncio.sleep(0)
+
+        assert queue.get_nowait() == {"event": "resync"}
+        assert queue.empty()
+        assert broker.stats()["overflows"] == 1
+
+    # Tests that unsubscribed queues no longer get events
+    @pytest.mark.asyncio
+    async def test_unsubscribe(self):
+        broker = VisitBroker()
+        queue = broker.subscribe()
+
+        broker.unsubscribe(queue)
+        broker.publish({"event": "a"})
+        await asyncio.sleep(0)
+
+        assert queue.empty()
+        assert broker.stats()["subscribers"] == 0
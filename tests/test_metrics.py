@@ -0,0 +1,108 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from main import app
+from src.config.database import query_stats
+from src.metrics import MetricsMiddleware, StatsCollector
+from src.passwords import password_executor
+
+
+def make_app(debug):
+    test_app = FastAPI()
+    test_app.add_middleware(MetricsMiddleware, debug=debug)
+
+    @test_app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        stats = query_stats.get()
+        stats.record("SELECT 1", 0.002)
+        stats.record("SELECT *\n  FROM item", 0.005)
+        return {"id": item_id}
+
+    return test_app
+
+
+def sample(name, route):
+    return REGISTRY.get_sample_value(name, {"route": route}) or 0
+
+
+class TestMetricsMiddleware:
+    # Tests that the query statistics are returned as headers in debug mode
+    def test_debug_headers(self):
+        response = TestClient(make_app(debug=True)).get("/items/1")
+
+        assert response.headers["X-DB-Statements"] == "2"
+        assert response.headers["X-DB-Time-Ms"] == "7.00"
+        assert response.headers["X-DB-Slowest-Ms"] == "5.00"
+        assert response.headers["X-DB-Slowest-Statement"] == "SELECT * FROM item"
+
+    # Tests that the headers are left out outside of debug mode
+    def test_no_headers_without_debug(self):
+        response = TestClient(make_app(debug=False)).get("/items/1")
+
+        assert response.status_code == 200
+        assert "X-DB-Statements" not in response.headers
+
+    # Tests that the statistics are observed with the route template
+    def test_histograms_by_route(self):
+        route = "/items/{item_id}"
+        requests = sample("db_statements_per_request_count", route)
+        statements = sample("db_statements_per_request_sum", route)
+
+        TestClient(make_app(debug=False)).get("/items/2")
+
+        assert sample("db_statements_per_request_count", route) == requests + 1
+        assert sample("db_statements_per_request_sum", route) == statements + 2
+
+    # Tests that the duration of requests is observed with route and status
+    def test_request_duration(self):
+        labels = {"route": "/items/{item_id}", "method": "GET", "status": "200"}
+        name = "http_request_duration_seconds_count"
+        before = REGISTRY.get_sample_value(name, labels) or 0
+
+        TestClient(make_app(debug=False)).get("/items/3")
+
+        assert REGISTRY.get_sample_value(name, labels) == before + 1
+        in_progress = {"method": "GET"}
+        assert REGISTRY.get_sample_value("http_requests_in_progress", in_progress) == 0
+
+    # Tests that requests matching no route share one label
+    def test_unmatched_route(self):
+        before = sample("db_statements_per_request_count", "unmatched")
+
+        TestClient(make_app(debug=False)).get("/missing")
+
+        assert sample("db_statements_per_request_count", "unmatched") == before + 1
+
+
+class TestStatsCollector:
+    # Tests that the pool and password executor counters are collected
+    def test_collects_pool_and_executor(self):
+        samples = {
+            (sample.name, sample.labels.get("pool")): sample.value
+            for family in StatsCollector(password_executor).collect()
+            for sample in family.samples
+        }
+
+        assert samples[("db_pool_size", "sync")] >= 1
+        assert ("db_pool_checked_out", "async") in samples
+        assert ("db_pool_waits_total", "sync") in samples
+        assert samples[("password_hash_queued", None)] == 0
+
+
+class TestMetricsEndpoint:
+    # Tests that the metrics are served in the Prometheus text format
+    def test_metrics(self):
+        client = TestClient(app)
+        client.get("/healthcheck")
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'db_statements_per_request_count{route="/healthcheck"}' in response.text
+        duration = (
+            'http_request_duration_seconds_count{method="GET",route="/healthcheck"'
+        )
+        assert duration in response.text
+        assert 'db_pool_checked_out{pool="async"}' in response.text
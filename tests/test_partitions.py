@@ -0,0 +1,123 @@
+from datetime import date, datetime
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from src.models import Qr, Visit, Visitor, VisitState
+from src.partitions import (
+    add_months,
+    archive_visit_partitions,
+    create_visit_partition,
+    ensure_visit_partitions,
+    monthly_partitions,
+)
+
+
+def seed_visit(session, visit_date, state=VisitState.REGISTERED, qr_id=None):
+    visit = Visit(date=visit_date, state=state, visitor=Visitor(name="V"), qr_id=qr_id)
+    session.add(visit)
+    session.flush()
+    return visit.id
+
+
+def stored_in(session, table, visit_id):
+    return session.execute(
+        text(f"SELECT CAST(tableoid AS regclass) FROM {table} WHERE id = :id"),
+        {"id": visit_id},
+    ).scalar()
+
+
+class TestAddMonths:
+    # Tests that months are added across year boundaries from any day
+    def test_across_years(self):
+        assert add_months(date(2026, 11, 30), 2) == date(2027, 1, 1)
+        assert add_months(date(2026, 1, 15), -1) == date(2025, 12, 1)
+        assert add_months(date(2026, 10, 18), 0) == date(2026, 10, 1)
+
+
+class TestEnsureVisitPartitions:
+    # Tests that the missing monthly partitions are created once
+    def test_creates_missing_months(self, db_session):
+        connection = db_session.connection()
+
+        created = ensure_visit_partitions(connection, date(2090, 12, 20), 1)
+
+        assert created == ["visit_y2090m12", "visit_y2091m01"]
+        assert ensure_visit_partitions(connection, date(2090, 12, 20), 1) == []
+        assert monthly_partitions(connection)[date(2091, 1, 1)] == "visit_y2091m01"
+
+    # Tests that visits stored in the default partition move to the new one
+    def test_moves_rows_from_default_partition(self, db_session):
+        visit_id = seed_visit(db_session, datetime(2092, 3, 5, 10, 0))
+        assert stored_in(db_session, "visit", visit_id) == "visit_default"
+
+        ensure_visit_partitions(db_session.connection(), date(2092, 3, 1), 0)
+
+        assert stored_in(db_session, "visit", visit_id) == "visit_y2092m03"
+
+
+class TestArchiveVisitPartitions:
+    # Tests that old partitions leave the visit table for the archive
+    def test_moves_old_partitions(self, db_session):
+        create_visit_partition(db_session.connection(), date(2001, 1, 1))
+        create_visit_partition(db_session.connection(), date(2001, 6, 1))
+        old_id = seed_visit(db_session, datetime(2001, 1, 10, 9, 0))
+        recent_id = seed_visit(db_session, datetime(2001, 6, 10, 9, 0))
+
+        archived = archive_visit_partitions(
+            db_session.connection(), date(2001, 8, 1), after_months=6
+        )
+
+        assert "visit_y2001m01" in archived
+        assert "visit_y2001m06" not in archived
+        db_session.expunge_all()
+        assert db_session.get(Visit, old_id) is None
+        assert stored_in(db_session, "visit_archive", old_id) == "visit_y2001m01"
+        assert db_session.get(Visit, recent_id) is not None
+
+    # Tests that partitions with pending visits are kept until they expire
+    def test_keeps_partitions_with_pending_visits(self, db_session):
+        create_visit_partition(db_session.connection(), date(2002, 1, 1))
+        visit_id = seed_visit(db_session, datetime(2002, 1, 10), VisitState.PENDING)
+
+        archived = archive_visit_partitions(
+            db_session.connection(), date(2003, 1, 1), after_months=6
+        )
+
+        assert "visit_y2002m01" not in archived
+        assert stored_in(db_session, "visit", visit_id) == "visit_y2002m01"
+
+
+class TestVisitQr:
+    @staticmethod
+    def seed_qr(session):
+        qr = Qr(id=uuid4())
+        session.add(qr)
+        session.flush()
+        return qr.id
+
+    # Tests that a QR code cannot be given to visits of different months
+    def test_unique_across_partitions(self, db_session):
+        qr_id = self.seed_qr(db_session)
+        seed_visit(db_session, datetime(2093, 1, 10), VisitState.PENDING, qr_id)
+
+        with pytest.raises(IntegrityError), db_session.begin_nested():
+            seed_visit(db_session, datetime(2093, 2, 10), VisitState.PENDING, qr_id)
+
+    # Tests that a visit keeps its QR code when it moves to another partition
+    def test_visit_moves_with_its_qr(self, db_session):
+        create_visit_partition(db_session.connection(), date(2094, 1, 1))
+        qr_id = self.seed_qr(db_session)
+        visit_id = seed_visit(
+            db_session, datetime(2094, 1, 10), VisitState.PENDING, qr_id
+        )
+
+        db_session.get(Visit, visit_id).date = datetime(2094, 2, 10)
+        db_session.flush()
+        ensure_visit_partitions(db_session.connection(), date(2094, 2, 1), 0)
+
+        assert stored_in(db_session, "visit", visit_id) == "visit_y2094m02"
+        with pytest.raises(IntegrityError), db_session.begin_nested():
+            seed_visit(db_session, datetime(2094, 1, 20), VisitState.PENDING, qr_id)
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+
+import pytest
+from prometheus_client import REGISTRY
+
+from src.auth import AuthHandler
+from src.passwords import PasswordExecutor
+
+
+async def wait_until(condition):
+    while not condition():
+        await asyncio.sleep(0.001)
+
+
+class TestPasswordExecutor:
+    # Tests that functions run on a worker thread instead of the event loop
+    @pytest.mark.asyncio
+    async def test_runs_off_event_loop(self):
+        executor = PasswordExecutor(max_workers=1)
+
+        thread = await executor.run(threading.current_thread)
+
+        assert thread is not threading.current_thread()
+        assert thread.name.startswith("password-hash")
+        executor.shutdown()
+
+    # Tests that calls beyond the worker count wait in the queue and are counted
+    @pytest.mark.asyncio
+    async def test_queue_depth_beyond_worker_count(self):
+        executor = PasswordExecutor(max_workers=1)
+        release = threading.Event()
+        first = asyncio.ensure_future(executor.run(release.wait))
+        await wait_until(lambda: executor.stats()["running"] == 1)
+
+        second = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0)
+        stats = executor.stats()
+        release.set()
+        await asyncio.gather(first, second)
+
+        assert stats["running"] == 1
+        assert stats["queued"] == 1
+        assert executor.stats()["queued"] == 0
+        assert executor.stats()["completed"] == 2
+        executor.shutdown()
+
+    # Tests that exceptions raised by the function reach the caller
+    @pytest.mark.asyncio
+    async def test_exception_is_propagated(self):
+        executor = PasswordExecutor(max_workers=1)
+
+        with pytest.raises(ValueError):
+            await executor.run(int, "not a number")
+
+        assert executor.stats()["running"] == 0
+        executor.shutdown()
+
+    # Tests that the time spent in each call is observed with its operation
+    @pytest.mark.asyncio
+    async def test_hash_time_is_observed(self):
+        def count():
+            labels = {"operation": "get_password_hash"}
+            sample = "password_hash_duration_seconds_count"
+            return REGISTRY.get_sample_value(sample, labels) or 0
+
+        executor = PasswordExecutor(max_workers=1)
+        before = count()
+
+        await executor.run(AuthHandler().get_password_hash, "secret")
+
+        assert count() == before + 1
+        executor.shutdown()
+
+    # Tests that the event loop keeps running while a password is verified
+    @pytest.mark.asyncio
+    async def test_event_loop_not_blocked_by_bcrypt(self):
+        auth_handler = AuthHandler()
+        hashed_password = auth_handler.get_password_hash("password123")
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.ensure_future(tick())
+        result = await auth_handler.verify_password_async(
+            "password123", hashed_password
+        )
+        ticker.cancel()
+
+        assert result is True
+        assert ticks > 1
@@ -0,0 +1,99 @@
+import json
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from fastapi import Response, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src import crud
+from src.models import Role, User, Visit, Visitor, VisitState
+from src.responses import model_response
+from src.utils import grouped_dict
+
+from .test_crud import seed_guard, seed_resident_visits
+
+
+def make_visit(state=VisitState.PENDING, **kwargs):
+    return Visit(
+        id=uuid4(),
+        created_date=datetime.now(),
+        date=datetime.now(),
+        state=state,
+        qr_id=uuid4(),
+        **kwargs,
+    )
+
+
+class TestModelResponse:
+    # Tests that a visit renders its columns like jsonable_encoder, with its visitor
+    def test_visit_matches_jsonable_encoder(self):
+        visit = make_visit(register_date=None, additional_info={"until": "08:00"})
+        visitor = Visitor(id=uuid4(), name="Guest", created_at=None, updated_at=None)
+        set_committed_value(visit, "visitor", visitor)
+
+        body = json.loads(model_response(visit).body)
+
+        expected = jsonable_encoder(visit.to_dict())
+        assert {k: v for k, v in body.items() if k in expected} == expected
+        assert body["visitor"] == {
+            "id": str(visitor.id),
+            "name": "Guest",
+            "document_id": None,
+            "created_at": None,
+            "updated_at": None,
+        }
+
+    # Tests that relationships that were not loaded render as null
+    def test_unloaded_relationships_are_null(self):
+        body = json.loads(model_response(make_visit()).body)
+
+        assert body["visitor"] is None
+        assert body["resident"] is None
+        assert body["state"] == "PENDING"
+
+    # Tests that users render without their password hash
+    def test_user_without_password(self):
+        user = User(
+            id=uuid4(), name="Resident", username="resident", role=Role.RESIDENT
+        )
+        user.password = "hash"
+
+        body = json.loads(model_response({"user": user}).body)
+
+        assert "password" not in body["user"]
+        assert body["user"]["role"] == "RESIDENT"
+
+    # Tests that visits grouped by state render with the state names as keys
+    def test_grouped_visits(self):
+        visits = [make_visit(), make_visit(state=VisitState.EXPIRED)]
+
+        body = json.loads(model_response({"visits": grouped_dict(visits)}).body)
+
+        assert set(body["visits"]) == {"PENDING", "EXPIRED"}
+
+    # Tests that error responses from crud are returned as they are
+    def test_response_passes_through(self):
+        response = Response(status_code=status.HTTP_404_NOT_FOUND)
+
+        assert model_response(response) is response
+
+    # Tests that a guard board loaded from the database renders without lazy loads
+    @pytest.mark.asyncio
+    async def test_guard_board_from_database(self, async_session):
+        user = await seed_resident_visits(async_session, 3)
+        guard = await seed_guard(async_session)
+
+        page = await crud.get_user_visits(async_session, user_id=guard.id)
+        body = json.loads(model_response(page).body)
+
+        visits = [
+            visit
+            for group in body["visits"].values()
+            for visit in group
+            if visit["resident_id"] == str(user.resident.id)
+        ]
+        assert len(visits) == 3
+        assert all(visit["visitor"]["name"].startswith("Visitor") for visit in visits)
+        assert all(visit["resident"]["phone"] == "0999999999" for visit in visits)
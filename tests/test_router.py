@@ -1,137 +1,171 @@
 # Dependencies:
 # pip install pytest-mock
 
+from uuid import uuid4
+
+import pytest
+
 from src import crud
-from src.router import get_user
+from src.router import get_stats, get_user
+from src.schema import Principal
 
 
 class TestGetUser:
     # Tests that the function returns the user profile for a valid user ID.
-    def test_get_user_valid_user_id(self, mocker):
+    @pytest.mark.asyncio
+    async def test_get_user_valid_user_id(self, mocker):
         # Mock the dependencies
         request = mocker.Mock()
         db = mocker.Mock()
         user_id = mocker.Mock()
 
         # Mock the CRUD function
-        crud.get_profile = mocker.Mock(return_value={"user": "profile"})
+        crud.get_profile = mocker.AsyncMock(return_value={"user": "profile"})
 
         # Call the function
-        result = get_user(request, db=db, user_id=user_id)
+        result = await get_user(request, db=db, user_id=user_id)
 
         # Assert the result
         assert result == {"user": "profile"}
-        crud.get_profile.assert_called_once_with(db, user_id=user_id)
+        crud.get_profile.assert_awaited_once_with(db, user_id=user_id)
 
     # Tests that the function returns the user profile with residence information for a resident user.
-    def test_get_user_resident_with_residence(self, mocker):
+    @pytest.mark.asyncio
+    async def test_get_user_resident_with_residence(self, mocker):
         # Mock the dependencies
         request = mocker.Mock()
         db = mocker.Mock()
         user_id = mocker.Mock()
 
         # Mock the CRUD function to return a resident user with residence information
-        crud.get_profile = mocker.Mock(
+        crud.get_profile = mocker.AsyncMock(
             return_value={"user": {"role": "resident"}, "residence": "information"}
         )
 
         # Call the function
-        result = get_user(request, db=db, user_id=user_id)
+        result = await get_user(request, db=db, user_id=user_id)
 
         # Assert the result
         assert result == {"user": {"role": "resident"}, "residence": "information"}
-        crud.get_profile.assert_called_once_with(db, user_id=user_id)
+        crud.get_profile.assert_awaited_once_with(db, user_id=user_id)
 
     # Tests that the function returns visits grouped by date for a guard user.
-    def test_get_user_guard_with_visits(self, mocker):
+    @pytest.mark.asyncio
+    async def test_get_user_guard_with_visits(self, mocker):
         # Mock the dependencies
         request = mocker.Mock()
         db = mocker.Mock()
         user_id = mocker.Mock()
 
         # Mock the CRUD function to return a guard user with visits
-        crud.get_profile = mocker.Mock(
+        crud.get_profile = mocker.AsyncMock(
             return_value={"user": {"role": "guard"}, "visits": "grouped"}
         )
 
         # Call the function
-        result = get_user(request, db=db, user_id=user_id)
+        result = await get_user(request, db=db, user_id=user_id)
 
         # Assert the result
         assert result == {"user": {"role": "guard"}, "visits": "grouped"}
-        crud.get_profile.assert_called_once_with(db, user_id=user_id)
+        crud.get_profile.assert_awaited_once_with(db, user_id=user_id)
 
     # Test that the function returns 401 Unauthorized for a guard user with a non-existent guard.
-    def test_get_user_guard_nonexistent_guard(self, mocker):
+    @pytest.mark.asyncio
+    async def test_get_user_guard_nonexistent_guard(self, mocker):
         # Mock the dependencies
         request = mocker.Mock()
         db = mocker.Mock()
         user_id = mocker.Mock()
 
         # Mock the CRUD function
-        crud.get_profile = mocker.Mock(return_value={"user": "profile"})
+        crud.get_profile = mocker.AsyncMock(return_value={"user": "profile"})
 
         # Mock the guard query
         db.query.return_value.filter_by.return_value.first.return_value = None
 
         # Call the function
-        result = get_user(request, db=db, user_id=user_id)
+        result = await get_user(request, db=db, user_id=user_id)
 
         # Assert the result
         assert result == {"user": "profile"}
 
     # Test that the function returns a 401 Unauthorized response for a resident user with a non-existent residence.
-    def test_get_user_resident_nonexistent_residence(self, mocker):
+    @pytest.mark.asyncio
+    async def test_get_user_resident_nonexistent_residence(self, mocker):
         # Mock the dependencies
         request = mocker.Mock()
         db = mocker.Mock()
         user_id = mocker.Mock()
 
         # Mock the CRUD function
-        crud.get_profile = mocker.Mock(return_value={"user": "profile"})
+        crud.get_profile = mocker.AsyncMock(return_value={"user": "profile"})
 
         # Mock the Resident query
         db.query.return_value.filter_by.return_value.first.return_value = None
 
         # Call the function
-        response = get_user(request, db=db, user_id=user_id)
+        response = await get_user(request, db=db, user_id=user_id)
 
         # Assert the response content
         assert response == {"user": "profile"}
 
         # Assert that the CRUD function was called once with the correct arguments
-        crud.get_profile.assert_called_once_with(db, user_id=user_id)
+        crud.get_profile.assert_awaited_once_with(db, user_id=user_id)
 
     # Tests that the function returns the user profile for a valid user ID.
-    def test_get_user_valid_user_id(self, mocker):
+    @pytest.mark.asyncio
+    async def test_get_user_valid_user_id(self, mocker):
         # Mock the dependencies
         request = mocker.Mock()
         db = mocker.Mock()
         user_id = mocker.Mock()
 
         # Mock the CRUD function
-        crud.get_profile = mocker.Mock(return_value={"user": "profile"})
+        crud.get_profile = mocker.AsyncMock(return_value={"user": "profile"})
 
         # Call the function
-        result = get_user(request, db=db, user_id=user_id)
+        result = await get_user(request, db=db, user_id=user_id)
 
         # Assert the result
         assert result == {"user": "profile"}
-        crud.get_profile.assert_called_once_with(db, user_id=user_id)
+        crud.get_profile.assert_awaited_once_with(db, user_id=user_id)
 
     # Tests that the function returns the user profile for a valid user ID.
-    def test_get_user_valid_user_id(self, mocker):
+    @pytest.mark.asyncio
+    async def test_get_user_valid_user_id(self, mocker):
         # Mock the dependencies
         request = mocker.Mock()
         db = mocker.Mock()
         user_id = mocker.Mock()
 
         # Mock the CRUD function
-        crud.get_profile = mocker.Mock(return_value={"user": "profile"})
+        crud.get_profile = mocker.AsyncMock(return_value={"user": "profile"})
 
         # Call the function
-        result = get_user(request, db=db, user_id=user_id)
+        result = await get_user(request, db=db, user_id=user_id)
 
         # Assert the result
         assert result == {"user": "profile"}
-        crud.get_profile.assert_called_once_with(db, user_id=user_id)
+        crud.get_profile.assert_awaited_once_with(db, user_id=user_id)
+
+
+class TestGetStats:
+    # Tests that an admin gets the statistics
+    @pytest.mark.asyncio
+    async def test_admin_gets_stats(self, mocker):
+        principal = Principal(id=uuid4(), role="ADMIN", is_active=True)
+
+        result = await get_stats(mocker.Mock(), principal=principal)
+
+        assert set(result) == {"pool", "qr_cache", "password_hashing", "visit_events"}
+
+    # Tests that other users and inactive admins are forbidden
+    @pytest.mark.asyncio
+    async def test_other_users_forbidden(self, mocker):
+        guard = Principal(id=uuid4(), role="GUARD", is_active=True)
+        inactive = Principal(id=uuid4(), role="ADMIN", is_active=False)
+
+        for principal in (guard, inactive):
+            result = await get_stats(mocker.Mock(), principal=principal)
+
+            assert result.status_code == 403
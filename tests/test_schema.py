@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+
+from src import crud
+from src.models import Role, User
+from src.schema import (
+    Principal,
+    Profile,
+    VisitRequest,
+    VisitResponse,
+    VisitState,
+    naive_local,
+)
+
+from .test_crud import seed_guard
+
+
+class TestResponseModels:
+    # Tests that a user read into a profile leaves the password hash out
+    def test_profile_without_password(self):
+        user = User(
+            id=uuid4(), name="Guard", username="guard", role=Role.GUARD, password="x"
+        )
+
+        profile = Profile.validate({"user": user})
+
+        assert "password" not in profile.dict()["user"]
+        assert profile.user.role == "GUARD"
+
+    # Tests that relationships that were not loaded are not lazy loaded
+    @pytest.mark.asyncio
+    async def test_visit_unloaded_relationships(self, async_session):
+        guard = await seed_guard(async_session)
+        principal = Principal(id=guard.id, role="GUARD", is_active=True)
+        visit = await crud.create_visit(
+            async_session, "Delivery", datetime.now(), principal
+        )
+
+        response = VisitResponse.from_orm(visit)
+
+        assert response.state == VisitState.REGISTERED
+        assert response.visitor is None
+        assert response.visitor_id == visit.visitor_id
+
+
+class TestNaiveLocal:
+    # Tests that aware datetimes are converted to naive local time
+    def test_aware_datetime(self):
+        value = datetime(2026, 10, 18, 15, 0, tzinfo=timezone(timedelta(hours=2)))
+
+        assert naive_local(value) == datetime(2026, 10, 18, 8, 0)
+
+    # Tests that naive datetimes and missing values are left as they are
+    def test_naive_datetime(self):
+        value = datetime(2026, 10, 18, 15, 0)
+
+        assert naive_local(value) is value
+        assert naive_local(None) is None
+
+    # Tests that a visit requested with an offset gets a naive local date
+    def test_visit_request_date(self):
+        request = VisitRequest(name="Guest", date="2026-10-18T15:00:00+00:00")
+
+        assert request.date == datetime(2026, 10, 18, 10, 0)
+        assert request.date.tzinfo is None
@@ -0,0 +1,286 @@
+from datetime import date, datetime, time, timedelta
+from uuid import uuid4
+
+from prometheus_client import REGISTRY
+
+from src.cache import qr_cache
+from src.events import visit_broker
+from src.models import Qr, RecurringVisit, Resident, Visit, Visitor, VisitState
+from src.tasks import (
+    EXPIRY_GRACE,
+    VISIT_VALIDITY,
+    ExpiryScheduler,
+    check_visit_expiry,
+    expire_visits,
+    materialize_recurring_visits,
+    next_expiry,
+)
+
+# A Monday.
+MONDAY = datetime(2026, 10, 19, 7, 0)
+
+
+def seed_visits(session, dates, state=VisitState.PENDING):
+    visits = [
+        Visit(date=date, state=state, visitor=Visitor(name="V")) for date in dates
+    ]
+    session.add_all(visits)
+    session.flush()
+    return [visit.id for visit in visits]
+
+
+def visit_states(session, ids):
+    visits = session.query(Visit).filter(Visit.id.in_(ids)).all()
+    return {visit.id: visit.state for visit in visits}
+
+
+def seed_recurring_visit(session, weekdays, **kwargs):
+    recurring_visit = RecurringVisit(
+        weekdays=sum(1 << (weekday - 1) for weekday in weekdays),
+        start_time=time(8, 0),
+        end_time=time(17, 0),
+        start_date=date(2026, 10, 1),
+        visitor=Visitor(name="Maid"),
+        resident=Resident(phone="0999999999"),
+        **kwargs,
+    )
+    session.add(recurring_visit)
+    session.flush()
+    return recurring_visit
+
+
+class TestExpireVisits:
+    # Tests that only pending visits past their validity window are expired
+    def test_expires_only_stale_pending_visits(self, db_session):
+        now = datetime.now()
+        stale = seed_visits(db_session, [now - timedelta(hours=25)] * 3)
+        fresh = seed_visits(db_session, [now - timedelta(hours=1)])
+        registered = seed_visits(
+            db_session, [now - timedelta(days=3)], state=VisitState.REGISTERED
+        )
+
+        expired = expire_visits(db_session, now)
+
+        states = visit_states(db_session, stale + fresh + registered)
+        assert expired >= 3
+        assert all(states[visit_id] == VisitState.EXPIRED for visit_id in stale)
+        assert states[fresh[0]] == VisitState.PENDING
+        assert states[registered[0]] == VisitState.REGISTERED
+
+    # Tests that recurring visit occurrences expire at the end of their window
+    def test_expires_ended_windows(self, db_session):
+        now = datetime.now()
+        ended, open_ = (
+            Visit(
+                date=now - timedelta(hours=10),
+                valid_until=valid_until,
+                state=VisitState.PENDING,
+            )
+            for valid_until in (now - timedelta(hours=1), now + timedelta(hours=1))
+        )
+        db_session.add_all([ended, open_])
+        db_session.flush()
+
+        expire_visits(db_session, now)
+
+        states = visit_states(db_session, [ended.id, open_.id])
+        assert states == {ended.id: VisitState.EXPIRED, open_.id: VisitState.PENDING}
+
+    # Tests that a backlog larger than the batch size is expired across batches
+    def test_expires_backlog_in_batches(self, db_session):
+        now = datetime.now()
+        stale = seed_visits(db_session, [now - timedelta(days=2)] * 5)
+
+        expired = expire_visits(db_session, now, batch_size=2)
+
+        states = visit_states(db_session, stale)
+        assert expired >= 5
+        assert set(states.values()) == {VisitState.EXPIRED}
+
+    # Tests that the QR codes of expired visits are dropped from the cache
+    def test_invalidates_qr_cache(self, db_session):
+        visit = Visit(
+            date=datetime.now() - timedelta(days=2),
+            state=VisitState.PENDING,
+            qr=Qr(id=uuid4()),
+        )
+        db_session.add(visit)
+        db_session.flush()
+        qr_cache.set(str(visit.qr_id), {"visit": visit})
+
+        expire_visits(db_session, datetime.now())
+
+        assert qr_cache.get(str(visit.qr_id)) is None
+
+    # Tests that the expired visits are published as one state event per batch
+    def test_publishes_state_events(self, db_session, mocker):
+        publish = mocker.patch.object(visit_broker, "publish")
+        stale = seed_visits(db_session, [datetime.now() - timedelta(days=2)] * 3)
+
+        expire_visits(db_session, datetime.now(), batch_size=2)
+
+        events = [call.args[0] for call in publish.call_args_list]
+        assert all(event["event"] == "state" for event in events)
+        assert all(event["state"] == VisitState.EXPIRED for event in events)
+        published = {visit_id for event in events for visit_id in event["visit_ids"]}
+        assert set(stale) <= published
+
+
+class TestCheckVisitExpiry:
+    # Tests that the job returns the number of expired visits and closes the session
+    def test_returns_expired_count(self, db_session, mocker):
+        expire = mocker.patch("src.tasks.expire_visits", return_value=4)
+        close = mocker.spy(db_session, "close")
+
+        assert check_visit_expiry(db_session) == 4
+        expire.assert_called_once()
+        close.assert_called_once()
+
+    # Tests that the duration of the job and the expired visits are recorded
+    def test_records_metrics(self, db_session, mocker):
+        mocker.patch("src.tasks.expire_visits", return_value=3)
+        expired = REGISTRY.get_sample_value("visits_expired_total")
+        runs = REGISTRY.get_sample_value("visit_expiry_job_duration_seconds_count")
+
+        check_visit_expiry(db_session)
+
+        assert REGISTRY.get_sample_value("visits_expired_total") == expired + 3
+        assert (
+            REGISTRY.get_sample_value("visit_expiry_job_duration_seconds_count")
+            == runs + 1
+        )
+
+    # Tests that a failing job is logged and reports no expired visits
+    def test_failure_returns_zero(self, db_session, mocker):
+        mocker.patch("src.tasks.expire_visits", side_effect=RuntimeError("boom"))
+
+        assert check_visit_expiry(db_session) == 0
+
+
+class TestNextExpiry:
+    # Tests that the next expiry is the due time of the oldest pending visit
+    def test_due_time_of_oldest_pending_visit(self, db_session):
+        oldest = datetime(2000, 1, 1, 8, 0)
+        seed_visits(db_session, [oldest, oldest + timedelta(hours=5)])
+        seed_visits(
+            db_session, [oldest - timedelta(days=1)], state=VisitState.REGISTERED
+        )
+
+        assert next_expiry(db_session) == oldest + VISIT_VALIDITY + EXPIRY_GRACE
+
+    # Tests that the end of a window due before the oldest date's validity comes first
+    def test_due_time_of_ended_window(self, db_session):
+        oldest = datetime(2000, 1, 1, 8, 0)
+        seed_visits(db_session, [oldest])
+        db_session.add(
+            Visit(
+                date=oldest + timedelta(hours=2),
+                valid_until=oldest + timedelta(hours=9),
+                state=VisitState.PENDING,
+            )
+        )
+        db_session.flush()
+
+        assert next_expiry(db_session) == oldest + timedelta(hours=9) + EXPIRY_GRACE
+
+
+class TestMaterializeRecurringVisits:
+    # Tests that visits are only created for matching weekdays within the horizon
+    def test_creates_visits_on_matching_days(self, db_session):
+        recurring_visit = seed_recurring_visit(db_session, weekdays=[1, 3])
+
+        visits = materialize_recurring_visits(
+            db_session, MONDAY, days=3, recurring_visit_ids=[recurring_visit.id]
+        )
+
+        assert sorted(visit.date for visit in visits) == [
+            datetime(2026, 10, 19, 8, 0),
+            datetime(2026, 10, 21, 8, 0),
+        ]
+        assert all(visit.state == VisitState.PENDING for visit in visits)
+        assert all(visit.visitor_id == recurring_visit.visitor_id for visit in visits)
+        assert all(db_session.get(Qr, visit.qr_id) for visit in visits)
+        assert visits[0].valid_until == datetime(2026, 10, 19, 17, 0)
+
+    # Tests that a second run does not create the same occurrences again
+    def test_is_idempotent(self, db_session):
+        recurring_visit = seed_recurring_visit(db_session, weekdays=range(1, 8))
+        ids = [recurring_visit.id]
+        first = materialize_recurring_visits(db_session, MONDAY, 2, ids)
+
+        second = materialize_recurring_visits(db_session, MONDAY, 3, ids)
+
+        assert len(first) == 2
+        assert [visit.date for visit in second] == [datetime(2026, 10, 21, 8, 0)]
+
+    # Tests that today's occurrence is skipped once its window has ended
+    def test_skips_ended_window(self, db_session):
+        recurring_visit = seed_recurring_visit(db_session, weekdays=[1, 2])
+
+        visits = materialize_recurring_visits(
+            db_session, MONDAY.replace(hour=18), 2, [recurring_visit.id]
+        )
+
+        assert [visit.date for visit in visits] == [datetime(2026, 10, 20, 8, 0)]
+
+    # Tests that stopped or finished recurring visits are not materialized
+    def test_skips_inactive_and_ended(self, db_session):
+        inactive = seed_recurring_visit(db_session, weekdays=[1], is_active=False)
+        ended = seed_recurring_visit(
+            db_session, weekdays=[1], end_date=date(2026, 10, 18)
+        )
+
+        visits = materialize_recurring_visits(
+            db_session, MONDAY, 1, [inactive.id, ended.id]
+        )
+
+        assert visits == []
+
+
+class TestExpiryScheduler:
+    # Tests that the job is rescheduled for the next due visit after a run
+    def test_run_schedules_next_due_visit(self, mocker):
+        due = datetime.now() + timedelta(minutes=3)
+        mocker.patch("src.tasks.check_visit_partitions", return_value=[])
+        mocker.patch("src.tasks.check_recurring_visits", return_value=0)
+        mocker.patch("src.tasks.check_visit_expiry", return_value=0)
+        mocker.patch("src.tasks.next_expiry", return_value=due)
+        scheduler = mocker.Mock()
+        expiry_scheduler = ExpiryScheduler(mocker.MagicMock(), scheduler=scheduler)
+
+        expiry_scheduler.run()
+
+        assert expiry_scheduler.next_run == due
+        assert scheduler.add_job.call_args.kwargs["run_date"] == due
+
+    # Tests that the next run is capped when no visit is pending
+    def test_run_without_pending_visits_waits_max_interval(self, mocker):
+        mocker.patch("src.tasks.check_visit_partitions", return_value=[])
+        mocker.patch("src.tasks.check_recurring_visits", return_value=0)
+        mocker.patch("src.tasks.check_visit_expiry", return_value=0)
+        mocker.patch("src.tasks.next_expiry", return_value=None)
+        expiry_scheduler = ExpiryScheduler(
+            mocker.MagicMock(),
+            scheduler=mocker.Mock(),
+            max_interval=timedelta(minutes=5),
+        )
+
+        before = datetime.now()
+        expiry_scheduler.run()
+
+        assert expiry_scheduler.next_run >= before + timedelta(minutes=5)
+
+    # Tests that a new visit only brings the next run forward
+    def test_notify_only_reschedules_earlier(self, mocker):
+        scheduler = mocker.Mock(running=True)
+        expiry_scheduler = ExpiryScheduler(mocker.MagicMock(), scheduler=scheduler)
+        planned = datetime.now() + timedelta(hours=2)
+        expiry_scheduler.schedule(planned, force=True)
+
+        expiry_scheduler.notify(planned)
+        assert expiry_scheduler.next_run == planned
+
+        visit_date = datetime.now() - timedelta(hours=23)
+        expiry_scheduler.notify(visit_date)
+        assert expiry_scheduler.next_run == visit_date + VISIT_VALIDITY + EXPIRY_GRACE
+        assert scheduler.add_job.call_count == 2
@@ -1,4 +1,74 @@
-from src.utils import grouped_dict
+from datetime import datetime
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from hypothesis import given
+from hypothesis import strategies as st
+from prometheus_client import REGISTRY
+
+from src.cache import qr_cache
+from src.models import (
+    Guard,
+    Qr,
+    Residence,
+    Resident,
+    Role,
+    User,
+    Visit,
+    Visitor,
+    VisitState,
+)
+from src.schema import Principal
+from src.utils import decode_cursor, encode_cursor, grouped_dict, verify_qr_code
+
+
+async def seed_qr_visit(session, state=VisitState.PENDING, **kwargs):
+    guard = User(
+        id=uuid4(),
+        name="Guard",
+        role=Role.GUARD,
+        username=f"guard-{uuid4()}",
+        guard=Guard(id=uuid4()),
+    )
+    resident = Resident(
+        id=uuid4(),
+        phone="0999999999",
+        residences=[Residence(id=uuid4(), address="Mz 1 Villa 2")],
+    )
+    visit = Visit(
+        state=state,
+        qr=Qr(id=uuid4()),
+        visitor=Visitor(name="Visitor"),
+        resident=resident,
+        **{"date": datetime.now(), **kwargs},
+    )
+    session.add_all([guard, visit])
+    await session.flush()
+    session.expunge_all()
+    return guard, visit
+
+
+def as_principal(user):
+    return Principal(id=user.id, role=user.role.value, is_active=True)
+
+
+visit_dicts = st.lists(
+    st.fixed_dictionaries(
+        {"state": st.sampled_from(list(VisitState)), "index": st.integers()}
+    )
+)
+visit_objects = st.lists(
+    st.builds(
+        SimpleNamespace,
+        state=st.sampled_from(list(VisitState)),
+        index=st.integers(),
+    )
+)
+
+
+def state_of(item):
+    return item["state"] if isinstance(item, dict) else item.state
 
 
 class TestGroupedDict:
@@ -186,3 +256,175 @@ class TestGroupedDict:
 
         result = grouped_dict(input_data)
         assert result == expected_result
+
+    # Tests that interleaved states are merged instead of overwriting each other
+    def test_interleaved_states(self):
+        input_data = [
+            {"state": "PENDING", "id": 1},
+            {"state": "REGISTERED", "id": 2},
+            {"state": "PENDING", "id": 3},
+        ]
+
+        result = grouped_dict(input_data)
+
+        assert result == {
+            "PENDING": [{"state": "PENDING", "id": 1}, {"state": "PENDING", "id": 3}],
+            "REGISTERED": [{"state": "REGISTERED", "id": 2}],
+        }
+
+    # Tests that every item is kept exactly once, whatever the input order
+    @given(st.one_of(visit_dicts, visit_objects))
+    def test_every_item_is_kept(self, items):
+        result = grouped_dict(items)
+
+        grouped_ids = sorted(id(item) for group in result.values() for item in group)
+        assert grouped_ids == sorted(id(item) for item in items)
+
+    # Tests that each group holds exactly the items of its state, in input order
+    @given(st.one_of(visit_dicts, visit_objects))
+    def test_groups_keep_input_order(self, items):
+        result = grouped_dict(items)
+
+        for state, group in result.items():
+            assert group == [item for item in items if state_of(item) == state]
+
+    # Tests that groups appear in the order their state is first seen
+    @given(visit_objects)
+    def test_group_order_follows_first_appearance(self, items):
+        result = grouped_dict(items)
+
+        assert list(result) == list(dict.fromkeys(item.state for item in items))
+
+
+class TestVerifyQrCode:
+    # Tests that a pending QR returns the visit, visitor, resident and residence in one statement
+    @pytest.mark.asyncio
+    async def test_valid_qr_single_statement(self, async_session, statement_counter):
+        guard, visit = await seed_qr_visit(async_session)
+        statement_counter.clear()
+
+        result = await verify_qr_code(async_session, visit.qr.id, as_principal(guard))
+
+        assert len(statement_counter) == 1
+        assert result["visit"].id == visit.id
+        assert result["visitor"].name == "Visitor"
+        assert result["resident"].id == visit.resident.id
+        assert result["residence"].address == "Mz 1 Villa 2"
+
+    # Tests that an unknown QR code returns 404
+    @pytest.mark.asyncio
+    async def test_unknown_qr(self, async_session):
+        guard, _ = await seed_qr_visit(async_session)
+
+        result = await verify_qr_code(async_session, uuid4(), as_principal(guard))
+
+        assert result.status_code == 404
+
+    # Tests that an already registered visit returns 409
+    @pytest.mark.asyncio
+    async def test_registered_visit_conflict(self, async_session):
+        guard, visit = await seed_qr_visit(async_session, VisitState.REGISTERED)
+
+        result = await verify_qr_code(async_session, visit.qr.id, as_principal(guard))
+
+        assert result.status_code == 409
+
+    # Tests that a repeated scan of a valid QR is served from the cache
+    @pytest.mark.asyncio
+    async def test_repeated_scan_hits_cache(self, async_session, statement_counter):
+        guard, visit = await seed_qr_visit(async_session)
+        first = await verify_qr_code(async_session, visit.qr.id, as_principal(guard))
+        statement_counter.clear()
+
+        second = await verify_qr_code(async_session, visit.qr.id, as_principal(guard))
+
+        assert second is first
+        assert statement_counter == []
+        assert qr_cache.stats()["hits"] == 1
+
+    # Tests that a visit past its validity window is rejected and not cached
+    @pytest.mark.asyncio
+    async def test_expired_visit_conflict(self, async_session):
+        guard, visit = await seed_qr_visit(async_session, VisitState.EXPIRED)
+
+        result = await verify_qr_code(async_session, visit.qr.id, as_principal(guard))
+
+        assert result.status_code == 409
+        assert qr_cache.get(str(visit.qr.id)) is None
+
+    # Tests that a recurring visit occurrence only opens the gate within its window
+    @pytest.mark.asyncio
+    async def test_scan_after_window_conflict(self, async_session, mocker):
+        guard, visit = await seed_qr_visit(
+            async_session,
+            date=datetime(2026, 10, 19, 8, 0),
+            valid_until=datetime(2026, 10, 19, 17, 0),
+        )
+        clock = mocker.patch("src.utils.datetime", wraps=datetime)
+        clock.now.return_value = datetime(2026, 10, 19, 16, 30)
+        during = await verify_qr_code(async_session, visit.qr.id, as_principal(guard))
+
+        clock.now.return_value = datetime(2026, 10, 19, 17, 30)
+        after = await verify_qr_code(async_session, visit.qr.id, as_principal(guard))
+
+        assert during["visit"].id == visit.id
+        assert after.status_code == 409
+
+    # Tests that a registration during the query keeps its read out of the cache
+    @pytest.mark.asyncio
+    async def test_invalidation_during_query_not_cached(self, async_session):
+        guard, visit = await seed_qr_visit(async_session)
+
+        async def execute_then_invalidate(*args, **kwargs):
+            result = await async_session.execute(*args, **kwargs)
+            qr_cache.invalidate(str(visit.qr.id))
+            return result
+
+        db = SimpleNamespace(execute=execute_then_invalidate)
+
+        result = await verify_qr_code(db, visit.qr.id, as_principal(guard))
+
+        assert result["visit"].id == visit.id
+        assert qr_cache.get(str(visit.qr.id)) is None
+
+    # Tests that rejected scans are not cached
+    @pytest.mark.asyncio
+    async def test_conflict_is_not_cached(self, async_session):
+        guard, visit = await seed_qr_visit(async_session, VisitState.CANCELLED)
+
+        await verify_qr_code(async_session, visit.qr.id, as_principal(guard))
+
+        assert qr_cache.get(str(visit.qr.id)) is None
+
+    # Tests that each verification is counted by outcome
+    @pytest.mark.asyncio
+    async def test_outcomes_are_counted(self, async_session):
+        def count(outcome):
+            labels = {"outcome": outcome}
+            return REGISTRY.get_sample_value("qr_verifications_total", labels) or 0
+
+        before = {outcome: count(outcome) for outcome in ("valid", "not_found")}
+        guard, visit = await seed_qr_visit(async_session)
+
+        await verify_qr_code(async_session, visit.qr.id, as_principal(guard))
+        await verify_qr_code(async_session, visit.qr.id, as_principal(guard))
+        await verify_qr_code(async_session, uuid4(), as_principal(guard))
+
+        assert count("valid") == before["valid"] + 2
+        assert count("not_found") == before["not_found"] + 1
+
+
+class TestCursor:
+    # Tests that a cursor decodes back to the date and id it was made from
+    def test_round_trip(self):
+        visit_date, visit_id = datetime(2026, 10, 18, 8, 30, 15, 123), uuid4()
+
+        cursor = encode_cursor(visit_date, visit_id)
+
+        assert decode_cursor(cursor) == (visit_date, visit_id)
+        assert "=" not in cursor
+
+    # Tests that a malformed cursor raises ValueError
+    def test_malformed_cursor(self):
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor")
@@ -58,6 +58,13 @@ class TestVisit:
         assert visit_dict["guard_id"] == visit.guard_id
         assert visit_dict["resident_id"] == visit.resident_id
 
+    # Tests that to_dict() reads every column through the cached column names
+    def test_to_dict_uses_cached_column_names(self):
+        visit = Visit(id=uuid4(), date=datetime.datetime.now())
+
+        assert Visit.column_names() is Visit.column_names()
+        assert set(visit.to_dict()) == set(Visit.__table__.columns.keys())
+
     # Tests that the state attribute of the Visit object can be updated
     @pytest.mark.asyncio
     async def test_update_state_attribute(self):
@@ -2,7 +2,7 @@
 # pip install pytest-mock
 import pytest
 
-from src.models import Visit, Visitor
+from src.models import Visit, Visitor, normalize_name
 
 
 class TestVisitor:
@@ -70,3 +70,12 @@ class TestVisitor:
         assert (
             admin_repr_str == visitor_name
         ), f"Expected {visitor_name}, but got {admin_repr_str}"
+
+    # Tests that the normalized name follows the name, ignoring case and spacing
+    def test_normalized_name(self):
+        visitor = Visitor(name="  John   DOE ")
+
+        assert visitor.normalized_name == "john doe"
+
+        visitor.name = "Jane Doe"
+        assert visitor.normalized_name == normalize_name("jane  doe")